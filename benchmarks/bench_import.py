@@ -0,0 +1,69 @@
+"""
+Import-time regression benchmark.
+
+Every statement runs in a fresh interpreter and its median wall time is compared against the
+budget below; the script exits non-zero when a budget is exceeded or a heavy dependency is
+imported eagerly.
+
+    Statement                                            Budget   Must not import
+    import tufte                                         0.05s    pandas, openai, matplotlib, plotly, altair
+    from tufte.components.summarizer import Summarizer   1.50s    openai, matplotlib, plotly, altair
+    from tufte import Orchestrator                       2.00s    openai, matplotlib, plotly, altair
+
+    python benchmarks/bench_import.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "openai", "matplotlib", "plotly", "altair"]
+BUDGETS = [
+    ("import tufte", 0.05, HEAVY_MODULES),
+    ("from tufte.components.summarizer import Summarizer", 1.5, HEAVY_MODULES[1:]),
+    ("from tufte import Orchestrator", 2.0, HEAVY_MODULES[1:]),
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": [m for m in {modules!r} if m in sys.modules]}}))
+"""
+
+
+def measure(statement: str, modules, repeat: int):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))}
+    timings, loaded = [], set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(statement=statement, modules=modules)],
+            capture_output=True, text=True, check=True, env=env,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["elapsed"])
+        loaded.update(result["modules"])
+    return statistics.median(timings), sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'statement':<55} {'median (s)':>10} {'budget (s)':>10}  eager imports")
+    for statement, budget, forbidden in BUDGETS:
+        elapsed, loaded = measure(statement, forbidden, args.repeat)
+        over = elapsed > budget or loaded
+        failed = failed or bool(over)
+        print(f"{statement:<55} {elapsed:>10.3f} {budget:>10.2f}  {', '.join(loaded) or '-'}{'  FAIL' if over else ''}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
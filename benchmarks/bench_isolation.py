@@ -0,0 +1,142 @@
+"""
+Check that generated code cannot mutate the caller's data and measure what each isolation mode costs.
+
+Each mode runs snippets that mutate `data` in place through CodeExecutor: column assignment,
+inplace=True calls, .loc writes and writes through the ndarray of a column. After every snippet the
+caller's frame is checked against its original fingerprint, and the peak memory traced while
+executing is reported. "deepcopy" is the previous workaround of deep-copying the frame before every
+call; "shared" hands snippets the frame itself and must leak, which shows the mutations are real.
+
+The same snippets then run through an ExecutionPool, each followed by a probe snippet that fails if
+the worker's copy of the shared frame changed, so a write through to the shared memory is caught.
+
+The script exits with an error if a mutation leaks where it must not, or if a snippet fails for
+any reason other than a refused write to read-only data, since a snippet that never runs cannot
+show a leak.
+
+    python benchmarks/bench_isolation.py --rows 1000000
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from tufte.components.code_executor import CodeExecutor
+from tufte.components.execution_pool import ExecutionPool
+
+SNIPPET = """
+import matplotlib.pyplot as plt
+import pandas as pd
+
+
+def plot(data):
+    {body}
+    fig, ax = plt.subplots(figsize=(2, 2))
+    ax.plot([0, 1], [0, len(data)])
+    return plt
+
+
+chart = plot(data)
+"""
+MUTATIONS = [
+    "data['value'] = data['value'] * 2",
+    "data.dropna(inplace=True)",
+    "data.sort_values('value', inplace=True)",
+    "data.loc[data['value'] > 0, 'value'] = 0",
+    "data['label'] = data['label'].str.upper()",
+    "data['count'].values[:] = -1",
+    "data['value'].to_numpy()[0] = 1e9",
+]
+# fails if the data the snippet sees is no longer the original
+PROBE = "assert int(pd.util.hash_pandas_object(data).sum()) == {fingerprint}, 'the worker data was mutated'"
+
+
+def fingerprint(df: pd.DataFrame) -> int:
+    return int(pd.util.hash_pandas_object(df).sum())
+
+
+def refused_write(result) -> bool:
+    # read-only views and copy-on-write arrays reject writes through their buffers
+    return "read-only" in result["error"]["message"]
+
+
+def check_mutations(execute, frame: pd.DataFrame, mode: str, probe: bool = False):
+    """
+    Run every mutation on `frame` and return the failed snippet count, the mutations that leaked
+    into `frame` and the errors that are not refused writes.
+    """
+    before = fingerprint(frame)
+    failed, leaked, unexpected = 0, [], []
+    for mutation in MUTATIONS:
+        snippets = [SNIPPET.format(body=mutation)]
+        if probe:
+            snippets.append(SNIPPET.format(body=PROBE.format(fingerprint=before)))
+        for result in execute(snippets, frame, library="matplotlib", return_error=True):
+            if result["status"]:
+                continue
+            failed += 1
+            if result["code"] != snippets[0]:
+                leaked.append(f"{mutation} (in the worker)")
+            elif mode == "shared" or not refused_write(result):
+                unexpected.append(f"{mode}: {mutation!r} failed: {result['error']['message']}")
+        if fingerprint(frame) != before:
+            leaked.append(mutation)
+            if mode != "shared":
+                frame = frame.copy()
+                before = fingerprint(frame)
+    return failed, leaked, unexpected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "value": np.where(rng.random(args.rows) < 0.01, np.nan, rng.normal(size=args.rows)),
+            "count": rng.integers(0, 100, args.rows),
+            "label": rng.choice(["a", "b", "c"], args.rows),
+        }
+    )
+    frame_bytes = data.memory_usage(deep=True).sum()
+    print(f"frame: {args.rows} rows, {frame_bytes / 2**20:.1f} MiB")
+    print(f"{'mode':<14} {'isolated':>8} {'failed snippets':>16} {'peak (MiB)':>11} {'time (s)':>9}")
+
+    problems: List[str] = []
+    for mode in ("shared", "deepcopy", "copy_on_write", "read_only"):
+        executor = CodeExecutor(isolation="shared" if mode == "deepcopy" else mode)
+
+        def execute(code, frame, **options):
+            return executor.execute_code(code, frame.copy() if mode == "deepcopy" else frame, **options)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        failed, leaked, unexpected = check_mutations(execute, data.copy(), mode)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{mode:<14} {str(not leaked):>8} {failed:>16} {peak / 2**20:>11.1f} {elapsed:>9.2f}")
+        problems += unexpected
+        if mode == "shared" and len(leaked) < len(MUTATIONS):
+            problems.append(f"shared: expected every mutation to leak, only {len(leaked)} did")
+        elif mode != "shared":
+            problems += [f"{mode}: {mutation!r} mutated the caller's data" for mutation in leaked]
+
+    with ExecutionPool(n_workers=1) as pool:
+        start = time.perf_counter()
+        failed, leaked, unexpected = check_mutations(pool.execute_code, data.copy(), "pool", probe=True)
+        print(f"{'pool':<14} {str(not leaked):>8} {failed:>16} {'':>11} {time.perf_counter() - start:>9.2f}")
+    problems += unexpected + [f"pool: {mutation!r} mutated the data" for mutation in leaked]
+
+    if problems:
+        sys.exit("Isolation check failed:\n" + "\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
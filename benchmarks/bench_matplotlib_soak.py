@@ -0,0 +1,126 @@
+"""
+Soak-test matplotlib and seaborn rendering: thousands of charts from a thread pool, with flat memory.
+
+Worker threads share one CodeExecutor and execute batches that mix snippets which succeed, open
+several figures, or raise after drawing. The script samples the process RSS and the number of live
+Python objects every --report charts and fails if a figure is left open, if a chart is missing, or if memory
+after the warmup keeps growing by more than --max-growth MB.
+
+    python benchmarks/bench_matplotlib_soak.py --charts 5000 --threads 8
+"""
+import argparse
+import gc
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import psutil
+
+from tufte.components.code_executor import CodeExecutor
+
+MATPLOTLIB = """
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots(figsize=(3, 2))
+ax.plot(data["x"], data["y"])
+ax.set_title(f"{len(data)} rows")
+chart = plt
+"""
+SEABORN = """
+import seaborn as sns
+import matplotlib.pyplot as plt
+plt.figure(figsize=(3, 2))
+sns.histplot(data=data, x="y", hue="group")
+chart = plt
+"""
+# opens a scratch figure next to the one it returns
+SEVERAL_FIGURES = """
+import matplotlib.pyplot as plt
+scratch = plt.figure()
+scratch.add_subplot().bar(data["group"].unique(), 1)
+fig = plt.figure(figsize=(3, 2))
+fig.add_subplot().scatter(data["x"], data["y"], s=2)
+chart = fig
+"""
+# draws, then fails, which used to leave its figure open
+FAILING = """
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots(figsize=(3, 2))
+ax.plot(data["x"], data["y"])
+chart = data["missing column"]
+"""
+BATCH = [MATPLOTLIB, SEABORN, SEVERAL_FIGURES, FAILING]
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def open_figures() -> int:
+    import matplotlib.pyplot as plt
+
+    return len(plt.get_fignums())
+
+
+def make_data(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {"x": np.arange(rows), "y": rng.normal(size=rows).cumsum(), "group": rng.choice(list("abcd"), rows)}
+    )
+
+
+def render_batch(executor: CodeExecutor, data: pd.DataFrame) -> int:
+    results = executor.execute_code(BATCH, data=data, library="seaborn", return_error=True)
+    assert [result["status"] for result in results] == [True, True, True, False], results
+    assert all(result["image"][:4] == b"\x89PNG" for result in results[:3])
+    return 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--charts", type=int, default=5_000, help="charts to render, failing snippets excluded")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--report", type=int, default=500, help="sample memory every this many charts")
+    parser.add_argument("--warmup", type=int, default=300, help="charts rendered before the baseline is taken")
+    parser.add_argument("--max-growth", type=float, default=30.0, help="allowed RSS growth after warmup, in MB")
+    args = parser.parse_args()
+
+    # the failing snippets log an error each
+    logging.getLogger("tufte").setLevel(logging.CRITICAL)
+    data = make_data(args.rows)
+    executor = CodeExecutor(validate=False)
+    batches = -(-args.charts // len(BATCH[:-1]))
+    warmup_batches = -(-args.warmup // len(BATCH[:-1]))
+
+    with ThreadPoolExecutor(args.threads) as pool:
+        for _ in pool.map(lambda _: render_batch(executor, data), range(warmup_batches)):
+            pass
+        gc.collect()
+        baseline_rss, baseline_objects = rss_mb(), len(gc.get_objects())
+        print(f"after {warmup_batches * 3} warmup charts: rss {baseline_rss:.1f} MB, {open_figures()} open figures")
+
+        start, charts, samples = time.perf_counter(), 0, []
+        for rendered in pool.map(lambda _: render_batch(executor, data), range(batches)):
+            charts += rendered
+            if charts % args.report < rendered:
+                gc.collect()
+                objects = len(gc.get_objects()) - baseline_objects
+                samples.append(rss_mb())
+                print(
+                    f"{charts:>6} charts  rss {samples[-1]:7.1f} MB  objects {objects:+7d}  "
+                    f"open figures {open_figures()}  {charts / (time.perf_counter() - start):6.1f} charts/s"
+                )
+
+    growth = samples[-1] - baseline_rss
+    # compare the second half with the first, so a steady leak is caught even under the threshold
+    half = len(samples) // 2
+    drift = np.mean(samples[half:]) - np.mean(samples[:half]) if half else 0.0
+    print(f"{charts} charts on {args.threads} threads: rss grew {growth:+.1f} MB, drift {drift:+.1f} MB")
+    assert open_figures() == 0, f"{open_figures()} figures left open"
+    assert growth < args.max_growth, f"rss grew by {growth:.1f} MB"
+
+
+if __name__ == "__main__":
+    main()
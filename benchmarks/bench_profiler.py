@@ -0,0 +1,37 @@
+"""
+Measure how the column profiler scales with row and column counts.
+
+    python benchmarks/bench_profiler.py --rows 10000 100000 1000000 --columns 10 100 500
+"""
+import argparse
+import time
+
+from synthetic import make_frame
+from tufte.components.profiler import ColumnProfiler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--columns", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'columns':>8} {'exact (s)':>10} {'approx (s)':>11}")
+    for n_rows in args.rows:
+        for n_columns in args.columns:
+            df = make_frame(n_rows, n_columns)
+            timings = []
+            for approximate in (False, True):
+                profiler = ColumnProfiler(approximate=approximate)
+                best = float("inf")
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    profiler.profile(df)
+                    best = min(best, time.perf_counter() - start)
+                timings.append(best)
+            print(f"{n_rows:>10} {n_columns:>8} {timings[0]:>10.3f} {timings[1]:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
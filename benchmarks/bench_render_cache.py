@@ -0,0 +1,75 @@
+"""
+Measure what RenderCache saves when a report is executed again or repeats charts.
+
+A report of --charts altair snippets, where every --duplicates-th snippet builds the same chart as
+the one before it with different code, is executed without a cache, where the duplicates are
+rendered once already, then twice with a cache file: cold, and warm from a new connection, which
+executes and renders nothing.
+
+    python benchmarks/bench_render_cache.py --rows 50000 --charts 12
+"""
+import argparse
+import tempfile
+import time
+
+from synthetic import make_frame
+
+from tufte.components.code_executor import CodeExecutor
+from tufte.components.render_cache import RenderCache
+
+CHART = """
+import altair as alt
+chart = alt.Chart(data).mark_bar().encode(x=alt.X("{x}", bin=alt.Bin(maxbins={bins})), y="count()")
+"""
+# the same chart as CHART, written differently
+EQUIVALENT = """
+import altair as alt
+base = alt.Chart(data)
+chart = base.mark_bar().encode(
+    x=alt.X('{x}', bin=alt.Bin(maxbins={bins})),
+    y='count()',
+)
+"""
+
+
+def make_report(data, charts: int, duplicates: int):
+    numeric = [column for column in data.columns if data[column].dtype.kind in "if"]
+    code = []
+    for index in range(charts):
+        template = EQUIVALENT if duplicates and index % duplicates == duplicates - 1 else CHART
+        # an equivalent snippet repeats the chart just before it
+        position = index - 1 if template is EQUIVALENT else index
+        code.append(template.format(x=numeric[position % len(numeric)], bins=10 + position))
+    return code
+
+
+def run(executor: CodeExecutor, code, data) -> float:
+    start = time.perf_counter()
+    results = executor.execute_code(code, data, library="altair")
+    assert len(results) == len(code) and all(result["status"] and result.get("image") for result in results)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--charts", type=int, default=12)
+    parser.add_argument("--duplicates", type=int, default=3, help="every n-th snippet repeats the chart before it")
+    args = parser.parse_args()
+
+    data = make_frame(args.rows, 8, seed=0)
+    code = make_report(data, args.charts, args.duplicates)
+    # warm up altair and vl-convert
+    run(CodeExecutor(validate=False), code[:1], data)
+    print(f"no cache:    {run(CodeExecutor(validate=False), code, data):6.2f}s")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = RenderCache(f"{directory}/render_cache.sqlite")
+        print(f"cold cache:  {run(CodeExecutor(validate=False, cache=cache), code, data):6.2f}s")
+        # a new executor and connection, as when a report is run again in a new process
+        cache = RenderCache(f"{directory}/render_cache.sqlite")
+        print(f"warm cache:  {run(CodeExecutor(validate=False, cache=cache), code, data):6.3f}s")
+        print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Measure local semantic type inference and what it saves the enrichment LLM call.
+
+A frame with columns of known semantic types (emails, URLs, coordinates, zip codes, ...) is
+summarized with enrich=True against the fake LLM server, once with every column sent to the LLM
+and once with SemanticTypeInference typing columns locally. The script reports the time of the
+local inference, how many labels it got right, and the size of the LLM request and response.
+
+    python benchmarks/bench_semantic_types.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from fake_llm import FakeLLMServer
+
+
+def make_typed_frame(rows: int, seed: int = 0):
+    """
+    Return a frame and the semantic type expected for each column; None where only the LLM can tell.
+    """
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows)
+    columns = {
+        "customer_id": (index, "id"),
+        "email": (pd.Series(index).map("user{}@example.com".format), "email"),
+        "website": (pd.Series(index).map("https://shop{}.example.org/".format), "url"),
+        "latitude": (rng.uniform(-60, 70, rows), "latitude"),
+        "longitude": (rng.uniform(-170, 170, rows), "longitude"),
+        "zip": (pd.Series(rng.integers(1000, 99999, rows)).map("{:05d}".format), "zipcode"),
+        "signup_year": (rng.integers(1995, 2025, rows), "year"),
+        "order_date": (pd.Series(pd.date_range("2021-01-01", periods=rows, freq="min")).astype(str), "date"),
+        "gender": (rng.choice(["female", "male", "other"], rows), "gender"),
+        "city": (rng.choice(["Lagos", "Lima", "Oslo", "Pune", "Quito"], rows), "city"),
+        "state": (rng.choice(["CA", "NY", "TX", "WA", "IL"], rows), "state"),
+        "unit_price": (rng.gamma(2.0, 15.0, rows).round(2), "currency"),
+        "ip": (pd.Series(index % 65536).map(lambda value: f"10.1.{value // 256}.{value % 256}"), "ip_address"),
+        "discount": (pd.Series(index % 40).map("{}%".format), "percentage"),
+        "subscribed": (rng.choice(["yes", "no"], rows), "boolean"),
+        "score": (rng.normal(size=rows), "number"),
+        "segment": (rng.choice(["alpha", "beta", "gamma"], rows), None),
+        "comment": (rng.choice(["arrived late but well packed", "great value for the price paid"], rows), None),
+    }
+    frame = pd.DataFrame({name: values for name, (values, _) in columns.items()})
+    return frame, {name: expected for name, (_, expected) in columns.items()}
+
+
+def enrich(frame: pd.DataFrame, semantic_types: bool) -> dict:
+    from tufte.components.summarizer import Summarizer
+    from tufte.components.tracing import Tracer
+
+    spans = []
+    tracer = Tracer()
+    tracer.add_exporter(spans.append)
+    start = time.perf_counter()
+    summary = Summarizer(tracer=tracer, semantic_types=semantic_types).summarize(frame, enrich=True)
+    elapsed = time.perf_counter() - start
+    completions = [span for span in spans if span.name == "llm.completion"]
+    local = [span for span in spans if span.name == "summarizer.semantic_types"]
+    return {
+        "summary": summary,
+        "seconds": elapsed,
+        "inference_seconds": sum(span.duration for span in local),
+        "request_bytes": sum(span.attributes["request_bytes"] for span in completions),
+        "response_bytes": sum(span.attributes["response_bytes"] for span in completions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the fake server waits per request")
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    frame, expected = make_typed_frame(args.rows)
+    with FakeLLMServer(latency=args.llm_latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "fake"
+        for semantic_types in (False, True):
+            run = enrich(frame, semantic_types)
+            print(
+                f"semantic_types={semantic_types!s:5}  summarize {run['seconds']:.2f}s  "
+                f"local inference {run['inference_seconds']:.3f}s  "
+                f"LLM request {run['request_bytes']} bytes, response {run['response_bytes']} bytes"
+            )
+        fields = run["summary"]["fields"]
+        typed = {name: expected[name] for name in expected if expected[name] is not None}
+        correct = sum(1 for name, semantic_type in typed.items() if fields[name].get("semantic_type") == semantic_type)
+        described = sorted(name for name, properties in fields.items() if "description" in properties)
+        print(f"{correct} of {len(typed)} known types inferred locally; sent to the LLM: {', '.join(described)}")
+
+
+if __name__ == "__main__":
+    main()
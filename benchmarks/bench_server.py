@@ -0,0 +1,139 @@
+"""
+Exercise the ASGI service (tufte.server) in-process against the fake LLM server.
+
+Requests are sent straight to the ASGI application, so no HTTP server or network is needed. The
+script checks that an upload is parsed once, that concurrent identical requests are computed once
+(counting the requests the fake LLM receives), that concurrent requests on different datasets
+chart their own data, and that the registry evicts least recently used datasets by size.
+
+    python benchmarks/bench_server.py --clients 16 --llm-latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+from fake_llm import FakeLLMServer
+from synthetic import make_frame
+
+
+async def call(app, method: str, path: str, body=b"", query: str = "", headers=()):
+    """
+    Send one request to an ASGI application and return its status and decoded JSON body.
+    """
+    if isinstance(body, dict):
+        body, headers = json.dumps(body).encode(), [(b"content-type", b"application/json")]
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(), "headers": list(headers)}
+    await app(scope, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+def upload(app, frame, name: str):
+    content = frame if isinstance(frame, bytes) else frame.to_csv(index=False).encode()
+    return call(app, "POST", "/datasets", content, query=f"format=csv&name={name}")
+
+
+async def bench_upload(app, rows: int):
+    frame = make_frame(rows, 8, seed=1).to_csv(index=False).encode()
+    start = time.perf_counter()
+    status, first = await upload(app, frame, "upload.csv")
+    parse_time = time.perf_counter() - start
+    start = time.perf_counter()
+    again, second = await upload(app, frame, "upload.csv")
+    hit_time = time.perf_counter() - start
+    assert (status, again) == (201, 200) and first["dataset_id"] == second["dataset_id"]
+    print(f"upload {rows} rows: parsed in {parse_time:.3f}s, registered again in {hit_time:.3f}s")
+    return first["dataset_id"]
+
+
+async def bench_coalescing(app, server: FakeLLMServer, dataset_id: str, clients: int):
+    async def client():
+        start = time.perf_counter()
+        _, goals = await call(app, "POST", "/goals", {"dataset_id": dataset_id, "n_goals": 2})
+        _, charts = await call(
+            app, "POST", "/visualize", {"dataset_id": dataset_id, "goal": goals["goals"][0], "library": "altair"}
+        )
+        assert charts["charts"] and charts["charts"][0]["status"], charts
+        return time.perf_counter() - start
+
+    before = server.requests
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(client() for _ in range(clients)))
+    wall_time = time.perf_counter() - start
+    _, stats = await call(app, "GET", "/stats")
+    print(
+        f"{clients} identical clients: {server.requests - before} LLM requests, "
+        f"{stats['coalescer']['coalesced']} requests coalesced, p50 {statistics.median(latencies):.2f}s, "
+        f"wall {wall_time:.2f}s"
+    )
+
+
+async def bench_isolation(app):
+    small, large = make_frame(50, 4, seed=2), make_frame(400, 4, seed=3)
+    (_, a), (_, b) = await asyncio.gather(upload(app, small, "small.csv"), upload(app, large, "large.csv"))
+    goal = {"question": "How are the values distributed?", "visualization": "histogram", "rationale": ""}
+    (_, charts_a), (_, charts_b) = await asyncio.gather(
+        call(app, "POST", "/visualize", {"dataset_id": a["dataset_id"], "goal": goal, "altair_data": "inline"}),
+        call(app, "POST", "/visualize", {"dataset_id": b["dataset_id"], "goal": goal, "altair_data": "inline"}),
+    )
+    rows = []
+    for charts in (charts_a, charts_b):
+        spec = charts["charts"][0]["spec"]
+        spec = json.loads(spec) if isinstance(spec, str) else spec
+        datasets = spec.get("datasets") or {}
+        rows.append(sum(len(values) for values in datasets.values()) or len(spec.get("data", {}).get("values", [])))
+    assert rows[0] <= 50 < rows[1], rows
+    print(f"concurrent datasets chart their own data: {rows[0]} and {rows[1]} rows")
+
+
+async def bench_eviction():
+    from tufte.server import TufteServer
+
+    frames = [make_frame(5_000, 6, seed=seed) for seed in range(3)]
+    nbytes = int(frames[0].memory_usage(deep=True).sum())
+    app = TufteServer(max_bytes=int(2.5 * nbytes))
+    ids = [(await upload(app, frame, f"d{index}.csv"))[1]["dataset_id"] for index, frame in enumerate(frames)]
+    status, _ = await call(app, "POST", "/summarize", {"dataset_id": ids[0]})
+    _, stats = await call(app, "GET", "/stats")
+    assert status == 404 and stats["registry"]["evictions"] == 1, (status, stats)
+    print(f"registry of {app.registry.max_bytes} bytes kept {stats['registry']['datasets']} datasets, evicted the oldest")
+
+
+async def main_async(args):
+    from tufte import LLMCache
+    from tufte.server import TufteServer
+
+    with FakeLLMServer(latency=args.llm_latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "fake"
+        app = TufteServer(cache=LLMCache(":memory:"))
+        dataset_id = await bench_upload(app, args.rows)
+        await bench_coalescing(app, server, dataset_id, args.clients)
+        await bench_isolation(app)
+        await bench_eviction()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000, help="rows of the uploaded dataset")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients sending the same requests")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds the fake server waits per request")
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
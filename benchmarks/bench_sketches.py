@@ -0,0 +1,66 @@
+"""
+Check the distinct counts of streaming profiles and measure the HyperLogLog sketch.
+
+A CSV whose integer column has --distinct values and one blank cell is profiled in chunks; the chunk
+holding the blank cell is read as float64 and the others as int64, and both must count the same
+numbers once. The script prints the counts of an integer, a float and a text column, the time to
+sketch --rows values, and exits with an error if a count is off by more than --tolerance.
+
+    python benchmarks/bench_sketches.py --rows 200000 --distinct 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from tufte.components.sketches import HyperLogLog
+from tufte.components.streaming import profile_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--distinct", type=int, default=500)
+    parser.add_argument("--tolerance", type=float, default=0.05, help="relative error allowed in a distinct count")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    integers = pd.Series(rng.integers(0, args.distinct, args.rows), dtype="Int64")
+    integers[args.rows // 2] = pd.NA
+    data = pd.DataFrame(
+        {
+            "integer": integers,
+            "float": rng.integers(0, args.distinct, args.rows) / 4,
+            "text": pd.Series(rng.integers(0, args.distinct, args.rows)).map("item-{}".format),
+        }
+    )
+    expected = {column: int(data[column].nunique()) for column in data.columns}
+
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "data.csv")
+        data.to_csv(path, index=False)
+        start = time.perf_counter()
+        properties = profile_file(path).finalize()
+        print(f"profiled {args.rows} rows in chunks in {time.perf_counter() - start:.2f}s")
+    for column, count in expected.items():
+        estimate = properties[column]["num_unique_values"]
+        print(f"{column:<8} distinct {count:>8}  estimated {estimate:>8}")
+        if abs(estimate - count) > args.tolerance * count:
+            problems.append(f"{column}: estimated {estimate} distinct values, expected {count}")
+
+    values = pd.Series(rng.integers(0, args.rows, args.rows))
+    start = time.perf_counter()
+    HyperLogLog().update(values)
+    print(f"sketched {args.rows} integers in {time.perf_counter() - start:.3f}s")
+
+    if problems:
+        sys.exit("Distinct counts are off:\n" + "\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Check that an Orchestrator with a SummaryCache serves a repeated summary of a large file from the cache.
+
+A CSV with more rows than read_dataframe keeps is written and summarized with enrich=True twice by
+a new Orchestrator sharing one cache file, as when the tufte command runs again. The second run
+must draw the same sample, so every column is served from the cache and no LLM request is made.
+The script prints both runs and exits with an error otherwise.
+
+    python benchmarks/bench_summary_cache.py --rows 150000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from fake_llm import FakeLLMServer
+from synthetic import make_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=150_000)
+    parser.add_argument("--columns", type=int, default=6)
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from tufte.components.orchestrator import Orchestrator
+    from tufte.components.summary_cache import SummaryCache
+
+    with tempfile.TemporaryDirectory() as directory, FakeLLMServer() as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "fake"
+        path = os.path.join(directory, "data.csv")
+        make_frame(args.rows, args.columns, seed=0).to_csv(path, index=False)
+        runs = []
+        for run in ("cold", "warm"):
+            cache = SummaryCache(os.path.join(directory, "summary_cache.sqlite"))
+            requests = server.requests
+            start = time.perf_counter()
+            Orchestrator(summary_cache=cache).summarize(path, enrich=True)
+            stats = cache.stats()
+            runs.append({**stats, "llm_requests": server.requests - requests})
+            print(
+                f"{run}: {time.perf_counter() - start:.2f}s, {stats['hits']} cache hits, {stats['misses']} misses, "
+                f"{runs[-1]['llm_requests']} LLM requests"
+            )
+    if runs[1]["misses"] or runs[1]["llm_requests"]:
+        sys.exit("The repeated summary was not served from the summary cache")
+
+
+if __name__ == "__main__":
+    main()
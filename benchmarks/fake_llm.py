@@ -0,0 +1,254 @@
+"""
+A local stand-in for the OpenAI chat completions API that returns canned summaries, goals and chart code.
+
+Responses are derived from the prompts tufte sends, so the goals and code refer to real fields of the
+summarized dataset and the generated snippets execute. Requests with stream=True are answered with
+server-sent events, like the real API. Point the OpenAI clients at it with
+
+    server = FakeLLMServer(latency=0.2).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+CHART_CODE = {
+    "altair": """
+import altair as alt
+def plot(data: pd.DataFrame):
+    return alt.Chart(data).mark_bar().encode(x=alt.X('{category}:N'), y=alt.Y('mean({number}):Q'))
+
+chart = plot(data)
+""",
+    "matplotlib": """
+import pandas as pd
+import matplotlib.pyplot as plt
+def plot(data: pd.DataFrame):
+    data.groupby('{category}')['{number}'].mean().plot(kind='bar')
+    plt.title('{number} by {category}')
+    return plt
+
+chart = plot(data)
+""",
+    "seaborn": """
+import seaborn as sns
+import pandas as pd
+import matplotlib.pyplot as plt
+def plot(data: pd.DataFrame):
+    sns.barplot(data=data, x='{category}', y='{number}', errorbar=None)
+    return plt
+
+chart = plot(data)
+""",
+    "ggplot": """
+import plotnine as p9
+def plot(data: pd.DataFrame):
+    chart = p9.ggplot(data, p9.aes(x='{category}', y='{number}')) + p9.stat_summary(fun_y=lambda y: y.mean(), geom='col')
+    return chart
+
+chart = plot(data)
+""",
+    "plotly": """
+import plotly.express as px
+def plot(data: pd.DataFrame):
+    fig = px.histogram(data, x='{category}', y='{number}', histfunc='avg')
+    return fig
+
+chart = plot(data)
+""",
+}
+STREAM_CHUNK_CHARS = 32
+
+
+def _pick_fields(fields: Dict) -> Tuple[str, str]:
+    names = list(fields)
+    numbers = [name for name in names if fields[name].get("dtype") == "number"]
+    categories = [name for name in names if fields[name].get("dtype") in ("category", "boolean", "string")]
+    number = numbers[0] if numbers else names[0]
+    category = categories[0] if categories else names[-1]
+    return category, number
+
+
+def _summary_fields(text: str) -> Dict:
+    try:
+        # the json encoding may be followed by a line naming the fields left out
+        summary = json.JSONDecoder().raw_decode(text.strip())[0]
+    except json.JSONDecodeError:
+        # the table encoding: one "name | dtype | ..." line per field after the header
+        lines = text.split("Fields, one per line", 1)[-1].splitlines()[1:]
+        cells = [line.split(" | ") for line in lines if " | " in line]
+        return {row[0]: {"dtype": row[1]} for row in cells}
+    return summary.get("fields", summary)
+
+
+def respond(messages: List[Dict]) -> str:
+    """
+    Return the canned completion for a tufte prompt.
+    """
+    system = messages[0]["content"]
+    last = messages[-1]["content"]
+    if "summarize a dataset" in system:
+        fields = json.loads(last)
+        if "fields_to_describe" in fields:
+            # columns typed locally are left out of the request
+            fields = {name: fields["fields"][name] for name in fields["fields_to_describe"]}
+        return json.dumps(
+            {
+                "description": "A synthetic benchmark dataset",
+                "fields": {
+                    name: {"description": f"The {name} field", "semantic_type": properties.get("dtype", "string")}
+                    for name, properties in fields.items()
+                },
+            }
+        )
+    goals_request = re.match(r"Generate (\d+) goals given the following data summary: (.*)", last, re.DOTALL)
+    if goals_request:
+        n_goals = int(goals_request.group(1))
+        category, number = _pick_fields(_summary_fields(goals_request.group(2)))
+        return json.dumps(
+            {
+                "goals": [
+                    {
+                        "reasoning": f"Compare {number} across {category}",
+                        "question": f"How does the mean of {number} vary by {category}? ({index + 1})",
+                        "visualization": f"Bar chart of mean {number} by {category}",
+                        "statistic": f"Mean of {number}",
+                    }
+                    for index in range(n_goals)
+                ]
+            }
+        )
+    batch = re.findall(r"^\s*(\d+)\. plot\(data\) method should generate .* using (\w+) that addresses", system, re.MULTILINE)
+    if batch and last.startswith("Dataset summary is : "):
+        category, number = _pick_fields(_summary_fields(last[len("Dataset summary is : "):]))
+        return "\n".join(
+            f'<goal id="{index}">\nPlan: aggregate {number} by {category}.\n'
+            f'```python{CHART_CODE[library].format(category=category, number=number)}```\n</goal>'
+            for index, library in batch
+        )
+    library = re.search(r" using (\w+) that addresses this goal", system)
+    if library and last.startswith("Dataset summary is : "):
+        category, number = _pick_fields(_summary_fields(last[len("Dataset summary is : "):]))
+        code = CHART_CODE[library.group(1)].format(category=category, number=number)
+        return f"Plan: aggregate {number} by {category} and draw bars.\n```python{code}```"
+    return "{}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        content = respond(request["messages"])
+        prompt_tokens = sum(len(message["content"]) for message in request["messages"]) // 4
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion = {
+            "id": f"chatcmpl-fake-{self.server.next_id()}",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+        }
+        if request.get("stream"):
+            self._stream(request, content, completion, usage)
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = json.dumps(
+            {
+                **completion,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, request: Dict, content: str, completion: Dict, usage: Dict) -> None:
+        """
+        Send the completion as server-sent events in STREAM_CHUNK_CHARS pieces. The first piece
+        arrives after a fifth of the latency and the rest are spread evenly over the remainder.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = [content[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(content), STREAM_CHUNK_CHARS)]
+        if self.server.latency:
+            time.sleep(self.server.latency / 5)
+        for index, piece in enumerate(pieces):
+            if index and self.server.latency:
+                time.sleep(self.server.latency * 4 / 5 / len(pieces))
+            self._send_event({**completion, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}
+            ]})
+        self._send_event({**completion, "object": "chat.completion.chunk", "choices": [
+            {"index": 0, "delta": {}, "finish_reason": "stop"}
+        ]})
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event({**completion, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_event(self, event: Dict) -> None:
+        self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Serves canned chat completions on localhost from a background thread, sleeping `latency`
+    seconds per request to stand in for model time.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def next_id(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
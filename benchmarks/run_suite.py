@@ -0,0 +1,268 @@
+"""
+Run the offline end-to-end benchmark suite and save its results.
+
+Every LLM call goes to a local fake server (fake_llm.py), so runs need no API key or network and
+measure only tufte's own work plus a fixed, configurable model latency. Scenarios:
+
+    summarize   Summarizer.summarize over synthetic frames of varying rows, columns and dtypes
+    execute     CodeExecutor.execute_code per library, with rendering timed separately
+    pipeline    Orchestrator summarize -> explore_goals -> visualize for every goal, one code
+                request per goal, batched into one request and streamed (visualize_stream); each
+                mode also reports the median time until its first chart
+
+Each scenario reports p50/p90/p99 latency over --repeat runs and the peak memory traced during one
+extra run. Results are written to --output as JSON; pass --compare with an earlier file to print
+the change in p50 latency and peak memory per case.
+
+    python benchmarks/run_suite.py --quick
+    python benchmarks/run_suite.py --output results/after.json --compare results/before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from fake_llm import CHART_CODE, FakeLLMServer
+from synthetic import DTYPES, make_frame
+
+LIBRARIES = ("altair", "matplotlib", "seaborn", "ggplot", "plotly")
+SUMMARIZE_GRID = [(10_000, 10), (100_000, 10), (100_000, 50), (1_000_000, 10)]
+QUICK_SUMMARIZE_GRID = [(10_000, 10), (100_000, 10)]
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int = 1) -> Dict:
+    """
+    Time `func` over `repeat` runs after `warmup` untimed runs, then trace its peak memory in one more run.
+    Timed runs are not traced, since tracemalloc slows allocation-heavy code several fold.
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99])
+    return {
+        "runs": repeat,
+        "mean_s": float(np.mean(timings)),
+        "p50_s": float(p50),
+        "p90_s": float(p90),
+        "p99_s": float(p99),
+        "peak_memory_mib": peak / 2**20,
+    }
+
+
+def bench_summarize(grid, repeat: int) -> List[Dict]:
+    from tufte.components.summarizer import Summarizer
+
+    results = []
+    summarizer = Summarizer()
+    for n_rows, n_columns in grid:
+        df = make_frame(n_rows, n_columns, dtypes=DTYPES)
+        for approximate in (False, True):
+            stats = measure(lambda: summarizer.summarize(df, approximate=approximate), repeat)
+            name = f"{n_rows}x{n_columns}{' approximate' if approximate else ''}"
+            results.append(
+                {
+                    "scenario": "summarize",
+                    "name": name,
+                    "params": {"rows": n_rows, "columns": n_columns, "approximate": approximate},
+                    **stats,
+                }
+            )
+            report(results[-1])
+    return results
+
+
+def _chart_frame(n_rows: int) -> pd.DataFrame:
+    return make_frame(n_rows, 4, dtypes=("category", "float", "int", "date"))
+
+
+def bench_execute(libraries, n_rows: int, repeat: int) -> List[Dict]:
+    from tufte.components.code_executor import CodeExecutor
+
+    df = _chart_frame(n_rows)
+    results = []
+    executor = CodeExecutor()
+    render_timings = []
+    render_batch = executor.renderer.render_batch
+
+    def timed_render_batch(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return render_batch(*args, **kwargs)
+        finally:
+            render_timings.append(time.perf_counter() - start)
+
+    executor.renderer.render_batch = timed_render_batch
+    for library in libraries:
+        code = CHART_CODE[library].format(category="category_0", number="float_1")
+        charts = executor.execute_code([code], df, library=library, return_error=True)
+        if not charts or not charts[0]["status"]:
+            print(f"skipping {library}: {charts[0]['error']['message'] if charts else 'no result'}")
+            continue
+        render_timings.clear()
+        stats = measure(lambda: executor.execute_code([code], df, library=library), repeat, warmup=0)
+        timed_renders = render_timings[:repeat]
+        stats["render_p50_s"] = float(np.percentile(timed_renders, 50)) if timed_renders else 0.0
+        results.append(
+            {"scenario": "execute", "name": library, "params": {"rows": n_rows, "library": library}, **stats}
+        )
+        report(results[-1])
+    executor.renderer.close()
+    return results
+
+
+def bench_pipeline(libraries, n_rows: int, n_goals: int, repeat: int) -> List[Dict]:
+    from tufte.components.orchestrator import Orchestrator
+
+    df = _chart_frame(n_rows)
+    results = []
+    for library in libraries:
+        for mode in ("", "batched", "streamed"):
+            orchestrator = Orchestrator()
+            first_chart_times = []
+
+            def run():
+                start = time.perf_counter()
+                summary = orchestrator.summarize(df, enrich=True)
+                goals = orchestrator.explore_goals(summary, n_goals=n_goals)
+                if mode == "batched":
+                    charts = orchestrator.visualize_goals(summary, goals, library=library)
+                    first_chart_times.append(time.perf_counter() - start)
+                    return charts
+                if mode == "streamed":
+                    charts = orchestrator.visualize_stream(summary, goals, library=library)
+                else:
+                    charts = (chart for goal in goals for chart in orchestrator.visualize(summary, goal, library=library))
+                collected = []
+                for chart in charts:
+                    if not collected:
+                        first_chart_times.append(time.perf_counter() - start)
+                    collected.append(chart)
+                return collected
+
+            charts = len(run())
+            if charts < n_goals:
+                print(f"{library}: only {charts} of {n_goals} goals produced a chart")
+            stats = measure(run, repeat)
+            stats["charts"] = charts
+            # the warmup and memory runs are included, which leaves the median unaffected in practice
+            stats["first_chart_p50_s"] = float(np.median(first_chart_times))
+            results.append(
+                {
+                    "scenario": "pipeline",
+                    "name": f"{library} {mode}".strip(),
+                    "params": {"rows": n_rows, "library": library, "goals": n_goals, "mode": mode or "per-goal"},
+                    **stats,
+                }
+            )
+            report(results[-1])
+            orchestrator.code_executor.renderer.close()
+    return results
+
+
+def report(result: Dict) -> None:
+    print(
+        f"{result['scenario']:<10} {result['name']:<24} {result['p50_s']:>9.3f} {result['p90_s']:>9.3f}"
+        f" {result['p99_s']:>9.3f} {result['peak_memory_mib']:>10.1f}"
+        + (f"   first chart {result['first_chart_p50_s']:.3f}" if "first_chart_p50_s" in result else "")
+    )
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: List[Dict], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["name"]): r for r in json.load(f)["results"]}
+    print(f"\ncompared to {baseline_path}")
+    print(f"{'scenario':<10} {'case':<24} {'p50 before':>10} {'p50 after':>10} {'change':>8} {'peak change':>12}")
+    for result in results:
+        before = baseline.get((result["scenario"], result["name"]))
+        if before is None:
+            continue
+        change = result["p50_s"] / before["p50_s"] - 1 if before["p50_s"] else 0.0
+        memory_change = result["peak_memory_mib"] - before["peak_memory_mib"]
+        print(
+            f"{result['scenario']:<10} {result['name']:<24} {before['p50_s']:>10.3f} {result['p50_s']:>10.3f}"
+            f" {change:>+8.1%} {memory_change:>+9.1f} MiB"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=["summarize", "execute", "pipeline"])
+    parser.add_argument("--libraries", nargs="+", default=list(LIBRARIES), choices=LIBRARIES)
+    parser.add_argument("--rows", type=int, default=5_000, help="rows of the frame charted by execute and pipeline")
+    parser.add_argument("--goals", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the fake server waits per request")
+    parser.add_argument("--quick", action="store_true", help="small summarize grid and 3 repeats")
+    parser.add_argument("--output", default=None, help="results file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+    repeat = 3 if args.quick else args.repeat
+
+    server = FakeLLMServer(latency=args.llm_latency).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    print(f"{'scenario':<10} {'case':<24} {'p50 (s)':>9} {'p90 (s)':>9} {'p99 (s)':>9} {'peak (MiB)':>10}")
+    results = []
+    try:
+        if "summarize" in args.scenarios:
+            results += bench_summarize(QUICK_SUMMARIZE_GRID if args.quick else SUMMARIZE_GRID, repeat)
+        if "execute" in args.scenarios:
+            results += bench_execute(args.libraries, args.rows, repeat)
+        if "pipeline" in args.scenarios:
+            results += bench_pipeline(args.libraries, args.rows, args.goals, repeat)
+    finally:
+        server.stop()
+
+    run = {"environment": environment(), "arguments": vars(args), "llm_requests": server.requests, "results": results}
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results", f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nsaved {len(results)} results to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Synthetic datasets shared by the benchmarks.
+"""
+import numpy as np
+import pandas as pd
+
+DTYPES = ("int", "float", "category", "string", "date", "date_string", "bool")
+
+
+def make_frame(n_rows: int, n_columns: int, dtypes=DTYPES[:5], seed: int = 0) -> pd.DataFrame:
+    """
+    Build a frame whose columns cycle through `dtypes`.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for i in range(n_columns):
+        kind = dtypes[i % len(dtypes)]
+        if kind == "int":
+            columns[f"int_{i}"] = rng.integers(0, 1000, n_rows)
+        elif kind == "float":
+            columns[f"float_{i}"] = rng.normal(size=n_rows)
+        elif kind == "category":
+            columns[f"category_{i}"] = rng.choice(["a", "b", "c", "d"], n_rows)
+        elif kind == "string":
+            columns[f"string_{i}"] = rng.integers(0, n_rows, n_rows).astype(str)
+        elif kind == "date":
+            columns[f"date_{i}"] = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 3650, n_rows), unit="D")
+        elif kind == "date_string":
+            dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 3650, n_rows), unit="D")
+            columns[f"date_string_{i}"] = dates.strftime("%Y-%m-%d")
+        elif kind == "bool":
+            columns[f"bool_{i}"] = rng.random(n_rows) < 0.5
+        else:
+            raise ValueError(f"Unknown dtype {kind}")
+    return pd.DataFrame(columns)
@@ -1,4 +1,24 @@
-from .components.orchestrator import Orchestrator
+import importlib
 
+_LAZY_ATTRIBUTES = {
+    "ExecutionPool": ".components.execution_pool",
+    "LLMCache": ".components.llm_cache",
+    "Orchestrator": ".components.orchestrator",
+    "RenderCache": ".components.render_cache",
+    "SummaryCache": ".components.summary_cache",
+    "Tracer": ".components.tracing",
+}
 
-__all__ = ["Orchestrator"]
+__all__ = ["ExecutionPool", "LLMCache", "Orchestrator", "RenderCache", "SummaryCache", "Tracer"]
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,429 @@
+"""
+Chart many datasets in one run: tufte summarizes each dataset, explores goals and visualizes them
+in parallel worker processes, then writes the charts and a results manifest to the output directory.
+
+Every finished dataset is appended to <output>/manifest.jsonl as soon as it completes, so an
+interrupted run started again with the same output directory skips the datasets already done.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import statistics
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.jsonl"
+
+# the orchestrator of a worker process, built once by _init_worker
+_orchestrator = None
+
+
+def dataset_id(path: str) -> str:
+    """
+    A stable directory name for a dataset: its file name plus a hash of its absolute path, so
+    datasets with the same name in different directories do not collide across runs.
+    """
+    name = re.sub(r"[^0-9a-zA-Z_.-]+", "_", os.path.basename(path)).strip("._") or "dataset"
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    return f"{name}-{digest}"
+
+
+def _is_data_file(path: str) -> bool:
+    from .components.utils import DATA_FILE_TYPES, get_file_extension
+
+    return "." in path and get_file_extension(path) in DATA_FILE_TYPES
+
+
+def find_datasets(paths: List[str], manifest: Optional[str] = None) -> List[Dict]:
+    """
+    Collect the datasets of a run from files, directories (searched recursively for data files)
+    and a manifest listing one dataset per line: a path, or a JSON object with a "path" and
+    optionally an "id" and the "goals" to visualize instead of exploring them.
+    """
+    datasets = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, directories, files in os.walk(path):
+                directories.sort()
+                datasets.extend(
+                    {"path": os.path.join(root, name)} for name in sorted(files) if _is_data_file(name)
+                )
+        elif os.path.exists(path):
+            datasets.append({"path": path})
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+    if manifest is not None:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                entry = json.loads(line) if line.startswith("{") else {"path": line}
+                # relative paths in a manifest are relative to the manifest
+                entry["path"] = os.path.join(base, os.path.expanduser(entry["path"]))
+                datasets.append(entry)
+    seen = set()
+    unique = []
+    for dataset in datasets:
+        dataset.setdefault("id", dataset_id(dataset["path"]))
+        if dataset["id"] not in seen:
+            seen.add(dataset["id"])
+            unique.append(dataset)
+    return unique
+
+
+def load_manifest(output: str) -> Dict[str, Dict]:
+    """
+    Return the latest record of every dataset in the results manifest. A line cut short by an
+    interrupted write is ignored, so its dataset runs again.
+    """
+    records = {}
+    path = os.path.join(output, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["id"]] = record
+    return records
+
+
+def _append_record(output: str, record: Dict) -> None:
+    line = json.dumps(record, default=str) + "\n"
+    with open(os.path.join(output, MANIFEST_FILE), "a+b") as f:
+        # start a new line after a line cut short by an interrupted write
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = "\n" + line
+        f.write(line.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _init_worker(options: Dict) -> None:
+    global _orchestrator
+    from .components.llm_cache import LLMCache
+    from .components.orchestrator import Orchestrator
+    from .components.render_cache import RenderCache
+    from .components.summary_cache import SummaryCache
+
+    logging.basicConfig(level=options["log_level"])
+    _orchestrator = Orchestrator(
+        model=options["model"],
+        cache=LLMCache(options["cache"]) if options["cache"] else None,
+        summary_cache=SummaryCache(options["summary_cache"]) if options["summary_cache"] else None,
+        render_options={"format": options["image_format"]} if options["image_format"] else None,
+        optimize_dtypes=options["optimize_dtypes"],
+        semantic_types=options["semantic_types"],
+        render_cache=RenderCache(options["render_cache"]) if options["render_cache"] else None,
+    )
+
+
+def _write_charts(charts: List, directory: str) -> List[Dict]:
+    records = []
+    for index, chart in enumerate(charts):
+        name = f"chart_{index:02d}_{chart.library}"
+        record = {
+            "goal": (chart.goal or {}).get("question"),
+            "library": chart.library,
+            "status": bool(chart.status),
+            "timings": chart.timings,
+        }
+        if chart.code:
+            record["code"] = f"{name}.py"
+            with open(os.path.join(directory, record["code"]), "w", encoding="utf-8") as f:
+                f.write(chart.code)
+        if chart.image:
+            record["image"] = f"{name}.{chart.image_format or 'png'}"
+            chart.savefig(os.path.join(directory, record["image"]))
+        if chart.spec:
+            record["spec"] = f"{name}.vl.json"
+            with open(os.path.join(directory, record["spec"]), "w", encoding="utf-8") as f:
+                f.write(chart.spec if isinstance(chart.spec, str) else json.dumps(chart.spec))
+        if chart.error:
+            record["error"] = chart.error.get("message")
+        records.append(record)
+    return records
+
+
+def process_dataset(dataset: Dict, output: str, options: Dict) -> Dict:
+    """
+    Summarize, explore goals for and visualize one dataset with the worker's orchestrator, writing
+    summary.json, goals.json and the charts to the dataset's directory. Returns its manifest record.
+    """
+    directory = os.path.join(output, dataset["id"])
+    # output of an earlier attempt that did not finish is replaced
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    record = {"id": dataset["id"], "path": dataset["path"], "directory": dataset["id"], "timings": {}}
+    timings = record["timings"]
+    start = time.perf_counter()
+    try:
+        stage = time.perf_counter()
+        summary = _orchestrator.summarize(
+            dataset["path"],
+            n_samples=options["n_samples"],
+            enrich=options["enrich"],
+            streaming=options["streaming"],
+            sampling=options["sampling"],
+        )
+        timings["summarize"] = time.perf_counter() - stage
+        if _orchestrator.dtype_report is not None:
+            record["memory"] = {
+                "bytes_before": _orchestrator.dtype_report.bytes_before,
+                "bytes_after": _orchestrator.dtype_report.bytes_after,
+            }
+        with open(os.path.join(directory, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+
+        stage = time.perf_counter()
+        goals = dataset.get("goals") or _orchestrator.explore_goals(summary, n_goals=options["n_goals"])
+        timings["explore_goals"] = time.perf_counter() - stage
+        with open(os.path.join(directory, "goals.json"), "w", encoding="utf-8") as f:
+            json.dump(goals, f, indent=2, default=str)
+
+        stage = time.perf_counter()
+        charts = []
+        for library in options["libraries"]:
+            charts.extend(
+                _orchestrator.visualize_goals(
+                    summary, goals, library=library, batch_size=options["batch_size"], debug=True
+                )
+            )
+        timings["visualize"] = time.perf_counter() - stage
+        record["charts"] = _write_charts(charts, directory)
+        record["status"] = "ok"
+    except Exception as exception_error:
+        logger.exception(f"Failed to chart {dataset['path']}")
+        record["status"] = "error"
+        record["error"] = f"{type(exception_error).__name__}: {exception_error}"
+    timings["total"] = time.perf_counter() - start
+    return record
+
+
+def _failed_record(dataset: Dict, error: str, elapsed: float) -> Dict:
+    return {
+        "id": dataset["id"],
+        "path": dataset["path"],
+        "directory": dataset["id"],
+        "timings": {"total": elapsed},
+        "status": "error",
+        "error": error,
+    }
+
+
+def _run(datasets: List[Dict], output: str, options: Dict, jobs: int) -> Iterator[Dict]:
+    """
+    Yield the record of every dataset as it finishes. With jobs > 1 datasets are processed in that
+    many worker processes, with at most 2 * jobs datasets queued at once. When a worker dies, e.g.
+    killed for running out of memory, the datasets in flight are recorded as failed and the run
+    goes on with new workers.
+    """
+    if jobs <= 1:
+        _init_worker(options)
+        for dataset in datasets:
+            yield process_dataset(dataset, output, options)
+        return
+    # spawn, like ExecutionPool, so workers do not inherit locks held by the parent's threads
+    context = multiprocessing.get_context("spawn")
+    remaining = iter(datasets)
+    while True:
+        executor = ProcessPoolExecutor(jobs, mp_context=context, initializer=_init_worker, initargs=(options,))
+        # future -> (dataset, submit time)
+        in_flight: Dict[Future, Tuple[Dict, float]] = {}
+        try:
+            while True:
+                for dataset in remaining:
+                    try:
+                        future = executor.submit(process_dataset, dataset, output, options)
+                    except BrokenProcessPool:
+                        # never started, so it runs with the new workers
+                        remaining = itertools.chain([dataset], remaining)
+                        raise
+                    in_flight[future] = (dataset, time.perf_counter())
+                    if len(in_flight) >= 2 * jobs:
+                        break
+                if not in_flight:
+                    return
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    del in_flight[future]
+                    yield record
+        except BrokenProcessPool as exception_error:
+            # which dataset killed the worker is unknown, and the pool fails every task in flight
+            logger.error(f"A worker process died, {len(in_flight)} datasets in flight failed; restarting the workers")
+            error = f"{type(exception_error).__name__}: {exception_error}"
+            for dataset, submitted in list(in_flight.values()):
+                yield _failed_record(dataset, error, time.perf_counter() - submitted)
+            in_flight.clear()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def summarize_run(records: List[Dict], wall_time: float, skipped: int) -> Dict:
+    """
+    Throughput statistics of the datasets processed in this run.
+    """
+    totals = sorted(record["timings"]["total"] for record in records)
+    charts = [chart for record in records for chart in record.get("charts", [])]
+    stats = {
+        "datasets": len(records),
+        "succeeded": sum(record["status"] == "ok" for record in records),
+        "failed": sum(record["status"] != "ok" for record in records),
+        "skipped": skipped,
+        "charts": len(charts),
+        "charts_succeeded": sum(chart["status"] for chart in charts),
+        "wall_time_s": wall_time,
+        "datasets_per_minute": 60 * len(records) / wall_time if wall_time > 0 else 0.0,
+        "charts_per_minute": 60 * len(charts) / wall_time if wall_time > 0 else 0.0,
+    }
+    if totals:
+        stats["dataset_p50_s"] = statistics.median(totals)
+        stats["dataset_p95_s"] = totals[min(len(totals) - 1, int(0.95 * len(totals)))]
+        for stage in ("summarize", "explore_goals", "visualize"):
+            values = [record["timings"][stage] for record in records if stage in record["timings"]]
+            if values:
+                stats[f"{stage}_mean_s"] = statistics.fmean(values)
+    return stats
+
+
+def _print_stats(stats: Dict) -> None:
+    print(
+        f"\n{stats['succeeded']} of {stats['datasets']} datasets charted, {stats['failed']} failed, "
+        f"{stats['skipped']} already done"
+    )
+    print(f"{stats['charts_succeeded']} of {stats['charts']} charts rendered in {stats['wall_time_s']:.1f}s")
+    print(f"throughput: {stats['datasets_per_minute']:.1f} datasets/min, {stats['charts_per_minute']:.1f} charts/min")
+    if "dataset_p50_s" in stats:
+        print(f"per dataset: p50 {stats['dataset_p50_s']:.2f}s, p95 {stats['dataset_p95_s']:.2f}s")
+        stages = [
+            f"{stage} {stats[f'{stage}_mean_s']:.2f}s"
+            for stage in ("summarize", "explore_goals", "visualize")
+            if f"{stage}_mean_s" in stats
+        ]
+        print(f"mean stage time: {', '.join(stages)}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="tufte", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="data files, or directories searched recursively for data files")
+    parser.add_argument("--manifest", help="file listing one dataset per line: a path or a JSON object with a path")
+    parser.add_argument("-o", "--output", default="tufte-output", help="output directory (default: tufte-output)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--model", default=None, help="LLM model (default: the orchestrator's)")
+    parser.add_argument("--goals", type=int, default=5, help="goals to explore per dataset")
+    parser.add_argument("--library", nargs="+", default=["altair"], help="plotting libraries to chart every goal with")
+    parser.add_argument("--batch-size", type=int, default=None, help="goals per code generation request (default: all)")
+    parser.add_argument("--samples", type=int, default=3, help="sample values per field in the summary")
+    parser.add_argument("--enrich", action="store_true", help="enrich the summary with the LLM")
+    parser.add_argument("--streaming", action="store_true", help="profile whole files in chunks")
+    parser.add_argument("--sampling", default=None, help="sampling strategy, a row count or a JSON object")
+    parser.add_argument(
+        "--optimize-dtypes", action="store_true", help="convert loaded data to compact dtypes before charting"
+    )
+    parser.add_argument(
+        "--semantic-types", action="store_true", help="type columns locally and enrich only the others with the LLM"
+    )
+    parser.add_argument("--image-format", choices=["png", "svg", "webp"], default=None)
+    parser.add_argument("--cache", default=None, help="LLM cache file shared by the workers")
+    parser.add_argument("--summary-cache", default=None, help="summary cache file shared by the workers")
+    parser.add_argument(
+        "--render-cache", default=None, help="cache file of executed and rendered charts shared by the workers"
+    )
+    parser.add_argument("--retry-failed", action="store_true", help="also redo datasets that failed in earlier runs")
+    parser.add_argument("--force", action="store_true", help="redo every dataset, ignoring the manifest")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress of every stage")
+    return parser
+
+
+def _parse_sampling(value: Optional[str]):
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    return json.loads(value) if value.startswith("{") else value
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.paths and not args.manifest:
+        parser.error("give data files, directories or --manifest")
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    logging.basicConfig(level=log_level)
+
+    datasets = find_datasets(args.paths, args.manifest)
+    os.makedirs(args.output, exist_ok=True)
+    finished = {} if args.force else load_manifest(args.output)
+    done_statuses = {"ok", "error"} if not args.retry_failed else {"ok"}
+    todo = [dataset for dataset in datasets if finished.get(dataset["id"], {}).get("status") not in done_statuses]
+    skipped = len(datasets) - len(todo)
+    print(f"{len(datasets)} datasets, {skipped} already done, charting {len(todo)} with {args.jobs} processes")
+
+    options = {
+        "model": args.model,
+        "libraries": args.library,
+        "n_goals": args.goals,
+        "n_samples": args.samples,
+        "batch_size": args.batch_size,
+        "enrich": args.enrich,
+        "streaming": args.streaming,
+        "sampling": _parse_sampling(args.sampling),
+        "image_format": args.image_format,
+        "optimize_dtypes": args.optimize_dtypes,
+        "semantic_types": args.semantic_types,
+        "cache": args.cache,
+        "summary_cache": args.summary_cache,
+        "render_cache": args.render_cache,
+        "log_level": log_level,
+    }
+    if options["model"] is None:
+        from .components.orchestrator import DEFAULT_OPENAI_MODEL
+
+        options["model"] = DEFAULT_OPENAI_MODEL
+
+    records = []
+    start = time.perf_counter()
+    interrupted = False
+    try:
+        for record in _run(todo, args.output, options, args.jobs):
+            _append_record(args.output, record)
+            records.append(record)
+            n_charts = sum(chart["status"] for chart in record.get("charts", []))
+            print(
+                f"[{len(records)}/{len(todo)}] {record['path']}: {record['status']}, {n_charts} charts, "
+                f"{record['timings']['total']:.1f}s"
+            )
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\ninterrupted; finished datasets are recorded and are skipped when the run is resumed")
+    stats = summarize_run(records, time.perf_counter() - start, skipped)
+    _print_stats(stats)
+    with open(os.path.join(args.output, "run_stats.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    if interrupted:
+        return 130
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,45 @@
-from .summarizer import Summarizer
-from .viz_generator import *
-from .goal_explorer import *
-from .orchestrator import *
-from .code_executor import *
-from .scaffold import *
+import importlib
+
+# Components are imported on first access so that importing the package does not load
+# pandas, openai or any plotting library up front.
+_LAZY_ATTRIBUTES = {
+    "CodeExecutor": ".code_executor",
+    "CodeValidator": ".validator",
+    "ColumnProfiler": ".profiler",
+    "DatasetNotFound": ".registry",
+    "DatasetRegistry": ".registry",
+    "DtypeOptimizer": ".dtype_optimizer",
+    "ExecutionPool": ".execution_pool",
+    "GoalExplorer": ".goal_explorer",
+    "LLMCache": ".llm_cache",
+    "OpenTelemetryExporter": ".tracing",
+    "Orchestrator": ".orchestrator",
+    "PromptContextBuilder": ".prompt_context",
+    "RenderCache": ".render_cache",
+    "RequestCoalescer": ".registry",
+    "ReservoirSampler": ".sampling",
+    "Scaffold": ".scaffold",
+    "SemanticTypeInference": ".semantic_types",
+    "StratifiedSampler": ".sampling",
+    "StreamingProfile": ".streaming",
+    "Summarizer": ".summarizer",
+    "SummaryCache": ".summary_cache",
+    "TimeBucketSampler": ".sampling",
+    "Tracer": ".tracing",
+    "UniformSampler": ".sampling",
+    "VizGenerator": ".viz_generator",
+}
+
+__all__ = sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
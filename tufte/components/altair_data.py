@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import threading
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+ALTAIR_DATA_MODES = ("inline", "reference", "external")
+EXTERNAL_FORMATS = ("json", "arrow")
+TRANSFORMER_NAME = "tufte_reference"
+
+# altair's active data transformer is global, so serializations that swap it run one at a time
+_transformer_lock = threading.Lock()
+_local = threading.local()
+
+
+class _DataCollector:
+    """
+    Replaces every dataset a chart references with a named reference and keeps the dataset aside,
+    so serializing a chart never converts its data to JSON.
+    """
+
+    def __init__(self) -> None:
+        self.datasets: Dict[str, Any] = {}
+        self._names: Dict[int, str] = {}
+
+    def __call__(self, data) -> Dict:
+        name = self._names.get(id(data))
+        if name is None:
+            name = f"tufte-data-{len(self.datasets)}"
+            # keeping the dataset alive also keeps its id from being reused during this serialization
+            self.datasets[name] = data
+            self._names[id(data)] = name
+        return {"name": name}
+
+
+def _transform(data):
+    collector = getattr(_local, "collector", None)
+    if collector is None:
+        # another thread serializing while ours holds the transformer gets altair's default behavior
+        from altair.vegalite.data import default_data_transformer
+
+        return default_data_transformer(data)
+    return collector(data)
+
+
+def chart_to_spec(chart) -> Tuple[Dict, Dict[str, Any]]:
+    """
+    Serialize an altair chart with each of its datasets replaced by {"name": ...}. Returns the spec
+    and the datasets by name; the cost depends on the size of the spec, not of the data, and
+    altair's max rows limit does not apply.
+    """
+    import altair as alt
+
+    if TRANSFORMER_NAME not in alt.data_transformers.names():
+        alt.data_transformers.register(TRANSFORMER_NAME, _transform)
+    collector = _DataCollector()
+    with _transformer_lock:
+        _local.collector = collector
+        try:
+            with alt.data_transformers.enable(TRANSFORMER_NAME):
+                spec = chart.to_dict()
+        finally:
+            _local.collector = None
+    return spec, collector.datasets
+
+
+def inline_datasets(spec: Dict, datasets: Dict[str, Any]) -> Dict:
+    """
+    Return `spec` with the values of `datasets` embedded in its top-level datasets, which resolves
+    the named references left by chart_to_spec.
+    """
+    if not datasets:
+        return spec
+    from altair.utils.data import to_values
+
+    values = {name: to_values(data)["values"] for name, data in datasets.items()}
+    return {**spec, "datasets": {**spec.get("datasets", {}), **values}}
+
+
+def _write_dataset(data, directory: str, name: str, format: str) -> Dict:
+    if format == "arrow" and not hasattr(data, "__geo_interface__"):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        path = os.path.join(directory, f"{name}-{uuid.uuid4().hex}.arrow")
+        # vega's arrow loader does not read compressed IPC files
+        feather.write_feather(pa.Table.from_pandas(data, preserve_index=False), path, compression="uncompressed")
+        return {"url": path, "format": {"type": "arrow"}}
+
+    from altair.utils.data import to_values
+
+    path = os.path.join(directory, f"{name}-{uuid.uuid4().hex}.json")
+    with open(path, "w") as f:
+        json.dump(to_values(data)["values"], f)
+    return {"url": path, "format": {"type": "json"}}
+
+
+def _replace_named_data(node: Any, replacements: Dict[str, Dict]) -> Any:
+    if isinstance(node, dict):
+        if set(node) == {"name"} and node["name"] in replacements:
+            return replacements[node["name"]]
+        return {key: _replace_named_data(value, replacements) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_replace_named_data(value, replacements) for value in node]
+    return node
+
+
+def externalize_datasets(
+    spec: Dict, datasets: Dict[str, Any], directory: Optional[str] = None, format: str = "json"
+) -> Dict:
+    """
+    Write `datasets` to JSON or Arrow IPC files in `directory` (a new temporary directory by default)
+    and return `spec` with each named reference replaced by the URL of its file.
+    """
+    if format not in EXTERNAL_FORMATS:
+        raise ValueError(f"Unsupported format {format}. Choose from {', '.join(EXTERNAL_FORMATS)}.")
+    if not datasets:
+        return spec
+    directory = directory or tempfile.mkdtemp(prefix="tufte-altair-")
+    os.makedirs(directory, exist_ok=True)
+    replacements = {name: _write_dataset(data, directory, name, format) for name, data in datasets.items()}
+    return _replace_named_data(spec, replacements)
@@ -1,20 +1,66 @@
 import ast
-import base64
 import importlib
-import io
 import logging
+import tempfile
+import threading
 import traceback
-from typing import Any, List
+from typing import Any, Dict, List, Optional
 
-import matplotlib.pyplot as plt
 import pandas as pd
-import plotly.io as pio
+
+from .altair_data import ALTAIR_DATA_MODES, chart_to_spec, externalize_datasets, inline_datasets
+from .isolation import isolated_view, isolation_context
+from .render_cache import RenderCache, spec_fingerprint
+from .renderer import RenderService, as_matplotlib_figure, pin_agg_backend, pyplot_scope
+from .tracing import Tracer
+from .validator import CodeValidationError, CodeValidator
 
 
 logger = logging.getLogger(__name__)
 
+# pandas options such as copy-on-write are process-wide, so snippets execute one at a time, see CodeExecutor
+_exec_lock = threading.RLock()
+
 
 class CodeExecutor:
+    """
+    Executes generated snippets on a dataset and renders their charts.
+
+    An executor can be shared between threads, but only the rendering runs concurrently: the exec of
+    a snippet holds a process-wide lock, because the isolation modes set pandas options for the whole
+    process, and matplotlib and seaborn snippets also hold pyplot's lock (see renderer.pyplot_scope).
+    To execute snippets in parallel, run them through an ExecutionPool, whose workers are processes.
+    """
+
+    def __init__(
+        self,
+        renderer: Optional[RenderService] = None,
+        isolation: str = "copy_on_write",
+        tracer: Optional[Tracer] = None,
+        altair_data: str = "reference",
+        altair_data_dir: Optional[str] = None,
+        altair_data_format: str = "json",
+        validator: Optional[CodeValidator] = None,
+        validate: bool = True,
+        cache: Optional[RenderCache] = None,
+    ) -> None:
+        if altair_data not in ALTAIR_DATA_MODES:
+            raise ValueError(f"Unsupported altair_data {altair_data}. Choose from {', '.join(ALTAIR_DATA_MODES)}.")
+        self.tracer = tracer or Tracer()
+        # one long-lived renderer, so kaleido and vl-convert start once per executor
+        self.renderer = renderer or RenderService(tracer=self.tracer)
+        # how snippets see the caller's data, see isolation.isolated_view
+        self.isolation = isolation
+        # how altair specs carry their data: inline values, a named reference, or an external file
+        # written to altair_data_dir (a temporary directory by default) as JSON or Arrow
+        self.altair_data = altair_data
+        self.altair_data_dir = altair_data_dir
+        self.altair_data_format = altair_data_format
+        # snippets that fail static validation are rejected without being executed
+        self.validator = (validator or CodeValidator()) if validate else None
+        # stored results of unchanged snippets on unchanged data, and rasters of Vega-Lite specs
+        self.cache = cache
+
     def get_globals_dict(self, code_string: str, data: pd.DataFrame):
         tree = ast.parse(code_string)
         imported_modules = [
@@ -37,16 +83,78 @@ class CodeExecutor:
             alias or module_name.split(".")[-1]: obj
             for module_name, alias, obj in imported_modules
         }
-        globals_dict.update({"pd": pd, "data": data, "plt": plt})
+        globals_dict.update({"pd": pd, "data": data})
+        # import pyplot only for snippets that use it, so other libraries never load matplotlib
+        if any(isinstance(node, ast.Name) and node.id == "plt" for node in ast.walk(tree)):
+            pin_agg_backend()
+            import matplotlib.pyplot as plt
+
+            globals_dict.setdefault("plt", plt)
         return globals_dict
 
+    def _validate(self, code: str, data: Any, timings: Dict) -> None:
+        if self.validator is None:
+            return
+        fields = list(data.columns) if isinstance(data, pd.DataFrame) else None
+        with self.tracer.span("code_executor.validate") as span:
+            try:
+                warnings = self.validator.check(code, fields)
+            except CodeValidationError as exception_error:
+                span.set_attribute("errors", len(exception_error.diagnostics))
+                raise
+            span.set_attribute("warnings", len(warnings))
+        timings["validate"] = span.duration
+        for warning in warnings:
+            logger.info(f"Generated code: {warning!r}")
+
+    def _exec(self, code: str, data: Any, timings: Dict) -> dict:
+        self._validate(code, data, timings)
+        with self.tracer.span("code_executor.exec", code_bytes=len(code)) as span, _exec_lock:
+            ex_locals = self.get_globals_dict(code, isolated_view(data, self.isolation))
+            with isolation_context(self.isolation):
+                exec(code, ex_locals)
+        timings["exec"] = span.duration
+        return ex_locals
+
     def execute_code(
         self,
         code_specs: List[str],
         data: Any,
         library="altair",
         return_error: bool = False,
+        altair_data: Optional[str] = None,
+        render_options: Optional[Dict] = None,
     ) -> Any:
+        """
+        Execute generated snippets for `library` on `data`. `altair_data` overrides the executor's
+        altair data mode for these charts, and `render_options` (format, scale, dpi, size) override
+        the renderer's settings, e.g. {"format": "webp", "size": (320, 240)} for thumbnails.
+        With a `cache`, snippets already executed on the same data are served from it.
+        """
+        if self.cache is not None:
+            with self.tracer.span("code_executor.render_cache", library=library, snippets=len(code_specs)) as span:
+                results = self.cache.execute(
+                    self._execute_code,
+                    code_specs,
+                    data,
+                    library=library,
+                    return_error=return_error,
+                    altair_data=(altair_data or self.altair_data) if library == "altair" else None,
+                    render_options=render_options,
+                )
+                span.set_attribute("cache_hits", sum(1 for result in results if "cache" in result.get("timings", {})))
+            return results
+        return self._execute_code(code_specs, data, library, return_error, altair_data, render_options)
+
+    def _execute_code(
+        self,
+        code_specs: List[str],
+        data: Any,
+        library="altair",
+        return_error: bool = False,
+        altair_data: Optional[str] = None,
+        render_options: Optional[Dict] = None,
+    ) -> List[dict]:
         library_handlers = {
             "altair": self._handle_altair,
             "matplotlib": self._handle_matplotlib,
@@ -60,151 +168,242 @@ class CodeExecutor:
                 f"Unsupported library. Supported libraries are altair, matplotlib, seaborn, ggplot, plotly. You provided {library}"
             )
 
-        return library_handlers[library](code_specs, data, return_error)
+        with self.tracer.span("code_executor.execute_code", library=library, snippets=len(code_specs)) as span:
+            if library == "altair":
+                results = self._handle_altair(
+                    code_specs, data, return_error, render_options, altair_data or self.altair_data
+                )
+            else:
+                results = library_handlers[library](code_specs, data, return_error, render_options)
+            span.set_attribute("charts", sum(1 for result in results if result["status"]))
+            return results
+
+    def _error_result(self, code: str, library: str, exception_error: Exception) -> dict:
+        error = {
+            "message": str(exception_error),
+            "traceback": traceback.format_exc(),
+        }
+        if isinstance(exception_error, CodeValidationError):
+            error["diagnostics"] = [diagnostic.to_dict() for diagnostic in exception_error.diagnostics]
+        return {
+            "status": False,
+            "code": code,
+            "library": library,
+            "error": error,
+        }
+
+    def _rasterize(
+        self,
+        library: str,
+        executed: List,
+        results: List[dict],
+        return_error: bool,
+        render_options: Optional[Dict] = None,
+        keys: Optional[List[Optional[str]]] = None,
+    ) -> List[dict]:
+        """
+        Render the figures of every successfully executed snippet in one batch and attach the image
+        bytes to their results. `executed` holds (result, figure) pairs whose result is already in `results`.
+        Figures with the same entry in `keys` (see render_cache.spec_fingerprint) are rendered once, and
+        rasters stored in the cache under their key are not rendered at all.
+        """
+        render_options = render_options or {}
+        image_format = render_options.get("format") or self.renderer.format
+        keys = keys or [None] * len(executed)
+        rasters: Dict[str, Any] = {}
+        if self.cache is not None:
+            for key in dict.fromkeys(keys):
+                raster = self.cache.get_raster(key, render_options) if key is not None else None
+                if raster is not None:
+                    rasters[key] = raster
+        # the position in `executed` each figure is rendered for; duplicates and stored rasters are skipped
+        pending = []
+        for position, key in enumerate(keys):
+            if key is None or key not in rasters:
+                pending.append(position)
+                if key is not None:
+                    rasters[key] = position
+        with self.tracer.span("code_executor.render", library=library, charts=len(pending)) as batch_span:
+            figures = [(library, executed[position][1]) for position in pending]
+            rendered = self.renderer.render_batch(figures, **render_options)
+            batch_span.set_attribute("deduplicated", len(executed) - len(pending))
+        # render_batch renders sequentially, so its per-figure spans are in the order of `pending`
+        render_spans = [span for span in batch_span.children if span.name == "renderer.render"]
+        if len(render_spans) != len(pending):
+            render_spans = [batch_span] * len(pending)
+        render_times = {position: span.duration for position, span in zip(pending, render_spans)}
+        rendered = dict(zip(pending, rendered))
+        for key in dict.fromkeys(keys):
+            if key is not None and isinstance(rasters[key], int):
+                raster = rendered[rasters[key]]
+                if self.cache is not None and not isinstance(raster, Exception):
+                    self.cache.set_raster(key, raster, render_options)
+                rasters[key] = raster
+        for position, ((result, _), key) in enumerate(zip(executed, keys)):
+            raster = rendered[position] if key is None else rasters[key]
+            if isinstance(raster, Exception):
+                logger.error(f"{result['code']} ****\n{str(raster)}")
+                index = next(i for i, entry in enumerate(results) if entry is result)
+                if return_error:
+                    results[index] = {
+                        "status": False,
+                        "code": result["code"],
+                        "library": result["library"],
+                        "error": {
+                            "message": str(raster),
+                            "traceback": "".join(
+                                traceback.format_exception(type(raster), raster, raster.__traceback__)
+                            ),
+                        },
+                    }
+                else:
+                    del results[index]
+            else:
+                result["image"] = raster
+                result["image_format"] = image_format
+                result["timings"]["render"] = render_times.get(position, 0.0)
+        return results
+
+    def _altair_spec(self, spec: Dict, datasets: Dict, altair_data: str) -> Dict:
+        if altair_data == "inline":
+            return inline_datasets(spec, datasets)
+        if altair_data == "external":
+            if self.altair_data_dir is None:
+                self.altair_data_dir = tempfile.mkdtemp(prefix="tufte-altair-")
+            return externalize_datasets(spec, datasets, self.altair_data_dir, self.altair_data_format)
+        return spec
 
-    def _handle_altair(self, code_specs: List[str], data: Any, return_error: bool):
-        results = []
+    def _handle_altair(
+        self,
+        code_specs: List[str],
+        data: Any,
+        return_error: bool,
+        render_options: Optional[Dict] = None,
+        altair_data: str = "reference",
+    ):
+        if altair_data not in ALTAIR_DATA_MODES:
+            raise ValueError(f"Unsupported altair_data {altair_data}. Choose from {', '.join(ALTAIR_DATA_MODES)}.")
+        results, executed = [], []
         for code in code_specs:
             try:
-                ex_locals = self.get_globals_dict(code, data)
-                exec(code, ex_locals)
+                timings = {}
+                ex_locals = self._exec(code, data, timings)
                 chart = ex_locals["chart"]
-                vega_spec = chart.to_dict()
-                del vega_spec["data"]
-                vega_spec.pop("datasets", None)
+                # datasets become named references instead of being serialized to JSON
+                with self.tracer.span("code_executor.altair_spec", altair_data=altair_data) as span:
+                    named_spec, datasets = chart_to_spec(chart)
+                    spec = self._altair_spec(named_spec, datasets, altair_data)
+                timings["spec"] = span.duration
 
                 results.append(
                     {
-                        "spec": vega_spec,
+                        "spec": spec,
                         "status": True,
                         "code": code,
                         "library": "altair",
+                        "timings": timings,
                     }
                 )
+                executed.append((results[-1], (named_spec, datasets, spec)))
             except Exception as exception_error:
                 logger.error(f"{code} ****\n{str(exception_error)}")
                 logger.error(traceback.format_exc())
                 if return_error:
-                    results.append(
-                        {
-                            "status": False,
-                            "code": code,
-                            "library": "altair",
-                            "error": {
-                                "message": str(exception_error),
-                                "traceback": traceback.format_exc(),
-                            },
-                        }
-                    )
-        return results
+                    results.append(self._error_result(code, "altair", exception_error))
+        if not self.renderer.can_render("altair"):
+            # without vl-convert altair charts keep returning only their spec
+            return results
+        # charts with the same canonical spec and data are rendered once; hashing the data only pays
+        # off with a raster cache or several charts to compare
+        keys = [None] * len(executed)
+        if self.cache is not None or len(executed) > 1:
+            fingerprints: Dict[int, Optional[str]] = {}
+            keys = [spec_fingerprint(named_spec, datasets, fingerprints) for _, (named_spec, datasets, _) in executed]
+        # the renderer needs the values, so they are serialized only for charts being rasterized;
+        # duplicates are never rendered and keep no figure
+        first = {key: position for position, key in reversed(list(enumerate(keys)))}
+        executed = [
+            (
+                result,
+                (spec if altair_data == "inline" else inline_datasets(named_spec, datasets))
+                if keys[position] is None or first[keys[position]] == position
+                else None,
+            )
+            for position, (result, (named_spec, datasets, spec)) in enumerate(executed)
+        ]
+        return self._rasterize("altair", executed, results, return_error, render_options, keys)
 
-    def _handle_matplotlib(self, code_specs: List[str], data: Any, return_error: bool):
-        results = []
+    def _handle_matplotlib(
+        self, code_specs: List[str], data: Any, return_error: bool, render_options: Optional[Dict] = None
+    ):
+        results, executed = [], []
         for code in code_specs:
             try:
-                ex_locals = self.get_globals_dict(code, data)
-                exec(code, ex_locals)
-                plt = ex_locals["chart"]
-                if plt:
-                    buf = io.BytesIO()
-                    # plt.box(False)
-                    # plt.grid(color="lightgray", linestyle="dashed", zorder=-10)
-                    plt.savefig(buf, format="png", dpi=100, pad_inches=0.2)
-                    buf.seek(0)
-                    plot_data = base64.b64encode(buf.read()).decode("ascii")
-                    plt.close()
+                timings = {}
+                # every figure the snippet opens is closed on exit, also when it raises
+                with pyplot_scope():
+                    ex_locals = self._exec(code, data, timings)
+                    figure = as_matplotlib_figure(ex_locals["chart"])
                 results.append(
                     {
                         "status": True,
-                        "raster": plot_data,
                         "code": code,
                         "library": "matplotlib",
+                        "timings": timings,
                     }
                 )
+                executed.append((results[-1], figure))
             except Exception as exception_error:
-                logger.error(f"{code_specs[0]} ****\n{str(exception_error)}")
+                logger.error(f"{code} ****\n{str(exception_error)}")
                 logger.error(traceback.format_exc())
                 if return_error:
-                    results.append(
-                        {
-                            "status": False,
-                            "code": code,
-                            "library": "matplotlib",
-                            "error": {
-                                "message": str(exception_error),
-                                "traceback": traceback.format_exc(),
-                            },
-                        }
-                    )
-        return results
+                    results.append(self._error_result(code, "matplotlib", exception_error))
+        return self._rasterize("matplotlib", executed, results, return_error, render_options)
 
-    def _handle_ggplot(self, code_specs: List[str], data: Any, return_error: bool):
-        results = []
+    def _handle_ggplot(
+        self, code_specs: List[str], data: Any, return_error: bool, render_options: Optional[Dict] = None
+    ):
+        results, executed = [], []
         for code in code_specs:
             try:
-                ex_locals = self.get_globals_dict(code, data)
-                exec(code, ex_locals)
+                timings = {}
+                ex_locals = self._exec(code, data, timings)
                 chart = ex_locals["chart"]
-                if plt:
-                    buf = io.BytesIO()
-                    chart.save(buf, format="png")
-                    plot_data = base64.b64encode(buf.getvalue()).decode("utf-8")
                 results.append(
                     {
                         "status": True,
-                        "raster": plot_data,
                         "code": code,
                         "library": "ggplot",
+                        "timings": timings,
                     }
                 )
+                executed.append((results[-1], chart))
             except Exception as exception_error:
                 logger.error(f"{code} {traceback.format_exc()}")
                 if return_error:
-                    results.append(
-                        {
-                            "status": False,
-                            "code": code,
-                            "library": "ggplot",
-                            "error": {
-                                "message": str(exception_error),
-                                "traceback": traceback.format_exc(),
-                            },
-                        }
-                    )
-        return results
+                    results.append(self._error_result(code, "ggplot", exception_error))
+        return self._rasterize("ggplot", executed, results, return_error, render_options)
 
-    def _handle_plotly(self, code_specs: List[str], data: Any, return_error: bool):
-        results = []
+    def _handle_plotly(
+        self, code_specs: List[str], data: Any, return_error: bool, render_options: Optional[Dict] = None
+    ):
+        results, executed = [], []
         for code in code_specs:
             try:
-                ex_locals = self.get_globals_dict(code, data)
-                exec(code, ex_locals)
+                timings = {}
+                ex_locals = self._exec(code, data, timings)
                 chart = ex_locals["chart"]
-
-                if pio:
-                    chart_bytes = pio.to_image(chart, "png")
-                    plot_data = base64.b64encode(chart_bytes).decode("utf-8")
-
-                    results.append(
-                        {
-                            "status": True,
-                            "raster": plot_data,
-                            "code": code,
-                            "library": "plotly",
-                        }
-                    )
+                results.append(
+                    {
+                        "status": True,
+                        "code": code,
+                        "library": "plotly",
+                        "timings": timings,
+                    }
+                )
+                executed.append((results[-1], chart))
             except Exception as exception_error:
                 logger.error(f"{code} {traceback.format_exc()}")
                 if return_error:
-                    results.append(
-                        {
-                            "status": False,
-                            "code": code,
-                            "library": "plotly",
-                            "error": {
-                                "message": str(exception_error),
-                                "traceback": traceback.format_exc(),
-                            },
-                        }
-                    )
-        return results
+                    results.append(self._error_result(code, "plotly", exception_error))
+        return self._rasterize("plotly", executed, results, return_error, render_options)
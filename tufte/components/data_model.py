@@ -1,30 +1,73 @@
 import base64
-from typing import Dict, Optional, Union
+from typing import Any, Dict, Optional, Union
+from pydantic import ConfigDict, model_validator
 from pydantic.dataclasses import dataclass
+from pydantic_core import ArgsKwargs
 
+IMAGE_MIME_TYPES = {"png": "image/png", "svg": "image/svg+xml", "webp": "image/webp"}
+# fields filled by Chart(...) positional arguments; raster keeps its original third slot
+CHART_POSITIONAL_FIELDS = (
+    "spec", "status", "raster", "code", "library", "error", "image", "image_format", "goal", "timings", "preview"
+)
 
-@dataclass
+
+# image bytes are base64-encoded only when the chart is serialized to JSON
+@dataclass(config=ConfigDict(ser_json_bytes="base64", val_json_bytes="base64"))
 class Chart:
     spec: Optional[Union[str, Dict]] = None  # interactive specification e.g. vegalite
     status: Optional[bool] = None  # True if successful
-    raster: Optional[str] = None
     code: Optional[str] = None  # code used to generate the visualization
     library: Optional[str] = None  # library used to generate the visualization
     error: Optional[Dict] = None  # error message if status is False
+    image: Optional[bytes] = None  # rendered chart, in image_format
+    image_format: Optional[str] = None  # png, svg or webp
+    goal: Optional[Dict] = None  # goal the visualization addresses
+    timings: Optional[Dict] = None  # seconds spent in each stage, e.g. generate_code, exec, render
+    preview: Optional[bool] = None  # True if rendered on the preview sample; the final chart follows it
+
+    @model_validator(mode="before")
+    @classmethod
+    def _decode_raster(cls, values: Any) -> Any:
+        # Chart(raster=...) predates `image`: accept the base64 PNG and store its bytes
+        if isinstance(values, ArgsKwargs):
+            # positional arguments keep the order they had when raster was the third field
+            if len(values.args) > len(CHART_POSITIONAL_FIELDS):
+                raise TypeError(f"Chart takes at most {len(CHART_POSITIONAL_FIELDS)} positional arguments")
+            values = {**(values.kwargs or {}), **dict(zip(CHART_POSITIONAL_FIELDS, values.args))}
+        if not isinstance(values, dict) or "raster" not in values:
+            return values
+        kwargs = dict(values)
+        raster = kwargs.pop("raster")
+        if raster is not None and kwargs.get("image") is None:
+            kwargs["image"] = base64.b64decode(raster)
+            kwargs.setdefault("image_format", "png")
+        return kwargs
+
+    @property
+    def raster(self) -> Optional[str]:
+        """
+        The rendered chart as a base64 string, encoded on access.
+        """
+        if self.image is None:
+            return None
+        return base64.b64encode(self.image).decode("ascii")
 
     def _repr_mimebundle_(self, include=None, exclude=None):
         bundle = {}
         if self.code:
             bundle["text/plain"] = self.code
-        if self.raster:
-            bundle["image/png"] = self.raster
+        if self.image:
+            if self.image_format == "svg":
+                bundle[IMAGE_MIME_TYPES["svg"]] = self.image.decode("utf-8")
+            else:
+                bundle[IMAGE_MIME_TYPES.get(self.image_format, "image/png")] = self.raster
         if self.spec:
             bundle["application/vnd.vegalite.v5+json"] = self.spec
         return bundle
 
     def savefig(self, path):
-        if self.raster:
+        if self.image:
             with open(path, 'wb') as f:
-                f.write(base64.b64decode(self.raster))
+                f.write(self.image)
         else:
             raise FileNotFoundError("No raster image to save")
@@ -0,0 +1,109 @@
+import logging
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .profiler import CATEGORY_UNIQUE_RATIO, DEFAULT_DATE_PROBE_SIZE, is_text, parse_dates
+
+logger = logging.getLogger(__name__)
+
+
+class DtypeReport:
+    """
+    What DtypeOptimizer changed: the old and new dtype of every converted column, and the memory
+    of the whole frame before and after (DataFrame.memory_usage(deep=True)).
+    """
+
+    def __init__(self, conversions: Dict[str, Tuple[str, str]], bytes_before: int, bytes_after: int) -> None:
+        self.conversions = conversions
+        self.bytes_before = bytes_before
+        self.bytes_after = bytes_after
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def to_dict(self) -> Dict:
+        return {
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "saved_bytes": self.saved_bytes,
+            "conversions": {column: list(dtypes) for column, dtypes in self.conversions.items()},
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"DtypeReport(columns={len(self.conversions)}, bytes_before={self.bytes_before}, "
+            f"bytes_after={self.bytes_after})"
+        )
+
+
+class DtypeOptimizer:
+    """
+    Shrinks a frame once at load time, so every later profile and every executed snippet works on
+    less memory. Text columns that parse as dates become datetimes, parsed with the profiler's own
+    date detection; the remaining text columns with fewer than `category_ratio` distinct values per
+    row become categoricals; integer columns are downcast to the smallest integer type that holds
+    their range. Floats are kept, since float32 would change the computed statistics.
+
+    The conversions match how ColumnProfiler already classifies columns, so an optimized frame has
+    the same summary as the original one. Generated code sees the new dtypes, though: grouping by a
+    categorical also lists categories that a filter removed, which is why the pass is opt-in.
+    """
+
+    def __init__(
+        self,
+        category_ratio: float = CATEGORY_UNIQUE_RATIO,
+        parse_dates: bool = True,
+        downcast_integers: bool = True,
+        date_probe_size: int = DEFAULT_DATE_PROBE_SIZE,
+        random_state: int = 42,
+    ) -> None:
+        self.category_ratio = category_ratio
+        self.parse_dates = parse_dates
+        self.downcast_integers = downcast_integers
+        self.date_probe_size = date_probe_size
+        self.random_state = random_state
+
+    def optimize(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, DtypeReport]:
+        """
+        Return an optimized copy of `df` (its columns are never modified in place) and a report.
+        """
+        memory_before = df.memory_usage(index=True, deep=True)
+        columns, conversions = {}, {}
+        for column, series in df.items():
+            converted = self._convert(series)
+            if converted is not None and converted.dtype != series.dtype:
+                columns[column] = converted
+                conversions[column] = (str(series.dtype), str(converted.dtype))
+        if columns:
+            # a shallow copy with the converted columns swapped in; the caller's frame is unchanged
+            df = df.copy(deep=False)
+            for column, values in columns.items():
+                df[column] = values
+        bytes_before = int(memory_before.sum())
+        report = DtypeReport(conversions, bytes_before, int(df.memory_usage(index=True, deep=True).sum()))
+        logger.info(
+            f"Optimized the dtypes of {len(conversions)} columns: {report.bytes_before} -> {report.bytes_after} bytes"
+        )
+        return df, report
+
+    def _convert(self, series: pd.Series):
+        if is_text(series):
+            if self.parse_dates:
+                parsed = parse_dates(series, self.date_probe_size, self.random_state)
+                if parsed is not None:
+                    return parsed
+            try:
+                num_unique = series.nunique(dropna=True)
+            except TypeError:
+                # unhashable values, e.g. lists
+                return None
+            if num_unique / max(len(series), 1) < self.category_ratio:
+                return series.astype("category")
+            return None
+        # only numpy integers; nullable and Arrow-backed integers are already compact
+        if self.downcast_integers and isinstance(series.dtype, np.dtype) and series.dtype.kind in "iu":
+            return pd.to_numeric(series, downcast="integer" if series.dtype.kind == "i" else "unsigned")
+        return None
@@ -0,0 +1,412 @@
+import gc
+import importlib
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60
+DEFAULT_STARTUP_TIMEOUT = 120
+MAX_SHARED_FRAMES = 4
+DEFAULT_PRELOAD_MODULES = (
+    "pandas",
+    "matplotlib",
+    "matplotlib.pyplot",
+    "seaborn",
+    "altair",
+    "plotly.express",
+    "plotly.io",
+    "plotnine",
+)
+
+
+def frame_signature(data: pd.DataFrame) -> Tuple:
+    """
+    A cheap signature of the arrays behind `data`: its shape, labels, dtypes and column buffers.
+
+    Assigning, adding or dropping columns, and calls that rebuild the frame in place such as
+    sort_values(inplace=True) or dropna(inplace=True), change it. Values written into the existing
+    buffers, e.g. with .loc, do not.
+    """
+    buffers = []
+    for position in range(data.shape[1]):
+        column = data.iloc[:, position]
+        if isinstance(column.dtype, np.dtype):
+            buffers.append(column.to_numpy().__array_interface__["data"][0])
+        else:
+            buffers.append(id(column.array))
+    return (data.shape, id(data.index), tuple(map(str, data.columns)), tuple(map(str, data.dtypes)), tuple(buffers))
+
+
+class SharedFrame:
+    """
+    A DataFrame published once into shared memory.
+
+    The frame is pickled with protocol 5 so its column buffers are kept out of band and copied
+    into a single shared memory segment. Workers rebuild the frame directly on top of that segment
+    instead of receiving a pickled copy with every task.
+    """
+
+    def __init__(self, data: pd.DataFrame) -> None:
+        buffers = []
+        self.data = data
+        self.signature = frame_signature(data)
+        self.token = uuid.uuid4().hex
+        # tasks sent or about to be sent for this frame; the pool only closes frames without any
+        self.tasks = 0
+        self.header = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+        raw_buffers = [buffer.raw() for buffer in buffers]
+        self.lengths = [raw.nbytes for raw in raw_buffers]
+        self.shm = shared_memory.SharedMemory(create=True, size=max(sum(self.lengths), 1))
+        offset = 0
+        for raw in raw_buffers:
+            self.shm.buf[offset:offset + raw.nbytes] = raw.cast("B")
+            offset += raw.nbytes
+
+    def describe(self) -> Dict:
+        return {"token": self.token, "name": self.shm.name, "header": self.header, "lengths": self.lengths}
+
+    def close(self) -> None:
+        self.data = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def attach_shared_frame(description: Dict) -> Tuple[shared_memory.SharedMemory, pd.DataFrame]:
+    # workers share the parent's resource tracker, which unlinks the segment only once
+    shm = shared_memory.SharedMemory(name=description["name"])
+    views, offset = [], 0
+    for length in description["lengths"]:
+        # read-only, so generated code cannot write through to other workers' data
+        views.append(shm.buf[offset:offset + length].toreadonly())
+        offset += length
+    return shm, pickle.loads(description["header"], buffers=views)
+
+
+def _release(shm: Optional[shared_memory.SharedMemory]) -> None:
+    if shm is None:
+        return
+    # the frame's arrays are views on the segment, collect them before unmapping it
+    gc.collect()
+    try:
+        shm.close()
+    except BufferError:
+        logger.debug("Shared data is still referenced; it is unmapped when the worker exits")
+
+
+def _preload(modules: Sequence[str]) -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            logger.debug(f"Could not preload {module}")
+
+
+def _limit_memory(memory_limit: Optional[int]) -> None:
+    if not memory_limit:
+        return
+    try:
+        import resource
+    except ImportError:
+        logger.warning("Memory limits are not supported on this platform")
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _worker_main(conn, preload: Sequence[str], memory_limit: Optional[int]) -> None:
+    _preload(preload)
+    if hasattr(pd.options.mode, "copy_on_write"):
+        # writes copy the touched columns instead of hitting the read-only shared buffers
+        pd.set_option("mode.copy_on_write", True)
+    _limit_memory(memory_limit)
+
+    from .code_executor import CodeExecutor
+
+    executor = CodeExecutor()
+    shm, token, data, load_error = None, None, None, None
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == "stop":
+            break
+        if message[0] == "load":
+            description = message[1]
+            data, token = None, None
+            _release(shm)
+            shm = None
+            try:
+                shm, data = attach_shared_frame(description)
+                token, load_error = description["token"], None
+            except Exception as exception_error:
+                # the task that follows is answered with this error
+                load_error = f"Could not load the shared data: {exception_error!r}"
+            continue
+
+        _, task_token, code_specs, library, return_error, altair_data, render_options = message
+        try:
+            if task_token != token:
+                raise RuntimeError(load_error or "Worker does not hold the data for this task")
+            results = executor.execute_code(code_specs, data, library, return_error, altair_data, render_options)
+            conn.send(("ok", results))
+        except Exception as exception_error:
+            conn.send(("error", f"{exception_error}\n{traceback.format_exc()}"))
+    data = None
+    _release(shm)
+
+
+class _Worker:
+    def __init__(self, context, preload: Sequence[str], memory_limit: Optional[int]) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, preload, memory_limit), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.token = None
+
+    def wait_ready(self, timeout: float) -> None:
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise TimeoutError("Worker process did not start in time")
+        self.conn.recv()
+        self.ready = True
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ExecutionPool:
+    """
+    Executes generated code in a pool of warm worker processes.
+
+    Workers import the plotting libraries once at startup. The DataFrame is published to shared
+    memory once per frame object and mapped read-only by every worker. Each task runs under a
+    timeout, and `memory_limit` (bytes of address space per worker, Unix only) bounds runaway
+    snippets; a worker that times out or dies is replaced. execute_code returns the same result
+    dicts as CodeExecutor.execute_code and is safe to call from several threads at once.
+    """
+
+    def __init__(
+        self,
+        n_workers: Optional[int] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        memory_limit: Optional[int] = None,
+        preload: Sequence[str] = DEFAULT_PRELOAD_MODULES,
+        start_method: str = "spawn",
+    ) -> None:
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.preload = preload
+        self._context = multiprocessing.get_context(start_method)
+        self._condition = threading.Condition()
+        self._idle = [self._start_worker() for _ in range(self.n_workers)]
+        self._frames: "OrderedDict[str, SharedFrame]" = OrderedDict()
+        self._frames_lock = threading.Lock()
+        self._closed = False
+
+    def _start_worker(self) -> _Worker:
+        return _Worker(self._context, self.preload, self.memory_limit)
+
+    def _share(self, data: pd.DataFrame) -> SharedFrame:
+        """
+        Return the shared copy of `data`, publishing it if needed, with one more task holding it;
+        call _unshare once the task is answered. A frame whose signature changed since it was
+        published is published again.
+        """
+        signature = frame_signature(data)
+        with self._frames_lock:
+            for frame in list(self._frames.values()):
+                if frame.data is not data:
+                    continue
+                if frame.signature == signature:
+                    self._frames.move_to_end(frame.token)
+                    frame.tasks += 1
+                    return frame
+                if frame.tasks == 0:
+                    # stale copy of a frame changed in place
+                    self._frames.pop(frame.token).close()
+            frame = SharedFrame(data)
+            frame.tasks += 1
+            self._frames[frame.token] = frame
+            self._evict()
+            return frame
+
+    def _unshare(self, frame: SharedFrame) -> None:
+        with self._frames_lock:
+            frame.tasks -= 1
+            self._evict()
+
+    def _evict(self) -> None:
+        # least recently used first; a frame with tasks in flight may still be loaded by a worker
+        limit = 0 if self._closed else MAX_SHARED_FRAMES
+        idle = [token for token, frame in self._frames.items() if frame.tasks == 0]
+        for token in idle[:max(len(self._frames) - limit, 0)]:
+            self._frames.pop(token).close()
+
+    def _checkout(self) -> _Worker:
+        with self._condition:
+            while not self._idle and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                raise RuntimeError("ExecutionPool is closed")
+            return self._idle.pop()
+
+    def _checkin(self, worker: _Worker) -> None:
+        with self._condition:
+            if self._closed:
+                # the pool closed while the worker ran a task
+                worker.stop()
+                return
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def _failure(self, code_specs: List[str], library: str, return_error: bool, message: str) -> List[Dict]:
+        logger.error(message)
+        if not return_error:
+            return []
+        return [
+            {
+                "status": False,
+                "code": code,
+                "library": library,
+                "error": {"message": message, "traceback": ""},
+            }
+            for code in code_specs
+        ]
+
+    def execute_code(
+        self,
+        code_specs: List[str],
+        data: pd.DataFrame,
+        library="altair",
+        return_error: bool = False,
+        altair_data: Optional[str] = None,
+        render_options: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """
+        Run `code_specs` against `data` in a worker and return one result dict per snippet.
+
+        `data` is published to shared memory on the first call and reused while the same object is
+        passed again. Changes that replace its arrays (see frame_signature) publish it again, but
+        values written into its existing arrays, e.g. `data.loc[...] = ...`, are not picked up: pass
+        a copy after such a change.
+        """
+        if self._closed:
+            raise RuntimeError("ExecutionPool is closed")
+        frame = self._share(data)
+        try:
+            return self._run(frame, code_specs, library, return_error, altair_data, render_options)
+        finally:
+            self._unshare(frame)
+
+    def _run(
+        self,
+        frame: SharedFrame,
+        code_specs: List[str],
+        library: str,
+        return_error: bool,
+        altair_data: Optional[str],
+        render_options: Optional[Dict],
+    ) -> List[Dict]:
+        worker = self._checkout()
+        try:
+            worker.wait_ready(DEFAULT_STARTUP_TIMEOUT)
+            if worker.token != frame.token:
+                worker.conn.send(("load", frame.describe()))
+                worker.token = frame.token
+            worker.conn.send(
+                ("run", frame.token, list(code_specs), library, return_error, altair_data, render_options)
+            )
+            if not worker.conn.poll(self.timeout):
+                worker.kill()
+                worker = self._start_worker()
+                return self._failure(
+                    code_specs, library, return_error, f"Code execution timed out after {self.timeout} seconds"
+                )
+            status, payload = worker.conn.recv()
+            if status == "error":
+                # e.g. the worker could not map the frame; it loads it again with its next task
+                worker.token = None
+        except (EOFError, OSError, TimeoutError) as exception_error:
+            worker.kill()
+            worker = self._start_worker()
+            return self._failure(
+                code_specs, library, return_error, f"Worker process failed: {exception_error!r}"
+            )
+        finally:
+            self._checkin(worker)
+
+        if status == "error":
+            raise Exception(payload)
+        return payload
+
+    def map(
+        self,
+        tasks: List[Tuple[List[str], str]],
+        data: pd.DataFrame,
+        return_error: bool = False,
+    ) -> List[List[Dict]]:
+        """
+        Execute (code_specs, library) tasks across all workers; results keep the order of `tasks`.
+        """
+        with ThreadPoolExecutor(max_workers=self.n_workers) as threads:
+            return list(
+                threads.map(lambda task: self.execute_code(task[0], data, task[1], return_error), tasks)
+            )
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        with self._condition:
+            self._closed = True
+            for worker in self._idle:
+                worker.stop()
+            self._idle = []
+            # workers running a task are stopped when they are checked in
+            self._condition.notify_all()
+        with self._frames_lock:
+            # frames still used by tasks are closed by _unshare once their tasks finish
+            self._evict()
+
+    def __enter__(self) -> "ExecutionPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -1,7 +1,11 @@
 import json
 import logging
-import openai
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from .llm_cache import LLMCache, acreate_completion, create_completion
+from .openai_clients import LazyOpenAIClients
+from .prompt_context import PromptContext, PromptContextBuilder
+from .tracing import Tracer
 
 DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
 SYSTEM_PROMPT = """
@@ -14,39 +18,73 @@ As an experienced data analyst, you are tasked with generating insightful hypoth
 
 The output should be structured as a list of dictionaries, each representing a goal. This list should be nested within a dictionary under the key 'goals'.
 
-Please ensure that the dataset, summarized in JSON format where each key denotes a field name or column, is accurately represented in your goals. Follow visualization best practices, including Tufte's principles, and favor the use of bar charts over pie charts.
+Please ensure that the dataset, summarized with one entry per field (column) under its exact name, is accurately represented in your goals. Follow visualization best practices, including Tufte's principles, and favor the use of bar charts over pie charts.
 """.strip()
 
 logger = logging.getLogger(__name__)
 
 
-class GoalExplorer:
-    def __init__(self, model: str = DEFAULT_OPENAI_MODEL) -> None:
+class GoalExplorer(LazyOpenAIClients):
+    def __init__(
+        self,
+        model: str = DEFAULT_OPENAI_MODEL,
+        cache: Optional[LLMCache] = None,
+        tracer: Optional[Tracer] = None,
+        prompt_context: Optional[PromptContextBuilder] = None,
+    ) -> None:
         self.oai_model = model
-        self.oai_client = openai.OpenAI()
+        self.cache = cache
+        self.tracer = tracer or Tracer()
+        # without a goal to match, fields are kept in summary order until the token budget is spent
+        self.prompt_context = prompt_context or PromptContextBuilder()
 
-    def generate_goals(self, summary: dict, n_goals: int = 5) -> List[Dict]:
-        messages = [
+    def _get_messages(self, context: PromptContext, n_goals: int) -> List[Dict]:
+        return [
             {
                 "role": "system",
                 "content": SYSTEM_PROMPT
             },
             {
                 "role": "user",
-                "content": f"Generate {n_goals} goals given the following data summary: {json.dumps(summary)}",
+                "content": f"Generate {n_goals} goals given the following data summary: {context.text}",
             },
         ]
 
-        response = self.oai_client.chat.completions.create(
-            model=self.oai_model,
-            messages=messages,
-            response_format={"type": "json_object"},
-        )
-
-        goals = json.loads(response.choices[0].message.content)
+    def _parse_goals(self, content: str, n_goals: int) -> List[Dict]:
+        goals = json.loads(content)
         assert "goals" in goals, "Expected 'goals' key in the response"
         assert isinstance(goals["goals"], list), "Expected a list of goals"
         assert (
             len(goals["goals"]) == n_goals
         ), f"Expected {n_goals} goals, but got {len(goals)} goals"
         return goals["goals"]
+
+    def generate_goals(self, summary: dict, n_goals: int = 5) -> List[Dict]:
+        with self.tracer.span("goal_explorer.generate_goals", n_goals=n_goals) as span:
+            context = self.prompt_context.build(summary)
+            span.set_attributes(**context.attributes())
+            content = create_completion(
+                self.oai_client,
+                self.cache,
+                tracer=self.tracer,
+                model=self.oai_model,
+                messages=self._get_messages(context, n_goals),
+                response_format={"type": "json_object"},
+                validate=lambda content: self._parse_goals(content, n_goals),
+            )
+            return self._parse_goals(content, n_goals)
+
+    async def agenerate_goals(self, summary: dict, n_goals: int = 5) -> List[Dict]:
+        with self.tracer.span("goal_explorer.generate_goals", n_goals=n_goals) as span:
+            context = self.prompt_context.build(summary)
+            span.set_attributes(**context.attributes())
+            content = await acreate_completion(
+                self.oai_async_client,
+                self.cache,
+                tracer=self.tracer,
+                model=self.oai_model,
+                messages=self._get_messages(context, n_goals),
+                response_format={"type": "json_object"},
+                validate=lambda content: self._parse_goals(content, n_goals),
+            )
+            return self._parse_goals(content, n_goals)
@@ -0,0 +1,59 @@
+import contextlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ISOLATION_MODES = ("copy_on_write", "read_only", "shared")
+
+
+def supports_copy_on_write() -> bool:
+    # pandas 3 always copies on write and drops the option
+    return hasattr(pd.options.mode, "copy_on_write") or int(pd.__version__.split(".")[0]) >= 3
+
+
+def _read_only(array):
+    view = array.view()
+    view.setflags(write=False)
+    return view
+
+
+def isolated_view(data: pd.DataFrame, mode: str = "copy_on_write") -> pd.DataFrame:
+    """
+    Return the frame a snippet should see in place of `data`, without copying column buffers.
+
+    copy_on_write: a shallow copy; under pandas copy-on-write any write copies only the touched columns.
+    read_only: a frame over read-only views of the columns; writes into existing values raise ValueError.
+    shared: `data` itself, so snippets can mutate it.
+    """
+    if mode not in ISOLATION_MODES:
+        raise ValueError(f"Unsupported isolation mode {mode}. Choose from {', '.join(ISOLATION_MODES)}.")
+    if not isinstance(data, pd.DataFrame) or mode == "shared":
+        return data
+    if mode == "copy_on_write" and supports_copy_on_write():
+        with isolation_context(mode):
+            return data.copy(deep=False)
+    if data.columns.has_duplicates:
+        # columns cannot be rebuilt one by one under duplicate labels
+        return data.copy()
+    columns = {}
+    for column in data.columns:
+        series = data[column]
+        if isinstance(series.dtype, np.dtype):
+            columns[column] = _read_only(series.to_numpy())
+        else:
+            # extension arrays cannot be flagged read-only; copying them is cheap for Arrow-backed
+            # columns, whose buffers are immutable, and copies the codes only for categoricals
+            columns[column] = series.array.copy()
+    return pd.DataFrame(columns, index=data.index, copy=False)
+
+
+def isolation_context(mode: str = "copy_on_write"):
+    """
+    Context that generated code runs in; enables pandas copy-on-write for the copy_on_write mode.
+    """
+    if mode == "copy_on_write" and hasattr(pd.options.mode, "copy_on_write"):
+        return pd.option_context("mode.copy_on_write", True)
+    return contextlib.nullcontext()
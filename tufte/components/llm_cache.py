@@ -0,0 +1,312 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tufte")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class LLMCache:
+    """
+    Persistent cache of chat completion responses, shared by Summarizer, GoalExplorer and VizGenerator.
+
+    Entries are keyed by a SHA-256 hash of the canonical JSON of the request (model, messages,
+    response_format and any other sampling arguments) and stored in SQLite. Entries older than
+    `ttl` seconds are treated as misses, and least recently used entries are evicted once the
+    stored responses exceed `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "llm_cache.sqlite")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # several processes, e.g. the workers of the tufte command, may share one cache file
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        if self.path != ":memory:":
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                content TEXT,
+                size INTEGER,
+                created_at REAL,
+                accessed_at REAL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(**request) -> str:
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._connection.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, content: str, model: Optional[str] = None) -> None:
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, size, now, now),
+            )
+            self._evict()
+            self._connection.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        expired = []
+        for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", expired)
+        self.evictions += len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+
+def _usage_attributes(response) -> Dict:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return {
+        "llm.prompt_tokens": usage.prompt_tokens,
+        "llm.completion_tokens": usage.completion_tokens,
+        "llm.total_tokens": usage.total_tokens,
+    }
+
+
+def _request_bytes(request: Dict) -> int:
+    return len(json.dumps(request.get("messages", []), ensure_ascii=False).encode("utf-8"))
+
+
+def _cached(cache: LLMCache, key: str, validate: Optional[Callable[[str], Any]]) -> Optional[str]:
+    """
+    Return the stored response of `key`, or None. A stored response `validate` rejects, e.g. one
+    cached before it was validated, is deleted so that it is requested again.
+    """
+    content = cache.get(key)
+    if content is not None and validate is not None:
+        try:
+            validate(content)
+        except Exception as exception_error:
+            logger.warning(f"Dropping a cached response that fails to parse: {exception_error}")
+            cache.delete(key)
+            return None
+    return content
+
+
+def _store(
+    cache: LLMCache, key: str, content: str, validate: Optional[Callable[[str], Any]], model: Optional[str]
+) -> None:
+    if validate is not None:
+        try:
+            validate(content)
+        except Exception as exception_error:
+            # the caller's own parsing reports the error
+            logger.debug(f"Not caching a response that fails to parse: {exception_error}")
+            return
+    cache.set(key, content, model=model)
+
+
+def create_completion(
+    client,
+    cache: Optional[LLMCache] = None,
+    tracer: Optional[Tracer] = None,
+    validate: Optional[Callable[[str], Any]] = None,
+    **request,
+) -> str:
+    """
+    Return the message content of a chat completion, served from `cache` when possible.
+    The call is recorded as an "llm.completion" span with token usage and payload sizes.
+
+    `validate` is called with the content, typically the caller's parser, and should raise for a
+    response the caller cannot use. Such a response is returned but not stored (the caller's own
+    parsing then fails), and a stored response it rejects is requested again.
+    """
+    tracer = tracer or Tracer()
+    with tracer.span("llm.completion", model=request.get("model"), request_bytes=_request_bytes(request)) as span:
+        key = LLMCache.make_key(**request) if cache is not None else None
+        if key is not None:
+            content = _cached(cache, key, validate)
+            if content is not None:
+                span.set_attributes(cache_hit=True, response_bytes=len(content.encode("utf-8")))
+                return content
+        response = client.chat.completions.create(**request)
+        content = response.choices[0].message.content
+        span.set_attributes(cache_hit=False, response_bytes=len(content.encode("utf-8")), **_usage_attributes(response))
+        if key is not None:
+            _store(cache, key, content, validate, request.get("model"))
+        return content
+
+
+async def acreate_completion(
+    client,
+    cache: Optional[LLMCache] = None,
+    tracer: Optional[Tracer] = None,
+    validate: Optional[Callable[[str], Any]] = None,
+    **request,
+) -> str:
+    tracer = tracer or Tracer()
+    with tracer.span("llm.completion", model=request.get("model"), request_bytes=_request_bytes(request)) as span:
+        key = LLMCache.make_key(**request) if cache is not None else None
+        if key is not None:
+            content = _cached(cache, key, validate)
+            if content is not None:
+                span.set_attributes(cache_hit=True, response_bytes=len(content.encode("utf-8")))
+                return content
+        response = await client.chat.completions.create(**request)
+        content = response.choices[0].message.content
+        span.set_attributes(cache_hit=False, response_bytes=len(content.encode("utf-8")), **_usage_attributes(response))
+        if key is not None:
+            _store(cache, key, content, validate, request.get("model"))
+        return content
+
+
+def _stream_request(request: Dict) -> Dict:
+    return {**request, "stream": True, "stream_options": {"include_usage": True}}
+
+
+def _chunk_text(chunk) -> str:
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def stream_completion(
+    client,
+    on_text: Callable[[str], None],
+    cache: Optional[LLMCache] = None,
+    tracer: Optional[Tracer] = None,
+    validate: Optional[Callable[[str], Any]] = None,
+    **request,
+) -> str:
+    """
+    Like create_completion, but streams the response and calls `on_text` with each piece of the
+    content as it arrives; a cached response is passed in one piece. Streamed and unstreamed calls
+    share cache entries. The span also records `time_to_first_token` in seconds.
+    """
+    tracer = tracer or Tracer()
+    with tracer.span("llm.completion", model=request.get("model"), request_bytes=_request_bytes(request)) as span:
+        key = LLMCache.make_key(**request) if cache is not None else None
+        if key is not None:
+            content = _cached(cache, key, validate)
+            if content is not None:
+                span.set_attributes(cache_hit=True, response_bytes=len(content.encode("utf-8")))
+                on_text(content)
+                return content
+        start, parts, usage = time.perf_counter(), [], {}
+        for chunk in client.chat.completions.create(**_stream_request(request)):
+            text = _chunk_text(chunk)
+            if text:
+                if not parts:
+                    span.set_attribute("time_to_first_token", time.perf_counter() - start)
+                parts.append(text)
+                on_text(text)
+            usage = _usage_attributes(chunk) or usage
+        content = "".join(parts)
+        span.set_attributes(cache_hit=False, response_bytes=len(content.encode("utf-8")), **usage)
+        if key is not None:
+            _store(cache, key, content, validate, request.get("model"))
+        return content
+
+
+async def astream_completion(
+    client,
+    on_text: Callable[[str], None],
+    cache: Optional[LLMCache] = None,
+    tracer: Optional[Tracer] = None,
+    validate: Optional[Callable[[str], Any]] = None,
+    **request,
+) -> str:
+    tracer = tracer or Tracer()
+    with tracer.span("llm.completion", model=request.get("model"), request_bytes=_request_bytes(request)) as span:
+        key = LLMCache.make_key(**request) if cache is not None else None
+        if key is not None:
+            content = _cached(cache, key, validate)
+            if content is not None:
+                span.set_attributes(cache_hit=True, response_bytes=len(content.encode("utf-8")))
+                on_text(content)
+                return content
+        start, parts, usage = time.perf_counter(), [], {}
+        async for chunk in await client.chat.completions.create(**_stream_request(request)):
+            text = _chunk_text(chunk)
+            if text:
+                if not parts:
+                    span.set_attribute("time_to_first_token", time.perf_counter() - start)
+                parts.append(text)
+                on_text(text)
+            usage = _usage_attributes(chunk) or usage
+        content = "".join(parts)
+        span.set_attributes(cache_hit=False, response_bytes=len(content.encode("utf-8")), **usage)
+        if key is not None:
+            _store(cache, key, content, validate, request.get("model"))
+        return content
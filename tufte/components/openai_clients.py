@@ -0,0 +1,32 @@
+class LazyOpenAIClients:
+    """
+    Gives a component `oai_client` and `oai_async_client` attributes that are created on first use,
+    so importing or constructing a component does not import openai.
+    """
+
+    _oai_client = None
+    _oai_async_client = None
+
+    @property
+    def oai_client(self):
+        if self._oai_client is None:
+            from openai import OpenAI
+
+            self._oai_client = OpenAI()
+        return self._oai_client
+
+    @oai_client.setter
+    def oai_client(self, client) -> None:
+        self._oai_client = client
+
+    @property
+    def oai_async_client(self):
+        if self._oai_async_client is None:
+            from openai import AsyncOpenAI
+
+            self._oai_async_client = AsyncOpenAI()
+        return self._oai_async_client
+
+    @oai_async_client.setter
+    def oai_async_client(self, client) -> None:
+        self._oai_async_client = client
@@ -1,39 +1,473 @@
+import asyncio
+import contextvars
 import logging
 import pandas as pd
-from typing import Dict, List, Union
+import queue
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Union
 
 from .code_executor import CodeExecutor
 from .data_model import Chart
+from .dtype_optimizer import DtypeOptimizer, DtypeReport
+from .execution_pool import ExecutionPool
 from .goal_explorer import GoalExplorer
-from .summarizer import Summarizer
+from .llm_cache import LLMCache
+from .prompt_context import PromptContextBuilder
+from .render_cache import RenderCache
+from .sampling import Sampler, get_sampler
+from .semantic_types import SemanticTypeInference
+from .streaming import StreamingProfile, profile_file
+from .summarizer import SUMMARY_CACHE_SEED, Summarizer
+from .summary_cache import SummaryCache
+from .tracing import Span, Tracer
 from .utils import read_dataframe
 from .viz_generator import VizGenerator
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
+DEFAULT_PREVIEW_ROWS = 5000
 
 
 class Orchestrator:
-    def __init__(self, model: str = DEFAULT_OPENAI_MODEL) -> None:
+    def __init__(
+        self,
+        model: str = DEFAULT_OPENAI_MODEL,
+        cache: Optional[LLMCache] = None,
+        execution_pool: Optional[ExecutionPool] = None,
+        tracer: Optional[Tracer] = None,
+        render_options: Optional[Dict] = None,
+        summary_cache: Optional[SummaryCache] = None,
+        prompt_context: Optional[PromptContextBuilder] = None,
+        preview: Union[None, bool, int, str, Dict, Sampler] = None,
+        optimize_dtypes: Union[bool, DtypeOptimizer] = False,
+        render_cache: Optional[RenderCache] = None,
+        semantic_types: Union[bool, SemanticTypeInference] = False,
+    ) -> None:
         self.data = None
         self.oai_model = model
-        self.summarizer = Summarizer(model=self.oai_model)
-        self.goal_explorer = GoalExplorer(model=self.oai_model)
-        self.viz_generator = VizGenerator(model=self.oai_model)
-        self.code_executor = CodeExecutor()
+        self.cache = cache
+        # one tracer for every component, so all stages reach the same exporters
+        self.tracer = tracer or Tracer()
+        self.summarizer = Summarizer(
+            model=self.oai_model,
+            cache=cache,
+            tracer=self.tracer,
+            summary_cache=summary_cache,
+            semantic_types=semantic_types,
+        )
+        # how the summary is pruned and encoded in goal and code prompts
+        self.goal_explorer = GoalExplorer(
+            model=self.oai_model, cache=cache, tracer=self.tracer, prompt_context=prompt_context
+        )
+        self.viz_generator = VizGenerator(
+            model=self.oai_model, cache=cache, tracer=self.tracer, prompt_context=prompt_context
+        )
+        self.code_executor = CodeExecutor(tracer=self.tracer, cache=render_cache)
+        self.render_cache = render_cache
+        self.execution_pool = execution_pool
+        # format, scale, dpi and size of rendered charts, see CodeExecutor.execute_code
+        self.render_options = render_options
+        # the streaming APIs first execute each chart on this sample of the data, see visualize_stream
+        if preview is True:
+            preview = DEFAULT_PREVIEW_ROWS
+        self.preview_sampler = get_sampler(preview, DEFAULT_PREVIEW_ROWS, seed=0) if preview else None
+        self._preview: Optional[tuple] = None
+        # shrink loaded data once (categoricals, parsed dates, downcast integers); summaries are unchanged
+        self.dtype_optimizer = DtypeOptimizer() if optimize_dtypes is True else (optimize_dtypes or None)
+        self.dtype_report: Optional[DtypeReport] = None
 
-    def summarize(self, data: Union[pd.DataFrame, str], n_samples: int = 3, enrich=False) -> Dict:
-        if isinstance(data, str):
-            self.data = read_dataframe(data)
-        return self.summarizer.summarize(data=self.data, n_samples=n_samples, enrich=enrich)
+    def _load(
+        self, data: Union[pd.DataFrame, str], streaming: bool, n_jobs: int, read_options: Dict
+    ) -> Union[pd.DataFrame, StreamingProfile]:
+        if isinstance(data, str) and streaming:
+            # profile the whole file in chunks and keep its reservoir sample for charting
+            profile = profile_file(data, n_jobs=n_jobs, **read_options)
+            self.data = self._optimize(profile.sample())
+            return profile
+        if isinstance(data, str) and self.summarizer.summary_cache is not None:
+            # the same rows are sampled again, so unchanged columns are served from the summary cache
+            read_options = {"seed": SUMMARY_CACHE_SEED, **read_options}
+        self.data = self._optimize(read_dataframe(data, **read_options) if isinstance(data, str) else data)
+        return self.data
+
+    def _optimize(self, data: pd.DataFrame) -> pd.DataFrame:
+        if self.dtype_optimizer is None:
+            return data
+        with self.tracer.span("orchestrator.optimize_dtypes") as span:
+            data, self.dtype_report = self.dtype_optimizer.optimize(data)
+            span.set_attribute("bytes_before", self.dtype_report.bytes_before)
+            span.set_attribute("bytes_after", self.dtype_report.bytes_after)
+        return data
+
+    def summarize(
+        self,
+        data: Union[pd.DataFrame, str],
+        n_samples: int = 3,
+        enrich=False,
+        approximate: bool = False,
+        streaming: bool = False,
+        n_jobs: int = 1,
+        read_options: Optional[Dict] = None,
+        sampling: Union[None, int, str, Dict, Sampler] = None,
+    ) -> Dict:
+        """
+        Summarize a DataFrame or a file. Files are sampled with `sampling`, a Sampler or an option of
+        get_sampler such as {"strategy": "stratified", "column": "region"}; a uniform sample by default.
+        """
+        read_options = {**(read_options or {}), **({"sampling": sampling} if sampling is not None else {})}
+        with self.tracer.span("orchestrator.summarize", enrich=enrich, streaming=streaming):
+            with self.tracer.span("orchestrator.load"):
+                source = self._load(data, streaming, n_jobs, read_options)
+            return self.summarizer.summarize(
+                data=source, n_samples=n_samples, enrich=enrich, approximate=approximate
+            )
+
+    async def asummarize(
+        self,
+        data: Union[pd.DataFrame, str],
+        n_samples: int = 3,
+        enrich=False,
+        approximate: bool = False,
+        streaming: bool = False,
+        n_jobs: int = 1,
+        read_options: Optional[Dict] = None,
+        sampling: Union[None, int, str, Dict, Sampler] = None,
+    ) -> Dict:
+        read_options = {**(read_options or {}), **({"sampling": sampling} if sampling is not None else {})}
+        with self.tracer.span("orchestrator.summarize", enrich=enrich, streaming=streaming):
+            with self.tracer.span("orchestrator.load"):
+                source = await asyncio.to_thread(self._load, data, streaming, n_jobs, read_options)
+            return await self.summarizer.asummarize(
+                data=source, n_samples=n_samples, enrich=enrich, approximate=approximate
+            )
 
     def explore_goals(self, summary: Dict, n_goals: int = 5) -> List[Dict]:
         return self.goal_explorer.generate_goals(summary=summary, n_goals=n_goals)
 
-    def visualize(self, summary: Dict, goal: Dict, library: str = "altair", debug=False) -> List:
+    async def aexplore_goals(self, summary: Dict, n_goals: int = 5) -> List[Dict]:
+        return await self.goal_explorer.agenerate_goals(summary=summary, n_goals=n_goals)
+
+    def _preview_data(self) -> Optional[pd.DataFrame]:
+        """
+        Return the preview sample of the loaded data, or None when previews are disabled or the data is
+        no larger than the sample. The sample is kept until other data is loaded, so the execution
+        pool publishes it once.
+        """
+        if self.preview_sampler is None or self.data is None or len(self.data) <= self.preview_sampler.size:
+            return None
+        if self._preview is None or self._preview[0] is not self.data:
+            with self.tracer.span("orchestrator.sample_preview", rows=self.preview_sampler.size):
+                self._preview = (self.data, self.preview_sampler.sample(self.data))
+        return self._preview[1]
+
+    def _execute(
+        self,
+        code: List[str],
+        library: str,
+        debug: bool,
+        altair_data: Optional[str] = None,
+        data: Optional[pd.DataFrame] = None,
+    ) -> List[Dict]:
+        data = self.data if data is None else data
+        if self.execution_pool is not None:
+            # workers trace with their own tracer; their per-chart timings come back in the results
+            with self.tracer.span("orchestrator.execute", library=library, pool=True):
+                if self.render_cache is not None:
+                    return self.render_cache.execute(
+                        self.execution_pool.execute_code,
+                        code,
+                        data,
+                        library=library,
+                        return_error=debug,
+                        altair_data=altair_data,
+                        render_options=self.render_options,
+                    )
+                return self.execution_pool.execute_code(
+                    code,
+                    data=data,
+                    library=library,
+                    return_error=debug,
+                    altair_data=altair_data,
+                    render_options=self.render_options,
+                )
+        # snippets execute one at a time in this process, rendering runs concurrently; see CodeExecutor
+        return self.code_executor.execute_code(
+            code,
+            data=data,
+            library=library,
+            return_error=debug,
+            altair_data=altair_data,
+            render_options=self.render_options,
+        )
+
+    def _as_goal(self, goal: Union[Dict, str]) -> Dict:
         if isinstance(goal, str):
-            goal = {"question": goal, "visualization": goal, "rationale": ""}
-        code = self.viz_generator.generate_code(summary=summary, goal=goal, library=library)
-        charts = self.code_executor.execute_code(code, data=self.data, library=library, return_error=debug)
-        return [Chart(**chart) for chart in charts]
\ No newline at end of file
+            return {"question": goal, "visualization": goal, "rationale": ""}
+        return goal
+
+    def _make_chart(
+        self,
+        chart: Dict,
+        goal: Dict,
+        generate_time: Optional[float],
+        total_time: float,
+        preview: Optional[bool] = None,
+    ) -> Chart:
+        timings = {"generate_code": generate_time, **chart.get("timings", {}), "total": total_time}
+        return Chart(**{**chart, "timings": timings}, goal=goal, preview=preview)
+
+    def _make_charts(self, charts: List[Dict], goal: Dict, span: Span) -> List[Chart]:
+        generate_span = span.child("viz_generator.generate_code")
+        generate_time = generate_span.duration if generate_span is not None else None
+        return [self._make_chart(chart, goal, generate_time, span.duration) for chart in charts]
+
+    def visualize(
+        self,
+        summary: Dict,
+        goal: Dict,
+        library: str = "altair",
+        debug=False,
+        altair_data: Optional[str] = None,
+        data: Optional[pd.DataFrame] = None,
+    ) -> List:
+        """
+        Generate and execute the code for one goal. `altair_data` chooses how altair specs carry their
+        data ("inline", "reference" or "external"); by default the code executor's setting applies.
+        `data` charts another frame than the one loaded by summarize, so one orchestrator can serve
+        several datasets at once.
+        """
+        goal = self._as_goal(goal)
+        with self.tracer.span("orchestrator.visualize", library=library) as span:
+            code = self.viz_generator.generate_code(summary=summary, goal=goal, library=library)
+            charts = self._execute(code, library, debug, altair_data, data)
+        return self._make_charts(charts, goal, span)
+
+    async def avisualize(
+        self,
+        summary: Dict,
+        goal: Dict,
+        library: str = "altair",
+        debug=False,
+        altair_data: Optional[str] = None,
+        data: Optional[pd.DataFrame] = None,
+    ) -> List:
+        goal = self._as_goal(goal)
+        with self.tracer.span("orchestrator.visualize", library=library) as span:
+            code = await self.viz_generator.agenerate_code(summary=summary, goal=goal, library=library)
+            charts = await asyncio.to_thread(self._execute, code, library, debug, altair_data, data)
+        return self._make_charts(charts, goal, span)
+
+    def visualize_goals(
+        self,
+        summary: Dict,
+        goals: List[Union[Dict, str]],
+        library: str = "altair",
+        batch_size: Optional[int] = None,
+        debug=False,
+        altair_data: Optional[str] = None,
+    ) -> List[Chart]:
+        """
+        Visualize several goals, generating their code with one LLM request per `batch_size` goals
+        (all goals by default). Each chart's generate_code timing is the time of the whole batch.
+        """
+        goals = [self._as_goal(goal) for goal in goals]
+        with self.tracer.span("orchestrator.visualize_goals", library=library, goals=len(goals)):
+            with self.tracer.span("orchestrator.generate_code_batch", library=library) as generate_span:
+                codes = self.viz_generator.generate_code_batch(summary, goals, library, batch_size)
+            charts = []
+            for goal, code in zip(goals, codes):
+                with self.tracer.span("orchestrator.execute_goal", library=library) as execute_span:
+                    results = self._execute(code, library, debug, altair_data)
+                charts.extend(
+                    self._make_chart(chart, goal, generate_span.duration, generate_span.duration + execute_span.duration)
+                    for chart in results
+                )
+            return charts
+
+    async def avisualize_goals(
+        self,
+        summary: Dict,
+        goals: List[Union[Dict, str]],
+        libraries: Union[str, List[str]] = "altair",
+        max_concurrency: int = 4,
+        batch_size: int = 1,
+        debug=False,
+        altair_data: Optional[str] = None,
+    ) -> AsyncIterator[Chart]:
+        """
+        Visualize every goal with every library concurrently, with at most `max_concurrency`
+        goal/library pairs in flight. Charts are yielded as soon as their pair finishes.
+        With `batch_size` > 1 the code for each library is generated with one LLM request per
+        `batch_size` goals, and each goal executes as soon as its library's code is ready.
+
+        `max_concurrency` bounds the LLM requests and executions in flight, but only the LLM requests
+        and the rendering overlap in this process: snippets execute one at a time (see CodeExecutor)
+        unless the orchestrator has an `execution_pool`, whose workers execute up to n_workers at once.
+        """
+        libraries = [libraries] if isinstance(libraries, str) else libraries
+        goals = [self._as_goal(goal) for goal in goals]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def generate_batch(library):
+            with self.tracer.span("orchestrator.generate_code_batch", library=library) as span:
+                codes = await self.viz_generator.agenerate_code_batch(summary, goals, library, batch_size)
+            return codes, span.duration
+
+        batches = (
+            {library: asyncio.ensure_future(generate_batch(library)) for library in libraries}
+            if batch_size > 1
+            else {}
+        )
+
+        async def visualize_batched(index, goal, library):
+            codes, generate_time = await batches[library]
+            async with semaphore:
+                with self.tracer.span("orchestrator.execute_goal", library=library) as span:
+                    charts = await asyncio.to_thread(self._execute, codes[index], library, debug, altair_data)
+            return [self._make_chart(chart, goal, generate_time, generate_time + span.duration) for chart in charts]
+
+        async def visualize_with_limit(index, goal, library):
+            if batches:
+                return await visualize_batched(index, goal, library)
+            async with semaphore:
+                return await self.avisualize(
+                    summary=summary, goal=goal, library=library, debug=debug, altair_data=altair_data
+                )
+
+        tasks = [
+            asyncio.ensure_future(visualize_with_limit(index, goal, library))
+            for index, goal in enumerate(goals)
+            for library in libraries
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                for chart in await next_done:
+                    yield chart
+        finally:
+            for task in tasks + list(batches.values()):
+                task.cancel()
+
+    def visualize_stream(
+        self,
+        summary: Dict,
+        goals: Union[Dict, str, List[Union[Dict, str]]],
+        library: str = "altair",
+        batch_size: Optional[int] = None,
+        debug=False,
+        altair_data: Optional[str] = None,
+    ) -> Iterator[Chart]:
+        """
+        Yield each chart as soon as it has executed. The code is streamed from the LLM in a background
+        thread (one request per `batch_size` goals, all goals by default) and every ```python block
+        executes as soon as it closes, while the rest of the response is still being generated.
+        `goals` may be a single goal. A chart's generate_code timing is the time from the start of the
+        stream until its block closed, and its total timing the time until the chart was ready.
+
+        With the orchestrator's `preview` option each block first executes on the preview sample and
+        its chart is yielded with preview=True; the chart executed on all the loaded data follows
+        with preview=False and replaces it.
+        """
+        goals = [self._as_goal(goal) for goal in (goals if isinstance(goals, list) else [goals])]
+        blocks: queue.Queue = queue.Queue()
+        start = time.perf_counter()
+
+        def on_code(index: int, code: str) -> None:
+            blocks.put((index, code, time.perf_counter() - start))
+
+        def generate() -> None:
+            try:
+                self.viz_generator.generate_code_stream(summary, goals, on_code, library, batch_size)
+            except Exception as exception_error:
+                blocks.put(exception_error)
+            else:
+                blocks.put(None)
+
+        # the thread starts with the caller's context, so its spans nest under the caller's span
+        threading.Thread(target=contextvars.copy_context().run, args=(generate,), daemon=True).start()
+        preview_data = self._preview_data()
+        while True:
+            block = blocks.get()
+            if block is None:
+                return
+            if isinstance(block, Exception):
+                raise block
+            index, code, generate_time = block
+            if preview_data is not None:
+                with self.tracer.span("orchestrator.execute_preview", library=library):
+                    charts = self._execute([code], library, debug, altair_data, data=preview_data)
+                total_time = time.perf_counter() - start
+                for chart in charts:
+                    yield self._make_chart(chart, goals[index], generate_time, total_time, preview=True)
+            with self.tracer.span("orchestrator.execute_goal", library=library):
+                charts = self._execute([code], library, debug, altair_data)
+            total_time = time.perf_counter() - start
+            final = False if preview_data is not None else None
+            for chart in charts:
+                yield self._make_chart(chart, goals[index], generate_time, total_time, preview=final)
+
+    async def avisualize_stream(
+        self,
+        summary: Dict,
+        goals: Union[Dict, str, List[Union[Dict, str]]],
+        library: str = "altair",
+        batch_size: Optional[int] = None,
+        debug=False,
+        altair_data: Optional[str] = None,
+    ) -> AsyncIterator[Chart]:
+        """
+        Async version of visualize_stream. Blocks are scheduled as they close, and charts are yielded
+        in the order they finish; a block's final execution starts once its preview is done. The
+        snippets of concurrent blocks execute in parallel only with an `execution_pool`; in process
+        they execute one at a time while the generation and the rendering go on, see CodeExecutor.
+        """
+        goals = [self._as_goal(goal) for goal in (goals if isinstance(goals, list) else [goals])]
+        blocks: asyncio.Queue = asyncio.Queue()
+        start = time.perf_counter()
+
+        def on_code(index: int, code: str) -> None:
+            blocks.put_nowait((index, code, time.perf_counter() - start))
+
+        async def execute(index: int, code: str, generate_time: float, preview: Optional[bool]) -> List[Chart]:
+            data = preview_data if preview else None
+            name = "orchestrator.execute_preview" if preview else "orchestrator.execute_goal"
+            with self.tracer.span(name, library=library):
+                charts = await asyncio.to_thread(self._execute, [code], library, debug, altair_data, data)
+            total_time = time.perf_counter() - start
+            return [self._make_chart(chart, goals[index], generate_time, total_time, preview) for chart in charts]
+
+        generation = asyncio.ensure_future(
+            self.viz_generator.agenerate_code_stream(summary, goals, on_code, library, batch_size)
+        )
+        # the sentinel is queued after every block the generation emitted
+        generation.add_done_callback(lambda _: blocks.put_nowait(None))
+        preview_data = await asyncio.to_thread(self._preview_data)
+        # execution task -> (block, preview phase)
+        executions: Dict[asyncio.Future, tuple] = {}
+        next_block, generating = None, True
+        try:
+            while generating or executions:
+                if generating and next_block is None:
+                    next_block = asyncio.ensure_future(blocks.get())
+                pending = set(executions) | ({next_block} if generating else set())
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if next_block in done:
+                    block, next_block = next_block.result(), None
+                    if block is None:
+                        generating = False
+                        # raises the error of a failed generation
+                        generation.result()
+                    else:
+                        phase = True if preview_data is not None else None
+                        executions[asyncio.ensure_future(execute(*block, phase))] = (block, phase)
+                for execution in done & executions.keys():
+                    block, phase = executions.pop(execution)
+                    if phase:
+                        executions[asyncio.ensure_future(execute(*block, False))] = (block, False)
+                    for chart in execution.result():
+                        yield chart
+        finally:
+            for task in [generation, next_block, *executions]:
+                if task is not None:
+                    task.cancel()
@@ -0,0 +1,152 @@
+import logging
+import warnings
+from typing import Dict, Optional
+
+import pandas as pd
+
+from .sketches import DEFAULT_HLL_PRECISION, HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATE_PROBE_SIZE = 1000
+DEFAULT_SAMPLE_POOL_SIZE = 10000
+NUMERIC_STATISTICS = ["mean", "std", "min", "max"]
+# text columns with fewer distinct values per row than this are summarized as categories
+CATEGORY_UNIQUE_RATIO = 0.5
+
+
+def convert_np_dtype(value, dtype):
+    if pd.api.types.is_float_dtype(dtype):
+        return float(value)
+    elif pd.api.types.is_integer_dtype(dtype):
+        return int(value)
+    return value
+
+
+def is_number(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def is_date(series: pd.Series) -> bool:
+    # pyarrow-backed timestamps are not datetime64 dtypes but share their kind
+    return pd.api.types.is_datetime64_any_dtype(series) or series.dtype.kind == "M"
+
+
+def is_text(series: pd.Series) -> bool:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def parse_dates(
+    series: pd.Series, probe_size: int = DEFAULT_DATE_PROBE_SIZE, random_state: int = 42
+) -> Optional[pd.Series]:
+    """
+    Parse a text column as dates, or return None if any value is not a date.
+    A bounded random probe of the values is parsed first so most non-date columns fail fast.
+    """
+    non_null = series.dropna()
+    if non_null.empty:
+        return None
+    probe = non_null
+    if len(non_null) > probe_size:
+        probe = non_null.sample(probe_size, random_state=random_state)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            pd.to_datetime(probe, errors="raise")
+            return pd.to_datetime(series, errors="raise")
+        except (ValueError, TypeError, OverflowError):
+            return None
+
+
+class ColumnProfiler:
+    """
+    Computes the per-column statistics of a dataset summary.
+
+    Numeric statistics are aggregated for the whole frame in a single call, every column's
+    values are deduplicated exactly once, and text columns are only parsed as dates in full after
+    a bounded probe of their values parses cleanly. With approximate=True, distinct counts come
+    from HyperLogLog sketches and samples are drawn from a bounded pool of rows.
+    """
+
+    def __init__(
+        self,
+        n_samples: int = 3,
+        approximate: bool = False,
+        date_probe_size: int = DEFAULT_DATE_PROBE_SIZE,
+        sample_pool_size: int = DEFAULT_SAMPLE_POOL_SIZE,
+        sketch_precision: int = DEFAULT_HLL_PRECISION,
+        random_state: int = 42,
+    ) -> None:
+        self.n_samples = n_samples
+        self.approximate = approximate
+        self.date_probe_size = date_probe_size
+        self.sample_pool_size = sample_pool_size
+        self.sketch_precision = sketch_precision
+        self.random_state = random_state
+
+    def profile(self, df: pd.DataFrame) -> Dict[str, Dict]:
+        numeric_mask = [is_number(series) for _, series in df.items()]
+        numeric_stats = df.loc[:, numeric_mask].agg(NUMERIC_STATISTICS) if any(numeric_mask) else None
+
+        properties_dict = {}
+        for (column, series), numeric in zip(df.items(), numeric_mask):
+            parsed_dates = None
+            if is_text(series):
+                parsed_dates = parse_dates(series, self.date_probe_size, self.random_state)
+            values = parsed_dates if parsed_dates is not None else series
+            non_null = values.dropna()
+            num_unique, samples = self._distinct(non_null)
+
+            properties = {"dtype": str(series.dtype)}
+            if numeric:
+                stats = numeric_stats[column]
+                properties.update(
+                    {
+                        "dtype": "number",
+                        "mean": round(float(stats["mean"]), 4),
+                        "std": round(float(stats["std"]), 4),
+                        "min": convert_np_dtype(stats["min"], series.dtype),
+                        "max": convert_np_dtype(stats["max"], series.dtype),
+                    }
+                )
+            elif pd.api.types.is_bool_dtype(series):
+                properties["dtype"] = "boolean"
+            elif parsed_dates is not None or is_date(series):
+                properties["dtype"] = "date"
+            elif isinstance(series.dtype, pd.CategoricalDtype):
+                properties["dtype"] = "category"
+            elif is_text(series):
+                unique_ratio = num_unique / max(len(series), 1)
+                properties["dtype"] = "category" if unique_ratio < CATEGORY_UNIQUE_RATIO else "string"
+
+            properties["samples"] = samples
+            if properties["dtype"] == "date":
+                properties["min"] = non_null.min().isoformat() if len(non_null) else None
+                properties["max"] = non_null.max().isoformat() if len(non_null) else None
+                properties["samples"] = [sample.isoformat() for sample in samples]
+
+            properties["num_unique_values"] = num_unique
+            properties_dict[column] = properties
+
+        return properties_dict
+
+    def _distinct(self, non_null: pd.Series):
+        if self.approximate:
+            num_unique = HyperLogLog(self.sketch_precision).update(non_null).count()
+            pool = non_null
+            if len(non_null) > self.sample_pool_size:
+                pool = non_null.sample(self.sample_pool_size, random_state=self.random_state)
+            unique_values = pool.unique()
+        else:
+            unique_values = non_null.unique()
+            num_unique = len(unique_values)
+
+        n_samples_adjusted = min(self.n_samples, len(unique_values))
+        samples = (
+            pd.Series(unique_values)
+            .sample(n_samples_adjusted, random_state=self.random_state)
+            .tolist()
+        )
+        return num_unique, samples
@@ -0,0 +1,222 @@
+import json
+import logging
+import math
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+PROMPT_ENCODINGS = ("table", "json")
+DEFAULT_MAX_TOKENS = 4000
+MAX_SAMPLE_CHARS = 40
+TABLE_COLUMNS = "name | dtype | semantic_type | unique | range | samples | description"
+
+TIME_WORDS = {
+    "time", "trend", "trends", "over", "date", "day", "daily", "week", "weekly", "month", "monthly",
+    "year", "yearly", "annual", "season", "seasonal", "timeline", "history", "period",
+}
+GEO_WORDS = {"map", "country", "countries", "state", "states", "city", "cities", "region", "location", "geographic"}
+GEO_SEMANTIC_TYPES = {"location", "city", "country", "state", "region", "zipcode", "longitude", "latitude", "address"}
+
+
+def _words(text: str) -> List[str]:
+    # split camelCase and snake_case names as well as prose
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return [word for word in re.split(r"[^0-9a-zA-Z]+", text.lower()) if word]
+
+
+def name_heuristic(name: str, properties: Dict, goal: str) -> float:
+    """
+    Score fields named in the goal: 10 for the whole name, otherwise up to 5 for its words.
+    """
+    goal_words = _words(goal)
+    name_words = _words(name)
+    if not name_words:
+        return 0.0
+    phrase = " ".join(name_words)
+    if name.lower() in goal.lower() or re.search(rf"\b{re.escape(phrase)}\b", " ".join(goal_words)):
+        return 10.0
+    matched = [word for word in name_words if len(word) >= 3 and word in goal_words]
+    return 5.0 * len(matched) / len(name_words)
+
+
+def time_heuristic(name: str, properties: Dict, goal: str) -> float:
+    """
+    Score date fields when the goal asks about change over time.
+    """
+    if properties.get("dtype") == "date" or properties.get("semantic_type") == "date":
+        return 3.0 if TIME_WORDS & set(_words(goal)) else 0.0
+    return 0.0
+
+
+def geo_heuristic(name: str, properties: Dict, goal: str) -> float:
+    """
+    Score location fields when the goal asks for a map or a geographic breakdown.
+    """
+    if str(properties.get("semantic_type", "")).lower() in GEO_SEMANTIC_TYPES:
+        return 3.0 if GEO_WORDS & set(_words(goal)) else 0.0
+    return 0.0
+
+
+DEFAULT_HEURISTICS = (name_heuristic, time_heuristic, geo_heuristic)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken when it is installed, otherwise estimate four characters per token.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return math.ceil(len(text) / 4)
+    return len(tiktoken.get_encoding("cl100k_base").encode(text, disallowed_special=()))
+
+
+class PromptContext:
+    """
+    The dataset summary as it is sent to the LLM: `text` holds `fields` of the summary's
+    `total_fields`, and `saved_tokens` is how much shorter it is than json.dumps(summary).
+    """
+
+    def __init__(self, text: str, fields: List[str], total_fields: int, tokens: int, baseline_tokens: int) -> None:
+        self.text = text
+        self.fields = fields
+        self.total_fields = total_fields
+        self.tokens = tokens
+        self.baseline_tokens = baseline_tokens
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.baseline_tokens - self.tokens, 0)
+
+    def attributes(self) -> Dict:
+        return {
+            "prompt.fields": len(self.fields),
+            "prompt.total_fields": self.total_fields,
+            "prompt.tokens": self.tokens,
+            "prompt.baseline_tokens": self.baseline_tokens,
+            "prompt.saved_tokens": self.saved_tokens,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"PromptContext(fields={len(self.fields)}/{self.total_fields}, tokens={self.tokens}, "
+            f"saved_tokens={self.saved_tokens})"
+        )
+
+
+class PromptContextBuilder:
+    """
+    Turns a dataset summary into the context of a prompt.
+
+    Fields are ranked by the sum of `heuristics`, each called as heuristic(name, properties, goal)
+    with the goal text, and added in that order (ties keep the summary's order) until the context
+    reaches `max_tokens`; `always_include` fields come first. Fields that do not fit are listed by
+    name only, or counted when even their names do not fit. With `max_tokens=None` every field is
+    kept. The "table" encoding writes one line per field instead of JSON, "json" keeps json.dumps.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = DEFAULT_MAX_TOKENS,
+        encoding: str = "table",
+        heuristics: Sequence[Callable[[str, Dict, str], float]] = DEFAULT_HEURISTICS,
+        always_include: Sequence[str] = (),
+    ) -> None:
+        if encoding not in PROMPT_ENCODINGS:
+            raise ValueError(f"Unsupported encoding {encoding}. Choose from {', '.join(PROMPT_ENCODINGS)}.")
+        self.max_tokens = max_tokens
+        self.encoding = encoding
+        self.heuristics = list(heuristics)
+        self.always_include = list(always_include)
+
+    def rank_fields(self, fields: Dict, goal: str = "") -> List[str]:
+        scores = {
+            name: sum(heuristic(name, properties, goal) for heuristic in self.heuristics) if goal else 0.0
+            for name, properties in fields.items()
+        }
+        pinned = [name for name in self.always_include if name in fields]
+        rest = sorted((name for name in fields if name not in pinned), key=lambda name: -scores[name])
+        return pinned + rest
+
+    def build(self, summary: Dict, goal: str = "") -> PromptContext:
+        fields = summary.get("fields", summary) if isinstance(summary, dict) else {}
+        if not isinstance(fields, dict) or not all(isinstance(value, dict) for value in fields.values()):
+            # not a tufte summary, send it unchanged
+            text = json.dumps(summary, default=str)
+            tokens = count_tokens(text)
+            return PromptContext(text, [], 0, tokens, tokens)
+        baseline_tokens = count_tokens(json.dumps(summary, default=str))
+        description = summary.get("description") if fields is not summary else None
+
+        ranked = self.rank_fields(fields, goal)
+        header = self._encode_header(description)
+        tokens = count_tokens(header)
+        selected, lines = [], []
+        for name in ranked:
+            line = self._encode_field(name, fields[name])
+            line_tokens = count_tokens(line) + 1
+            if self.max_tokens is not None and selected and tokens + line_tokens > self.max_tokens:
+                break
+            selected.append(name)
+            lines.append(line)
+            tokens += line_tokens
+        omitted = [name for name in fields if name not in selected]
+        if omitted:
+            lines.append(self._encode_omitted(omitted, tokens))
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            logger.warning(f"The first field of the summary alone exceeds the budget of {self.max_tokens} tokens")
+
+        order = {name: index for index, name in enumerate(fields)}
+        if self.encoding == "json":
+            kept = {name: fields[name] for name in sorted(selected, key=order.get)}
+            text = json.dumps({"description": description, "fields": kept} if description is not None else kept, default=str)
+            if omitted:
+                text = f"{text}\n{lines[-1]}"
+        else:
+            text = "\n".join([header, *lines])
+        context = PromptContext(text, selected, len(fields), count_tokens(text), baseline_tokens)
+        logger.info(f"Prompt context keeps {len(selected)} of {len(fields)} fields, saving {context.saved_tokens} tokens")
+        return context
+
+    def _encode_header(self, description: Optional[str]) -> str:
+        if self.encoding == "json":
+            return ""
+        lines = [f"Dataset: {description}"] if description else []
+        lines.append(f"Fields, one per line ({TABLE_COLUMNS}):")
+        return "\n".join(lines)
+
+    def _encode_field(self, name: str, properties: Dict) -> str:
+        if self.encoding == "json":
+            return json.dumps({name: properties}, default=str)
+        value_range = ""
+        if properties.get("min") is not None or properties.get("max") is not None:
+            value_range = f"{_format_value(properties.get('min'))}..{_format_value(properties.get('max'))}"
+        if properties.get("mean") is not None:
+            value_range += f", mean {_format_value(properties['mean'])}"
+        samples = ", ".join(json.dumps(_format_value(sample)) for sample in properties.get("samples") or [])
+        cells = [
+            name,
+            properties.get("dtype", ""),
+            properties.get("semantic_type", ""),
+            properties.get("num_unique_values", ""),
+            value_range,
+            samples,
+            properties.get("description", ""),
+        ]
+        return " | ".join(str(cell).replace("\n", " ") for cell in cells)
+
+    def _encode_omitted(self, omitted: List[str], tokens: int) -> str:
+        line = f"Other fields (not described): {', '.join(omitted)}"
+        if self.max_tokens is None or tokens + count_tokens(line) <= self.max_tokens:
+            return line
+        return f"{len(omitted)} other fields are not described."
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return float(f"{value:.4g}")
+    if isinstance(value, str):
+        value = value[:-9] if value.endswith("T00:00:00") else value
+        return value if len(value) <= MAX_SAMPLE_CHARS else value[:MAX_SAMPLE_CHARS] + "..."
+    return value
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_BYTES = 2 * 1024**3
+
+
+class DatasetNotFound(KeyError):
+    """
+    Raised for a dataset id that was never registered or has been evicted or removed.
+    """
+
+
+class Dataset:
+    """
+    A parsed dataset held in memory by a DatasetRegistry, with the summaries computed for it.
+    """
+
+    def __init__(self, dataset_id: str, name: str, data: pd.DataFrame) -> None:
+        self.id = dataset_id
+        self.name = name
+        self.data = data
+        self.nbytes = int(data.memory_usage(index=True, deep=True).sum())
+        self.created_at = time.time()
+        # summaries of this dataset keyed by their options, see TufteServer
+        self.summaries: Dict[str, Dict] = {}
+        # what DtypeOptimizer changed when the dataset was registered, if it ran
+        self.dtype_report = None
+
+    def info(self) -> Dict:
+        info = {
+            "dataset_id": self.id,
+            "name": self.name,
+            "rows": len(self.data),
+            "columns": list(map(str, self.data.columns)),
+            "bytes": self.nbytes,
+        }
+        if self.dtype_report is not None:
+            info["bytes_before_optimization"] = self.dtype_report.bytes_before
+        return info
+
+
+class DatasetRegistry:
+    """
+    In-memory store of parsed datasets, so a dataset is parsed once however often it is used.
+    Datasets are evicted least recently used first once their frames exceed `max_bytes` of memory
+    (measured with DataFrame.memory_usage(deep=True)); a dataset larger than `max_bytes` on its
+    own is rejected. Safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_REGISTRY_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._datasets: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, dataset_id: str, data: pd.DataFrame, name: Optional[str] = None) -> Dataset:
+        dataset = Dataset(dataset_id, name or dataset_id, data)
+        if dataset.nbytes > self.max_bytes:
+            raise ValueError(
+                f"Dataset {dataset.name} takes {dataset.nbytes} bytes, more than the registry's {self.max_bytes}"
+            )
+        with self._lock:
+            previous = self._datasets.pop(dataset_id, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._datasets[dataset_id] = dataset
+            self._bytes += dataset.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._datasets.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+                logger.info(f"Evicted dataset {evicted.name} ({evicted.nbytes} bytes) from the registry")
+        return dataset
+
+    def get(self, dataset_id: str) -> Dataset:
+        """
+        Return a dataset and mark it as recently used. Raises DatasetNotFound for unknown or evicted datasets.
+        """
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is None:
+                self.misses += 1
+                raise DatasetNotFound(dataset_id)
+            self._datasets.move_to_end(dataset_id)
+            self.hits += 1
+            return dataset
+
+    def remove(self, dataset_id: str) -> bool:
+        with self._lock:
+            dataset = self._datasets.pop(dataset_id, None)
+            if dataset is None:
+                return False
+            self._bytes -= dataset.nbytes
+            return True
+
+    def __contains__(self, dataset_id: str) -> bool:
+        with self._lock:
+            return dataset_id in self._datasets
+
+    def __len__(self) -> int:
+        return len(self._datasets)
+
+    def datasets(self) -> List[Dict]:
+        with self._lock:
+            return [dataset.info() for dataset in self._datasets.values()]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "datasets": len(self._datasets),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class RequestCoalescer:
+    """
+    Runs identical concurrent requests once: callers that ask for a key already being computed
+    await the same result (or exception) instead of starting the computation again. Nothing is
+    kept after the computation finishes. A caller that is cancelled does not cancel the shared
+    computation. Use from a single event loop.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._in_flight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(compute())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            # the exception is delivered to every waiting caller; mark it retrieved for the loop
+            future.exception()
+
+    def stats(self) -> Dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": self.in_flight()}
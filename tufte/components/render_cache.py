@@ -0,0 +1,206 @@
+import ast
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from .llm_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from .summary_cache import SummaryCache, column_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# names altair numbers with a process-wide counter, so equal charts get different ones
+_GENERATED_NAME = re.compile(r"\b(?:param|view|selector)_\d+\b")
+
+
+def code_fingerprint(code: str) -> Optional[str]:
+    """
+    Hash the syntax tree of a snippet, so formatting, comments and docstrings do not change the
+    hash. Returns None for code that does not parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if isinstance(body, list):
+            # bare string statements are docstrings or commented-out code and never run
+            node.body = [
+                statement
+                for statement in body
+                if not (isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant))
+            ] or [ast.Pass()]
+    return hashlib.sha256(ast.dump(tree).encode("utf-8")).hexdigest()
+
+
+def frame_fingerprint(data: pd.DataFrame) -> Optional[str]:
+    """
+    Hash a frame's index and the name, dtype and values of every column. Returns None if a column
+    cannot be hashed, see column_fingerprint.
+    """
+    if isinstance(data.index, pd.RangeIndex):
+        fingerprints = [repr(data.index)]
+    else:
+        fingerprints = [column_fingerprint(pd.Series(data.index, name="__index__"))]
+    fingerprints += [column_fingerprint(series) for _, series in data.items()]
+    if any(fingerprint is None for fingerprint in fingerprints):
+        return None
+    return hashlib.sha256("|".join(fingerprints).encode("utf-8")).hexdigest()
+
+
+def canonical_spec(spec: Dict) -> str:
+    """
+    Canonical JSON of a Vega-Lite spec: sorted keys, and the parameter and view names altair numbers
+    globally renumbered in order of appearance, so the same chart built twice serializes the same.
+    """
+    text = json.dumps(spec, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    names: Dict[str, str] = {}
+
+    def renumber(match: re.Match) -> str:
+        name = match.group(0)
+        if name not in names:
+            names[name] = f"{name.rsplit('_', 1)[0]}_{len(names)}"
+        return names[name]
+
+    return _GENERATED_NAME.sub(renumber, text)
+
+
+def spec_fingerprint(
+    spec: Dict, datasets: Optional[Dict[str, Any]] = None, memo: Optional[Dict[int, Optional[str]]] = None
+) -> Optional[str]:
+    """
+    Hash a Vega-Lite spec whose datasets are kept aside by name, see altair_data.chart_to_spec. The
+    datasets are hashed by their values instead of being serialized into the spec. Returns None if
+    a dataset cannot be hashed. `memo` maps id(dataset) to its fingerprint, so a frame used by
+    several specs is hashed once; the datasets must stay alive while it is in use.
+    """
+    memo = {} if memo is None else memo
+    digest = hashlib.sha256(canonical_spec(spec).encode("utf-8"))
+    for name, dataset in sorted((datasets or {}).items()):
+        if id(dataset) not in memo:
+            memo[id(dataset)] = frame_fingerprint(dataset) if isinstance(dataset, pd.DataFrame) else None
+        fingerprint = memo[id(dataset)]
+        if fingerprint is None:
+            return None
+        digest.update(f"|{name}:{fingerprint}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _dump(result: Dict) -> Dict:
+    result = {key: value for key, value in result.items() if key not in ("code", "timings")}
+    if isinstance(result.get("image"), bytes):
+        result["image"] = base64.b64encode(result["image"]).decode("ascii")
+    return result
+
+
+def _load(entry: Dict) -> Dict:
+    if entry.get("image") is not None:
+        entry["image"] = base64.b64decode(entry["image"])
+    return entry
+
+
+class RenderCache(SummaryCache):
+    """
+    Persistent cache of executed and rendered charts, stored like LLMCache in SQLite with LRU and
+    TTL eviction bounded by `max_bytes`.
+
+    Two kinds of entries are kept. The result of a snippet (its spec and raster) is keyed by the
+    hash of its syntax tree, the library, a fingerprint of the data and the render options, so a
+    re-run of an unchanged report neither executes nor renders again. The raster of a Vega-Lite spec
+    is keyed by its canonical form, so different snippets that build the same chart render it once.
+    Only successful charts are stored.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: Optional[float] = None,
+    ) -> None:
+        super().__init__(path or os.path.join(DEFAULT_CACHE_DIR, "render_cache.sqlite"), max_bytes, ttl)
+
+    def get_raster(self, spec_key: str, render_options: Optional[Dict] = None) -> Optional[bytes]:
+        entry = self.get_json(self.make_key(kind="raster", spec=spec_key, render_options=render_options))
+        return base64.b64decode(entry["image"]) if entry is not None else None
+
+    def set_raster(self, spec_key: str, image: bytes, render_options: Optional[Dict] = None) -> None:
+        key = self.make_key(kind="raster", spec=spec_key, render_options=render_options)
+        self.set_json(key, {"image": base64.b64encode(image).decode("ascii")})
+
+    def execute(
+        self,
+        execute_code: Callable[..., List[Dict]],
+        code_specs: List[str],
+        data: Any,
+        library: str = "altair",
+        return_error: bool = False,
+        altair_data: Optional[str] = None,
+        render_options: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """
+        Call `execute_code` (CodeExecutor.execute_code or ExecutionPool.execute_code) for the snippets
+        without a stored result and return the results of all snippets in order. Snippets with the
+        same syntax tree execute once per call. Results served from the cache carry a single
+        "cache" timing. Data that cannot be fingerprinted and external altair data, whose files
+        may be gone later, bypass the cache.
+        """
+        options = {"return_error": return_error, "altair_data": altair_data, "render_options": render_options}
+        data_key = frame_fingerprint(data) if isinstance(data, pd.DataFrame) else None
+        if data_key is None or altair_data == "external":
+            return execute_code(code_specs, data, library=library, **options)
+
+        start = time.perf_counter()
+        keys = []
+        for code in code_specs:
+            code_key = code_fingerprint(code)
+            keys.append(
+                self.make_key(
+                    kind="result",
+                    code=code_key,
+                    library=library,
+                    data=data_key,
+                    altair_data=altair_data,
+                    render_options=render_options,
+                )
+                if code_key is not None
+                else None
+            )
+        stored = {key: self.get_json(key) for key in dict.fromkeys(keys) if key is not None}
+        lookup_time = time.perf_counter() - start
+
+        # one snippet per distinct key runs; snippets that do not parse run as they are
+        representatives: Dict[str, str] = {}
+        pending = []
+        for code, key in zip(code_specs, keys):
+            if key is None:
+                pending.append(code)
+            elif stored.get(key) is None and key not in representatives:
+                representatives[key] = code
+                pending.append(code)
+        executed: Dict[str, Dict] = {}
+        if pending:
+            for result in execute_code(pending, data, library=library, **options):
+                executed.setdefault(result["code"], result)
+
+        results, saved = [], set()
+        for code, key in zip(code_specs, keys):
+            if key is not None and stored.get(key) is not None:
+                results.append({**_load(dict(stored[key])), "code": code, "timings": {"cache": lookup_time}})
+                continue
+            result = executed.get(representatives.get(key, code))
+            if result is None:
+                # failed, and errors were not requested
+                continue
+            if key is not None and result["status"] and key not in saved:
+                self.set_json(key, _dump(result))
+                saved.add(key)
+            results.append(result if result["code"] == code else {**result, "code": code})
+        logger.debug(f"Render cache served {len(code_specs) - len(pending)} of {len(code_specs)} snippets")
+        return results
@@ -0,0 +1,250 @@
+import importlib.util
+import io
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("png", "svg", "webp")
+DEFAULT_DPI = 100
+COMPOUND_VEGALITE_KEYS = ("concat", "hconcat", "vconcat", "facet", "repeat")
+
+NON_INTERACTIVE_BACKENDS = ("agg", "cairo", "pdf", "pgf", "ps", "svg", "template")
+# pyplot keeps its figures and the current figure in process-wide state, see pyplot_scope
+_pyplot_lock = threading.RLock()
+
+
+def as_matplotlib_figure(chart: Any):
+    """
+    Resolve what a matplotlib/seaborn snippet returned (pyplot, a Figure, Axes or a seaborn grid) to a Figure.
+    """
+    from matplotlib.figure import Figure
+
+    if isinstance(chart, Figure):
+        return chart
+    if hasattr(chart, "gcf"):
+        return chart.gcf()
+    return chart.figure
+
+
+def pin_agg_backend() -> None:
+    """
+    Make pyplot use the non-interactive Agg backend, which needs no display and whose figures can be
+    rendered from any thread. pyplot starts on Agg if it is not loaded yet; a GUI backend the process
+    already chose is switched to Agg, while file and notebook backends, which draw with Agg or
+    without a window, are kept.
+    """
+    import matplotlib
+
+    if "matplotlib.pyplot" not in sys.modules:
+        matplotlib.use("Agg")
+        return
+    import matplotlib.pyplot as pyplot
+
+    backend = pyplot.get_backend().lower()
+    if backend not in NON_INTERACTIVE_BACKENDS and not backend.startswith("module://matplotlib_inline"):
+        logger.warning(f"Switching matplotlib from the {backend} backend to Agg to render charts")
+        pyplot.switch_backend("Agg")
+
+
+@contextmanager
+def pyplot_scope():
+    """
+    Run matplotlib or seaborn code with pyplot to itself, yielding the pyplot module. Figures that
+    were open before are set aside, so the code starts without a current figure, and every figure
+    opened inside the block is closed when it exits, whether the code succeeded or raised. Closed
+    figures can still be rendered; closing only detaches them from pyplot.
+
+    pyplot's current figure is global, so scopes in different threads run one at a time. The snippet
+    itself creates its figures, so CodeExecutor holds the scope for the whole exec of matplotlib and
+    seaborn snippets, and only for those; render the figures after leaving the scope, where threads
+    do not wait on each other. Use an ExecutionPool to execute matplotlib snippets in parallel.
+    """
+    pin_agg_backend()
+    import matplotlib.pyplot as pyplot
+    from matplotlib._pylab_helpers import Gcf
+
+    with _pyplot_lock:
+        outside = dict(Gcf.figs)
+        Gcf.figs.clear()
+        try:
+            yield pyplot
+        finally:
+            Gcf.destroy_all()
+            Gcf.figs.update(outside)
+
+
+def png_to_webp(png: bytes) -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.open(io.BytesIO(png)).save(buf, format="webp", lossless=True)
+    return buf.getvalue()
+
+
+class RenderService:
+    """
+    Rasterizes charts of every supported library to PNG, SVG or WebP bytes.
+
+    Renderers are started once and kept alive: plotly figures go through a single persistent
+    kaleido renderer and Vega-Lite specs through vl-convert's in-process engine. render_batch
+    renders a list of figures in one pass, so a report pays each renderer's startup cost once
+    instead of once per chart.
+
+    `size` is the (width, height) of the chart in pixels before `scale` is applied, e.g. (320, 240)
+    for thumbnails; by default each library keeps the size the snippet chose. `dpi` applies to
+    matplotlib, seaborn and ggplot figures.
+    """
+
+    def __init__(
+        self,
+        format: str = "png",
+        scale: float = 1.0,
+        dpi: int = DEFAULT_DPI,
+        tracer: Optional[Tracer] = None,
+        size: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        if format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported format {format}. Choose from {', '.join(SUPPORTED_FORMATS)}.")
+        self.format = format
+        self.scale = scale
+        self.dpi = dpi
+        self.size = size
+        self.tracer = tracer or Tracer()
+        self._plotly_scope = None
+        self._plotly_server = False
+        self._plotly_lock = threading.Lock()
+
+    def can_render(self, library: str) -> bool:
+        if library in ("altair", "vegalite"):
+            return importlib.util.find_spec("vl_convert") is not None
+        return True
+
+    def render(
+        self,
+        library: str,
+        figure: Any,
+        format: Optional[str] = None,
+        scale: Optional[float] = None,
+        dpi: Optional[int] = None,
+        size: Optional[Tuple[int, int]] = None,
+    ) -> bytes:
+        format = format or self.format
+        scale = self.scale if scale is None else scale
+        dpi = dpi or self.dpi
+        size = size or self.size
+        if format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported format {format}. Choose from {', '.join(SUPPORTED_FORMATS)}.")
+        if library in ("matplotlib", "seaborn"):
+            return self._render_matplotlib(figure, format, scale, dpi, size)
+        elif library == "ggplot":
+            return self._render_ggplot(figure, format, scale, dpi, size)
+        elif library == "plotly":
+            return self._render_plotly(figure, format, scale, size)
+        elif library in ("altair", "vegalite"):
+            return self._render_vegalite(figure, format, scale, size)
+        raise ValueError(f"Unsupported library {library}")
+
+    def render_batch(
+        self,
+        items: Sequence[Tuple[str, Any]],
+        format: Optional[str] = None,
+        scale: Optional[float] = None,
+        dpi: Optional[int] = None,
+        size: Optional[Tuple[int, int]] = None,
+    ) -> List[Union[bytes, Exception]]:
+        """
+        Render (library, figure) pairs in order. A figure that fails to render yields its exception
+        in place of bytes, so one bad chart does not fail the batch.
+        """
+        rendered = []
+        for library, figure in items:
+            with self.tracer.span("renderer.render", library=library, format=format or self.format) as span:
+                try:
+                    rendered.append(self.render(library, figure, format, scale, dpi, size))
+                    span.set_attribute("bytes", len(rendered[-1]))
+                except Exception as exception_error:
+                    span.status, span.error = "error", str(exception_error)
+                    rendered.append(exception_error)
+        return rendered
+
+    def _render_matplotlib(self, figure, format: str, scale: float, dpi: int, size: Optional[Tuple[int, int]]) -> bytes:
+        if size is not None:
+            figure.set_size_inches(size[0] / dpi, size[1] / dpi)
+        buf = io.BytesIO()
+        figure.savefig(buf, format=format, dpi=dpi * scale, pad_inches=0.2)
+        return buf.getvalue()
+
+    def _render_ggplot(self, chart, format: str, scale: float, dpi: int, size: Optional[Tuple[int, int]]) -> bytes:
+        dimensions = {"width": size[0] / dpi, "height": size[1] / dpi, "units": "in"} if size is not None else {}
+        buf = io.BytesIO()
+        chart.save(buf, format=format, dpi=int(dpi * scale), verbose=False, **dimensions)
+        return buf.getvalue()
+
+    def _render_plotly(self, figure, format: str, scale: float, size: Optional[Tuple[int, int]]) -> bytes:
+        dimensions = {"width": size[0], "height": size[1]} if size is not None else {}
+        with self._plotly_lock:
+            self._start_plotly()
+            if self._plotly_scope is not None:
+                return self._plotly_scope.transform(figure.to_plotly_json(), format=format, scale=scale, **dimensions)
+            import plotly.io as pio
+
+            return pio.to_image(figure, format=format, scale=scale, **dimensions)
+
+    def _start_plotly(self) -> None:
+        if self._plotly_scope is not None or self._plotly_server:
+            return
+        try:
+            # kaleido < 1 keeps one renderer subprocess per scope
+            from kaleido.scopes.plotly import PlotlyScope
+
+            self._plotly_scope = PlotlyScope()
+            return
+        except ImportError:
+            pass
+        import kaleido
+
+        if hasattr(kaleido, "start_sync_server"):
+            # kaleido >= 1 keeps one browser alive for every pio.to_image call
+            kaleido.start_sync_server(silence_warnings=True)
+            self._plotly_server = True
+
+    def _render_vegalite(
+        self, spec: Union[Dict, Any], format: str, scale: float, size: Optional[Tuple[int, int]]
+    ) -> bytes:
+        import vl_convert as vlc
+
+        if not isinstance(spec, dict):
+            spec = spec.to_dict()
+        if size is not None:
+            if any(key in spec for key in COMPOUND_VEGALITE_KEYS):
+                logger.debug("Compound Vega-Lite charts keep the size of their views")
+            else:
+                spec = {**spec, "width": size[0], "height": size[1], "autosize": {"type": "fit", "contains": "padding"}}
+        if format == "svg":
+            return vlc.vegalite_to_svg(spec).encode("utf-8")
+        png = vlc.vegalite_to_png(spec, scale=scale)
+        # vl-convert has no WebP output
+        return png_to_webp(png) if format == "webp" else png
+
+    def close(self) -> None:
+        with self._plotly_lock:
+            if self._plotly_scope is not None:
+                self._plotly_scope._shutdown_kaleido()
+                self._plotly_scope = None
+            if self._plotly_server:
+                import kaleido
+
+                kaleido.stop_sync_server(silence_warnings=True)
+                self._plotly_server = False
+
+    def __enter__(self) -> "RenderService":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
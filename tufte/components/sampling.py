@@ -0,0 +1,296 @@
+import math
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .sketches import ReservoirSample
+
+DEFAULT_SAMPLE_SIZE = 100000
+DEFAULT_MIN_PER_GROUP = 100
+DEFAULT_TIME_BUCKETS = 100
+# time buckets start one second wide and double until at most 2 * n_buckets remain
+INITIAL_BUCKET_WIDTH_NS = 10**9
+
+
+class Sampler:
+    """
+    A sampling strategy. sample() samples an in-memory frame; reservoir() returns a mergeable state
+    with update(chunk), merge(other) and to_frame() that samples data read in chunks, so files
+    never have to fit in memory. Both keep at most `size` rows, in their original order.
+    """
+
+    strategy = ""
+
+    def __init__(self, size: int = DEFAULT_SAMPLE_SIZE, seed=None) -> None:
+        self.size = size
+        self.seed = seed
+
+    def reservoir(self, seed=None):
+        return ReservoirSample(self.size, seed=self.seed if seed is None else seed)
+
+    def sample(self, df: pd.DataFrame) -> pd.DataFrame:
+        if len(df) <= self.size:
+            return df
+        # reservoirs identify rows by label, so they sample positions and the labels are restored after
+        positions = self.reservoir().update(df.reset_index(drop=True)).to_frame().index
+        return df.iloc[np.sort(positions.to_numpy())]
+
+    def _parameters(self) -> Dict:
+        return {"size": self.size, "seed": self.seed}
+
+    def __repr__(self) -> str:
+        parameters = ", ".join(f"{key}={value!r}" for key, value in self._parameters().items())
+        return f"{type(self).__name__}({parameters})"
+
+
+class UniformSampler(Sampler):
+    """
+    A simple random sample. When the number of rows is known up front (in-memory frames, Parquet and
+    Arrow files) the sampled positions are drawn directly; text files are sampled in one pass.
+    """
+
+    strategy = "uniform"
+
+    def positions(self, n_rows: int) -> np.ndarray:
+        return np.sort(np.random.default_rng(self.seed).choice(n_rows, self.size, replace=False))
+
+    def sample(self, df: pd.DataFrame) -> pd.DataFrame:
+        if len(df) <= self.size:
+            return df
+        return df.iloc[self.positions(len(df))]
+
+
+class ReservoirSampler(Sampler):
+    """
+    A uniform sample drawn in a single pass without knowing the number of rows, with memory bounded
+    by `size` rows; suited to streams and files whose length is unknown.
+    """
+
+    strategy = "reservoir"
+
+
+class StratifiedSampler(Sampler):
+    """
+    Keeps at least `min_per_group` rows of every value of `column` (all rows of smaller groups), so
+    rare categories survive sampling, and fills the rest of the sample uniformly. Memory grows with
+    the number of distinct values, so stratify by a low-cardinality column.
+    """
+
+    strategy = "stratified"
+
+    def __init__(
+        self, column: str, size: int = DEFAULT_SAMPLE_SIZE, min_per_group: int = DEFAULT_MIN_PER_GROUP, seed=None
+    ) -> None:
+        super().__init__(size, seed)
+        self.column = column
+        self.min_per_group = min_per_group
+
+    def reservoir(self, seed=None) -> "GroupedReservoir":
+        return GroupedReservoir(self.size, self.min_per_group, self.column, seed=self.seed if seed is None else seed)
+
+    def _parameters(self) -> Dict:
+        return {"column": self.column, **super()._parameters(), "min_per_group": self.min_per_group}
+
+
+class TimeBucketSampler(Sampler):
+    """
+    Splits the range of the time column `column` into between `n_buckets` and 2 * `n_buckets`
+    equal-width buckets and takes the same number of rows from each, so a time series keeps rows
+    from every period however unevenly its rows are spread. Rows without a valid time only fill
+    up the sample when the buckets hold too few rows.
+    """
+
+    strategy = "time"
+
+    def __init__(
+        self, column: str, size: int = DEFAULT_SAMPLE_SIZE, n_buckets: int = DEFAULT_TIME_BUCKETS, seed=None
+    ) -> None:
+        super().__init__(size, seed)
+        self.column = column
+        self.n_buckets = n_buckets
+
+    def reservoir(self, seed=None) -> "TimeBucketReservoir":
+        return TimeBucketReservoir(self.size, self.n_buckets, self.column, seed=self.seed if seed is None else seed)
+
+    def _parameters(self) -> Dict:
+        return {"column": self.column, **super()._parameters(), "n_buckets": self.n_buckets}
+
+
+SAMPLING_STRATEGIES = {
+    sampler.strategy: sampler for sampler in (UniformSampler, ReservoirSampler, StratifiedSampler, TimeBucketSampler)
+}
+
+
+def get_sampler(sampling: Union[None, int, str, Dict, Sampler] = None, size: int = DEFAULT_SAMPLE_SIZE, seed=None) -> Sampler:
+    """
+    Build a sampler from a sampling option: a Sampler, a strategy name ("uniform", "reservoir",
+    "stratified", "time"), a dict such as {"strategy": "stratified", "column": "region"}, a number of
+    rows for a uniform sample, or None for a uniform sample of `size` rows. `size` and `seed` are
+    defaults the dict may override.
+    """
+    if isinstance(sampling, Sampler):
+        return sampling
+    if sampling is None:
+        return UniformSampler(size, seed)
+    if isinstance(sampling, int):
+        return UniformSampler(sampling, seed)
+    options = {"strategy": sampling} if isinstance(sampling, str) else dict(sampling)
+    strategy = options.pop("strategy", "uniform")
+    if strategy not in SAMPLING_STRATEGIES:
+        raise ValueError(f"Unsupported sampling strategy {strategy}. Choose from {', '.join(SAMPLING_STRATEGIES)}.")
+    return SAMPLING_STRATEGIES[strategy](**{"size": size, "seed": seed, **options})
+
+
+class GroupedReservoir:
+    """
+    Mergeable sample that keeps up to `per_group` rows of every group besides a uniform reservoir of
+    `size` rows. Like ReservoirSample, every row gets a random key, and each group keeps its rows
+    with the smallest keys. to_frame() shares `size` rows as evenly as possible between the groups
+    and fills what the groups leave over from the uniform reservoir. Rows are identified by their
+    labels.
+    """
+
+    def __init__(self, size: int, per_group: int, column: str, seed=None) -> None:
+        self.size = size
+        self.per_group = per_group
+        self.column = column
+        self.rng = np.random.default_rng(seed)
+        self.uniform = ReservoirSample(size, seed=self.rng.integers(2**63))
+        # random key and group of every kept row
+        self.keys = np.empty(0)
+        self.groups: Optional[np.ndarray] = None
+        self.rows: Optional[pd.DataFrame] = None
+
+    def _group_rows(self, chunk: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the group of every row and a mask of the rows that belong to a group; missing values
+        form a group of their own.
+        """
+        groups = chunk[self.column].to_numpy(dtype=object)
+        groups[pd.isna(groups)] = None
+        return groups, np.ones(len(chunk), dtype=bool)
+
+    def update(self, chunk: pd.DataFrame) -> "GroupedReservoir":
+        self.uniform.update(chunk)
+        groups, mask = self._group_rows(chunk)
+        return self._combine(self.rng.random(int(mask.sum())), groups[mask], chunk[mask])
+
+    def merge(self, other: "GroupedReservoir") -> "GroupedReservoir":
+        self.uniform.merge(other.uniform)
+        if other.rows is None:
+            return self
+        return self._combine(other.keys, other.groups, other.rows)
+
+    def _combine(self, keys: np.ndarray, groups: np.ndarray, rows: pd.DataFrame) -> "GroupedReservoir":
+        if self.rows is not None:
+            keys = np.concatenate([self.keys, keys])
+            groups = np.concatenate([self.groups, groups])
+            rows = pd.concat([self.rows, rows])
+        self.keys, self.groups, self.rows = keys, groups, rows
+        return self._select(self.per_group)
+
+    def _ranks(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the group code of every kept row and its rank by key within its group.
+        """
+        codes = pd.factorize(self.groups, use_na_sentinel=False)[0]
+        order = np.lexsort((self.keys, codes))
+        sorted_codes = codes[order]
+        starts = np.searchsorted(sorted_codes, sorted_codes, side="left")
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order)) - starts
+        return codes, ranks
+
+    def _select(self, quota: int) -> "GroupedReservoir":
+        if self.rows is not None and len(self.rows):
+            keep = self._ranks()[1] < quota
+            if not keep.all():
+                self.keys, self.groups, self.rows = self.keys[keep], self.groups[keep], self.rows[keep]
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        if self.uniform.rows is None:
+            return pd.DataFrame()
+        rows = self.uniform.rows.iloc[:0]
+        if self.rows is not None and len(self.rows):
+            codes, ranks = self._ranks()
+            quota = _water_level(np.bincount(codes).tolist(), self.size)
+            rows = self.rows[ranks < quota]
+        missing = self.size - len(rows)
+        if missing > 0:
+            # top up with the uniform reservoir's rows in key order
+            order = np.argsort(self.uniform.keys)
+            candidates = self.uniform.rows.iloc[order]
+            candidates = candidates[~candidates.index.isin(rows.index)]
+            rows = pd.concat([rows, candidates.iloc[:missing]])
+        return rows.sort_index()
+
+
+class TimeBucketReservoir(GroupedReservoir):
+    """
+    GroupedReservoir whose groups are equal-width buckets of a time column, numbered by time // width.
+    Buckets start narrow and double in width, merging pairwise, whenever the times seen so far span
+    more than 2 * n_buckets of them. Rows without a valid time are only in the uniform reservoir.
+    """
+
+    def __init__(self, size: int, n_buckets: int, column: str, seed=None) -> None:
+        super().__init__(size, math.ceil(size / n_buckets), column, seed)
+        self.n_buckets = n_buckets
+        self.width = INITIAL_BUCKET_WIDTH_NS
+
+    def _group_rows(self, chunk: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        times = pd.to_datetime(chunk[self.column], errors="coerce", utc=True)
+        mask = times.notna().to_numpy()
+        nanoseconds = times[mask].astype("int64").to_numpy()
+        if len(nanoseconds):
+            # widen the buckets first, so the times seen so far span at most 2 * n_buckets of them
+            buckets = [nanoseconds.min() // self.width, nanoseconds.max() // self.width]
+            if self.groups is not None and len(self.groups):
+                buckets += [self.groups.min(), self.groups.max()]
+            self._limit_buckets(min(buckets), max(buckets))
+        groups = np.zeros(len(chunk), dtype=np.int64)
+        groups[mask] = nanoseconds // self.width
+        return groups, mask
+
+    def _coarsen(self, width: int) -> None:
+        factor = width // self.width
+        self.width = width
+        if self.groups is not None:
+            self.groups = self.groups // factor
+            self._select(self.per_group)
+
+    def _limit_buckets(self, low: int, high: int) -> None:
+        factor = 1
+        while high // factor - low // factor + 1 > 2 * self.n_buckets:
+            factor *= 2
+        if factor > 1:
+            self._coarsen(self.width * factor)
+
+    def merge(self, other: "TimeBucketReservoir") -> "TimeBucketReservoir":
+        width = max(self.width, other.width)
+        for reservoir in (self, other):
+            if reservoir.width < width:
+                reservoir._coarsen(width)
+        super().merge(other)
+        if self.groups is not None and len(self.groups):
+            self._limit_buckets(self.groups.min(), self.groups.max())
+        return self
+
+
+def _water_level(counts, total: int) -> int:
+    """
+    Return the largest per-group quota q with sum(min(count, q)) <= total.
+    """
+    if not counts:
+        return 0
+    if sum(counts) <= total:
+        return max(counts)
+    low, high = 0, max(counts)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if sum(min(count, middle) for count in counts) <= total:
+            low = middle
+        else:
+            high = middle - 1
+    return low
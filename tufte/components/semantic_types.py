@@ -0,0 +1,200 @@
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .profiler import is_number
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.8
+DEFAULT_SEMANTIC_SAMPLE_SIZE = 1000
+# share of sampled values a pattern must match before it is considered
+MIN_MATCH_RATIO = 0.9
+
+# words in a column name that suggest a semantic type, see name_words
+NAME_HINTS = {
+    "latitude": {"lat", "latitude"},
+    "longitude": {"lon", "lng", "long", "longitude"},
+    "zipcode": {"zip", "zipcode", "postcode", "postal"},
+    "email": {"email", "mail"},
+    "url": {"url", "link", "website", "homepage", "href"},
+    "phone": {"phone", "tel", "telephone", "mobile", "fax"},
+    "ip_address": {"ip"},
+    "year": {"year", "yr"},
+    "date": {"date", "time", "timestamp", "datetime", "day", "created", "updated"},
+    "gender": {"gender", "sex"},
+    "city": {"city", "town"},
+    "country": {"country", "nation"},
+    "state": {"state", "province"},
+    "region": {"region"},
+    "address": {"address", "street"},
+    "company": {"company", "employer", "organization", "organisation", "firm", "brand", "manufacturer"},
+    "supplier": {"supplier", "vendor"},
+    "id": {"id", "uuid", "guid"},
+    "currency": {"price", "cost", "amount", "revenue", "salary", "sales", "income", "fee", "usd", "eur"},
+    "percentage": {"pct", "percent", "percentage", "rate", "ratio", "share"},
+    "age": {"age"},
+    "count": {"count", "num", "quantity", "qty"},
+}
+# (semantic type, pattern, distinctive); values of a distinctive pattern are rarely anything else
+TEXT_PATTERNS = (
+    ("email", r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}", True),
+    ("url", r"(?:https?://|www\.)\S+", True),
+    ("id", r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}", True),
+    ("ip_address", r"(?:\d{1,3}\.){3}\d{1,3}", True),
+    ("currency", r"[$€£¥]\s?-?[\d,]+(?:\.\d+)?|-?[\d,]+(?:\.\d+)?\s?[$€£¥]", True),
+    ("percentage", r"-?\d+(?:\.\d+)?\s?%", True),
+    ("zipcode", r"\d{5}(?:-\d{4})?|[A-Z]\d[A-Z] ?\d[A-Z]\d", False),
+    ("phone", r"\+?\(?\d{1,4}\)?(?:[\s.-]?\(?\d{2,4}\)?){2,4}", False),
+)
+GENDER_VALUES = {"m", "f", "male", "female", "man", "woman", "men", "women", "other", "non-binary", "nonbinary"}
+BOOLEAN_VALUES = {"yes", "no", "true", "false", "y", "n", "t", "f"}
+US_STATE_CODES = {
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "DC", "FL", "GA", "HI", "ID", "IL", "IN", "IA", "KS",
+    "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC",
+    "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY",
+}
+
+
+def name_words(name: str) -> List[str]:
+    # split camelCase and snake_case names
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(name))
+    return [word for word in re.split(r"[^0-9a-zA-Z]+", name.lower()) if word]
+
+
+class SemanticTypeInference:
+    """
+    Labels columns with semantic types (date, latitude, zipcode, email, url, ...) from their values
+    and names, without an LLM. Pattern and range detectors run vectorized over a random sample of
+    at most `sample_size` non-null values per column, and every label comes with a confidence
+    between 0 and 1: patterns that identify a type on their own (emails, URLs) score by the share
+    of values they match, while ambiguous evidence (a five-digit code, numbers between -90 and 90)
+    only scores high when the column name agrees.
+
+    Summarizer keeps the labels of at least `threshold` confidence and asks the LLM only about the
+    other columns.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_CONFIDENCE_THRESHOLD,
+        sample_size: int = DEFAULT_SEMANTIC_SAMPLE_SIZE,
+        random_state: int = 42,
+    ) -> None:
+        self.threshold = threshold
+        self.sample_size = sample_size
+        self.random_state = random_state
+
+    def options(self) -> Dict:
+        return {"threshold": self.threshold, "sample_size": self.sample_size, "random_state": self.random_state}
+
+    def infer(self, series: pd.Series, dtype: Optional[str] = None) -> Tuple[Optional[str], float]:
+        """
+        Return the most likely semantic type of a column and its confidence; (None, 0.0) for a
+        column without values. `dtype` is the column's dtype in the summary (number, date, boolean,
+        category or string), which spares parsing text dates again.
+        """
+        hints = {
+            semantic_type
+            for semantic_type, words in NAME_HINTS.items()
+            if words & set(name_words(series.name if series.name is not None else ""))
+        }
+        if dtype == "date" or pd.api.types.is_datetime64_any_dtype(series):
+            return "date", 1.0
+        if dtype == "boolean" or pd.api.types.is_bool_dtype(series):
+            return "boolean", 1.0
+        values = series.dropna()
+        if values.empty:
+            return None, 0.0
+        if len(values) > self.sample_size:
+            values = values.sample(self.sample_size, random_state=self.random_state)
+        if is_number(values):
+            return self._infer_number(values.to_numpy(dtype=np.float64), hints)
+        return self._infer_text(values.astype(str).str.strip(), dtype, hints)
+
+    def _infer_number(self, values: np.ndarray, hints: set) -> Tuple[str, float]:
+        finite = values[np.isfinite(values)]
+        if finite.size == 0:
+            return "number", 0.5
+        low, high = finite.min(), finite.max()
+        integers = bool(np.all(finite == np.round(finite)))
+        candidates = []
+        if "latitude" in hints and -90 <= low and high <= 90:
+            candidates.append(("latitude", 0.95))
+        if "longitude" in hints and -180 <= low and high <= 180:
+            candidates.append(("longitude", 0.95))
+        if integers and 1800 <= low and high <= 2100:
+            candidates.append(("year", 0.95 if hints & {"year", "date"} else 0.6))
+        if integers and "zipcode" in hints and 0 <= low and high <= 99999:
+            candidates.append(("zipcode", 0.9))
+        if integers and (
+            "id" in hints or (np.unique(finite).size == finite.size and finite.size >= 100 and low >= 0)
+        ):
+            candidates.append(("id", 0.95 if "id" in hints else 0.5))
+        if "age" in hints and 0 <= low and high <= 130:
+            candidates.append(("age", 0.9))
+        if "percentage" in hints and 0 <= low and high <= 100:
+            candidates.append(("percentage", 0.9))
+        if "currency" in hints:
+            candidates.append(("currency", 0.85))
+        if "count" in hints and integers and low >= 0:
+            candidates.append(("count", 0.85))
+        # a measure with no other reading is what the LLM would call it too; with one, the LLM decides
+        candidates.append(("number", 0.6 if candidates or hints else 0.85))
+        return max(candidates, key=lambda candidate: candidate[1])
+
+    def _infer_text(self, values: pd.Series, dtype: Optional[str], hints: set) -> Tuple[str, float]:
+        candidates = []
+        for semantic_type, pattern, distinctive in TEXT_PATTERNS:
+            ratio = float(values.str.fullmatch(pattern).mean())
+            if ratio < MIN_MATCH_RATIO:
+                continue
+            confidence = ratio if distinctive else 0.6 * ratio + (0.4 if semantic_type in hints else 0.0)
+            candidates.append((semantic_type, confidence))
+
+        distinct = values.str.lower().unique()
+        if len(distinct) <= 12:
+            lowered = set(distinct)
+            if lowered <= GENDER_VALUES:
+                # single letters alone could be anything; spelled out or named gender they are not
+                spelled = any(len(value) > 1 for value in lowered)
+                candidates.append(("gender", 0.95 if spelled or "gender" in hints else 0.5))
+            elif lowered <= BOOLEAN_VALUES:
+                candidates.append(("boolean", 0.9))
+        if len(distinct) >= 3 and float(values.isin(US_STATE_CODES).mean()) >= MIN_MATCH_RATIO:
+            candidates.append(("state", 0.95 if "state" in hints else 0.6))
+
+        geo_or_entity = hints & {"city", "country", "state", "region", "address", "company", "supplier", "id"}
+        for semantic_type in geo_or_entity:
+            candidates.append((semantic_type, 0.85))
+        for semantic_type in hints & {"email", "url", "phone", "zipcode", "date"}:
+            # the name says so but the values did not match; the LLM decides
+            candidates.append((semantic_type, 0.5))
+        if dtype == "category":
+            candidates.append(("category", 0.6))
+        elif float(values.str.len().mean()) > 30 and float(values.str.contains(" ", regex=False).mean()) > 0.5:
+            candidates.append(("text", 0.6))
+        else:
+            candidates.append(("string", 0.3))
+        return max(candidates, key=lambda candidate: candidate[1])
+
+    def annotate(self, data: pd.DataFrame, data_properties: Dict[str, Dict]) -> Dict[str, Tuple[Optional[str], float]]:
+        """
+        Set "semantic_type" in the properties of every column labelled with at least `threshold`
+        confidence, and return the label and confidence of every column. Columns of
+        `data_properties` missing from `data` are skipped.
+        """
+        inferred = {}
+        for column, properties in data_properties.items():
+            if column not in data.columns:
+                continue
+            semantic_type, confidence = self.infer(data[column], properties.get("dtype"))
+            inferred[column] = (semantic_type, confidence)
+            if semantic_type is not None and confidence >= self.threshold:
+                properties["semantic_type"] = semantic_type
+        confident = sum(1 for _, confidence in inferred.values() if confidence >= self.threshold)
+        logger.info(f"Inferred the semantic types of {confident} of {len(data_properties)} columns locally")
+        return inferred
@@ -0,0 +1,156 @@
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_HLL_PRECISION = 14
+
+
+def _hash(values: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """
+    Hash the values of a series to 64-bit unsigned integers.
+    Equal values hash equally regardless of the series index, and numbers regardless of their
+    dtype: chunks of one column are read as int64, or as float64 when they hold a blank cell, so
+    integral floats hash like the integer.
+    """
+    if pd.api.types.is_bool_dtype(values) or not (
+        pd.api.types.is_integer_dtype(values) or pd.api.types.is_float_dtype(values)
+    ):
+        return _hash(values)
+    if pd.api.types.is_integer_dtype(values) and not values.hasnans:
+        return _hash(values.astype(np.int64))
+    array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    hashes = _hash(pd.Series(array))
+    integral = np.isfinite(array) & (array == np.floor(array)) & (np.abs(array) < 2.0**63)
+    if integral.any():
+        hashes[integral] = _hash(pd.Series(array[integral].astype(np.int64)))
+    return hashes
+
+
+class HyperLogLog:
+    """
+    Approximate distinct counter. Standard error is roughly 1.04 / sqrt(2 ** precision),
+    about 0.8% at the default precision, using 2 ** precision bytes of state.
+    """
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION) -> None:
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values: pd.Series) -> "HyperLogLog":
+        if len(values) == 0:
+            return self
+        hashes = hash_values(values)
+        value_bits = 64 - self.precision
+        index = (hashes >> np.uint64(value_bits)).astype(np.intp)
+        remainder = hashes & np.uint64((1 << value_bits) - 1)
+        # rank = position of the lowest set bit; the isolated bit is an exact power of two
+        lowest_bit = remainder & (~remainder + np.uint64(1))
+        with np.errstate(divide="ignore"):
+            rank = np.where(remainder == 0, value_bits + 1, np.log2(lowest_bit.astype(np.float64)) + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+class RunningStats:
+    """
+    Mergeable count, mean, variance, min and max of a numeric column.
+    Chunks are combined with the parallel form of Welford's algorithm.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values: np.ndarray) -> "RunningStats":
+        if len(values) == 0:
+            return self
+        as_float = values.astype(np.float64)
+        mean = float(as_float.mean())
+        m2 = float(np.square(as_float - mean).sum())
+        return self._combine(len(values), mean, m2, values.min(), values.max())
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        if other.count == 0:
+            return self
+        return self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, count: int, mean: float, m2: float, low, high) -> "RunningStats":
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        return self
+
+    @property
+    def std(self) -> float:
+        # sample standard deviation, matching pandas' default ddof=1
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float("nan")
+
+
+class ReservoirSample:
+    """
+    Mergeable uniform sample of at most `size` rows.
+    Every row gets a random key and the rows with the smallest keys are kept, so merging two
+    reservoirs gives the same distribution as sampling their concatenated input.
+    """
+
+    def __init__(self, size: int, seed=None) -> None:
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.rows: Optional[pd.DataFrame] = None
+
+    def update(self, rows: pd.DataFrame) -> "ReservoirSample":
+        return self._combine(self.rng.random(len(rows)), rows)
+
+    def merge(self, other: "ReservoirSample") -> "ReservoirSample":
+        if other.rows is None:
+            return self
+        return self._combine(other.keys, other.rows)
+
+    def _combine(self, keys: np.ndarray, rows: pd.DataFrame) -> "ReservoirSample":
+        if self.rows is not None:
+            if len(self.keys) >= self.size:
+                keep = keys < self.keys.max()
+                keys, rows = keys[keep], rows[keep]
+            keys = np.concatenate([self.keys, keys])
+            rows = pd.concat([self.rows, rows])
+        if len(keys) > self.size:
+            selected = np.sort(np.argpartition(keys, self.size - 1)[: self.size])
+            keys, rows = keys[selected], rows.iloc[selected]
+        self.keys, self.rows = keys, rows
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        if self.rows is None:
+            return pd.DataFrame()
+        return self.rows.sort_index()
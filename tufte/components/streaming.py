@@ -0,0 +1,242 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Optional, Union
+
+import pandas as pd
+
+from .profiler import (
+    CATEGORY_UNIQUE_RATIO,
+    DEFAULT_DATE_PROBE_SIZE,
+    convert_np_dtype,
+    is_date,
+    is_number,
+    is_text,
+    parse_dates,
+)
+from .sampling import Sampler, get_sampler
+from .sketches import DEFAULT_HLL_PRECISION, HyperLogLog, RunningStats
+from .utils import DEFAULT_CHUNK_SIZE, MAX_ROWS, iter_dataframe_chunks
+
+logger = logging.getLogger(__name__)
+
+
+class ColumnStatistics:
+    """
+    Mergeable statistics of one column, accumulated chunk by chunk.
+    """
+
+    def __init__(self, sketch_precision: int = DEFAULT_HLL_PRECISION) -> None:
+        self.count = 0
+        self.null_count = 0
+        self.kinds = set()
+        self.is_float = False
+        self.moments = RunningStats()
+        self.distinct = HyperLogLog(sketch_precision)
+        self.date_candidate = True
+        self.date_min: Optional[pd.Timestamp] = None
+        self.date_max: Optional[pd.Timestamp] = None
+
+    def update(self, series: pd.Series, date_probe_size: int = DEFAULT_DATE_PROBE_SIZE) -> None:
+        non_null = series.dropna()
+        self.count += len(series)
+        self.null_count += len(series) - len(non_null)
+        if non_null.empty:
+            # an all-null chunk says nothing about the column type
+            return
+
+        self.distinct.update(non_null)
+        if is_number(series):
+            self.kinds.add("number")
+            self.is_float = self.is_float or pd.api.types.is_float_dtype(series)
+            self.moments.update(non_null.to_numpy())
+        elif pd.api.types.is_bool_dtype(series):
+            self.kinds.add("boolean")
+        elif is_date(series):
+            self.kinds.add("date")
+            self._update_dates(non_null)
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            self.kinds.add("category")
+        elif is_text(series):
+            self.kinds.add("text")
+            if self.date_candidate:
+                parsed = parse_dates(non_null, date_probe_size)
+                if parsed is None:
+                    self.date_candidate = False
+                else:
+                    self._update_dates(parsed)
+        else:
+            self.kinds.add(str(series.dtype))
+
+    def _update_dates(self, dates: pd.Series) -> None:
+        low, high = dates.min(), dates.max()
+        self.date_min = low if self.date_min is None else min(self.date_min, low)
+        self.date_max = high if self.date_max is None else max(self.date_max, high)
+
+    def merge(self, other: "ColumnStatistics") -> "ColumnStatistics":
+        self.count += other.count
+        self.null_count += other.null_count
+        self.kinds |= other.kinds
+        self.is_float = self.is_float or other.is_float
+        self.moments.merge(other.moments)
+        self.distinct.merge(other.distinct)
+        self.date_candidate = self.date_candidate and other.date_candidate
+        for date in (other.date_min, other.date_max):
+            if date is not None:
+                self.date_min = date if self.date_min is None else min(self.date_min, date)
+                self.date_max = date if self.date_max is None else max(self.date_max, date)
+        return self
+
+    def finalize(self, samples: pd.Series, n_samples: int = 3, random_state: int = 42) -> Dict:
+        # a column that was null in every chunk would be read as float64
+        kinds = self.kinds or {"number"}
+        dated = kinds == {"date"} or (kinds == {"text"} and self.date_candidate)
+        num_unique = self.distinct.count()
+
+        non_null_samples = samples.dropna()
+        if dated:
+            non_null_samples = pd.to_datetime(non_null_samples, errors="coerce").dropna()
+        unique_values = non_null_samples.unique()
+        sampled = (
+            pd.Series(unique_values)
+            .sample(min(n_samples, len(unique_values)), random_state=random_state)
+            .tolist()
+        )
+
+        properties = {"dtype": next(iter(kinds)) if len(kinds) == 1 else "object"}
+        if kinds == {"number"}:
+            dtype = "float64" if self.is_float or self.null_count else "int64"
+            properties.update(
+                {
+                    "dtype": "number",
+                    "mean": round(self.moments.mean, 4) if self.moments.count else float("nan"),
+                    "std": round(self.moments.std, 4),
+                    "min": convert_np_dtype(self.moments.min, dtype) if self.moments.count else float("nan"),
+                    "max": convert_np_dtype(self.moments.max, dtype) if self.moments.count else float("nan"),
+                }
+            )
+        elif kinds == {"boolean"}:
+            properties["dtype"] = "boolean"
+        elif dated:
+            properties["dtype"] = "date"
+        elif kinds == {"category"}:
+            properties["dtype"] = "category"
+        elif "text" in kinds or len(kinds) > 1:
+            unique_ratio = num_unique / max(self.count, 1)
+            properties["dtype"] = "category" if unique_ratio < CATEGORY_UNIQUE_RATIO else "string"
+
+        properties["samples"] = sampled
+        if properties["dtype"] == "date":
+            properties["min"] = self.date_min.isoformat() if self.date_min is not None else None
+            properties["max"] = self.date_max.isoformat() if self.date_max is not None else None
+            properties["samples"] = [sample.isoformat() for sample in sampled]
+
+        properties["num_unique_values"] = num_unique
+        return properties
+
+
+class StreamingProfile:
+    """
+    Mergeable column statistics of a dataset that is read in chunks.
+
+    Partial profiles of disjoint chunks can be computed independently, e.g. in worker processes,
+    and combined with merge(). finalize() returns the same fields dict as ColumnProfiler.profile.
+    Memory is bounded by the sketches and a sample of at most `sample_size` rows, drawn with
+    `sampler` (uniform by default).
+    """
+
+    def __init__(
+        self,
+        sample_size: int = MAX_ROWS,
+        sketch_precision: int = DEFAULT_HLL_PRECISION,
+        date_probe_size: int = DEFAULT_DATE_PROBE_SIZE,
+        seed=None,
+        sampler: Optional[Sampler] = None,
+    ) -> None:
+        self.sketch_precision = sketch_precision
+        self.date_probe_size = date_probe_size
+        self.columns: Dict[str, ColumnStatistics] = {}
+        self.reservoir = (sampler or get_sampler(None, sample_size)).reservoir(seed)
+
+    @property
+    def n_rows(self) -> int:
+        return max((statistics.count for statistics in self.columns.values()), default=0)
+
+    def update(self, chunk: pd.DataFrame) -> "StreamingProfile":
+        for column, series in chunk.items():
+            if column not in self.columns:
+                self.columns[column] = ColumnStatistics(self.sketch_precision)
+            self.columns[column].update(series, self.date_probe_size)
+        self.reservoir.update(chunk)
+        return self
+
+    def merge(self, other: "StreamingProfile") -> "StreamingProfile":
+        for column, statistics in other.columns.items():
+            if column in self.columns:
+                self.columns[column].merge(statistics)
+            else:
+                self.columns[column] = statistics
+        self.reservoir.merge(other.reservoir)
+        return self
+
+    def sample(self) -> pd.DataFrame:
+        return self.reservoir.to_frame()
+
+    def finalize(self, n_samples: int = 3) -> Dict[str, Dict]:
+        rows = self.sample()
+        return {
+            column: statistics.finalize(rows.get(column, pd.Series(dtype=object)), n_samples)
+            for column, statistics in self.columns.items()
+        }
+
+
+def profile_chunk(
+    chunk: pd.DataFrame, sample_size: int, sketch_precision: int, seed, sampler: Optional[Sampler] = None
+) -> StreamingProfile:
+    return StreamingProfile(
+        sample_size=sample_size, sketch_precision=sketch_precision, seed=seed, sampler=sampler
+    ).update(chunk)
+
+
+def profile_file(
+    filepath: str,
+    chunksize: int = DEFAULT_CHUNK_SIZE,
+    n_jobs: int = 1,
+    sample_size: int = MAX_ROWS,
+    sketch_precision: int = DEFAULT_HLL_PRECISION,
+    encoding: str = 'utf-8',
+    seed: int = 42,
+    sampling: Union[None, int, str, Dict, Sampler] = None,
+    **read_options,
+) -> StreamingProfile:
+    """
+    Profile a file chunk by chunk, in any format iter_dataframe_chunks reads.
+    With n_jobs > 1 chunks are profiled in worker processes and their partial profiles merged;
+    at most 2 * n_jobs chunks are in flight at once so memory stays bounded.
+    `sampling` chooses how the sample kept for charting is drawn, see sampling.get_sampler.
+    read_options (columns, filters, dtype_backend) are passed on to iter_dataframe_chunks.
+    """
+    chunks = iter_dataframe_chunks(filepath, chunksize=chunksize, encoding=encoding, **read_options)
+    sampler = get_sampler(sampling, sample_size)
+    profile = StreamingProfile(
+        sample_size=sampler.size, sketch_precision=sketch_precision, seed=seed, sampler=sampler
+    )
+
+    if n_jobs <= 1:
+        for chunk in chunks:
+            profile.update(chunk)
+    else:
+        # seed every chunk by its index so the sampled rows do not depend on scheduling
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            pending = set()
+            for index, chunk in enumerate(chunks):
+                if len(pending) >= 2 * n_jobs:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        profile.merge(future.result())
+                pending.add(
+                    executor.submit(profile_chunk, chunk, sampler.size, sketch_precision, [seed, index], sampler)
+                )
+            for future in pending:
+                profile.merge(future.result())
+    logger.info(f"Profiled {profile.n_rows} rows of {filepath}")
+    return profile
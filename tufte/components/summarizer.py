@@ -1,10 +1,16 @@
+import asyncio
 import json
 import logging
 import pandas as pd
-import warnings
-from openai import OpenAI
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Tuple, Union
 
+from .llm_cache import LLMCache, acreate_completion, create_completion
+from .openai_clients import LazyOpenAIClients
+from .profiler import ColumnProfiler
+from .semantic_types import SemanticTypeInference
+from .streaming import StreamingProfile, profile_file
+from .summary_cache import SummaryCache, column_fingerprint, file_fingerprint
+from .tracing import Tracer
 from .utils import read_dataframe
 
 logger = logging.getLogger(__name__)
@@ -24,108 +30,310 @@ Respond in JSON format as follows:
     }}
 }}
 """.strip()
+# what the LLM sees of a field typed locally when it describes the dataset
+CONTEXT_PROPERTIES = ("dtype", "semantic_type", "samples")
+# files sampled for a summary cache always draw the same rows, see Summarizer and Orchestrator
+SUMMARY_CACHE_SEED = 42
+# used when columns were typed locally: the LLM describes the dataset and only the listed fields
+DESCRIBE_PROMPT = """
+You are an experienced data analyst. You have been tasked to summarize a dataset given statistics in a JSON format, where "fields" maps each field name or column to its statistics.
+
+Respond in JSON format as follows:
+{
+    "description": "A brief description of the dataset",
+    "fields": {
+        field_name: {
+            "description": "A brief description of the field",
+            "semantic_type": "single word semantic type given its values, e.g. date, company, city, number, category, supplier, location, gender, longitude, latitude, url, zipcode, email"
+        }
+    }
+}
+Include in "fields" only the fields listed in "fields_to_describe"; leave it empty if the list is empty.
+""".strip()
 
 
-class Summarizer:
-    def __init__(self, model: str = DEFAULT_OPENAI_MODEL) -> None:
+class Summarizer(LazyOpenAIClients):
+    def __init__(
+        self,
+        model: str = DEFAULT_OPENAI_MODEL,
+        cache: Optional[LLMCache] = None,
+        tracer: Optional[Tracer] = None,
+        summary_cache: Optional[SummaryCache] = None,
+        semantic_types: Union[bool, SemanticTypeInference] = False,
+    ) -> None:
         self.oai_model = model
-        self.oai_client = OpenAI()
-
-    def _get_column_properties(self, df: pd.DataFrame, n_samples: int = 3) -> List[Dict]:
-        properties_dict = {}
-
-        def add_date_properties(column):
-            try:
-                properties["min"] = df[column].min().isoformat()
-                properties["max"] = df[column].max().isoformat()
-            except TypeError:
-                cast_date_col = pd.to_datetime(df[column], errors="coerce")
-                properties["min"] = cast_date_col.min().isoformat()
-                properties["max"] = cast_date_col.max().isoformat()
-
-        def add_samples(column):
-            non_null_values = df[column][df[column].notnull()].unique()
-            n_samples_adjusted = min(n_samples, len(non_null_values))
-            return (
-                pd.Series(non_null_values)
-                .sample(n_samples_adjusted, random_state=42)
-                .tolist()
+        self.cache = cache
+        self.tracer = tracer or Tracer()
+        # with a summary cache only columns whose contents changed are profiled and enriched again
+        self.summary_cache = summary_cache
+        # opt-in: columns typed locally with enough confidence are not sent to the LLM for enrichment,
+        # so they get a semantic_type but no description
+        self.semantic_types = SemanticTypeInference() if semantic_types is True else (semantic_types or None)
+
+    def _profile(self, df: pd.DataFrame, n_samples: int, approximate: bool) -> Dict:
+        properties = ColumnProfiler(n_samples=n_samples, approximate=approximate).profile(df)
+        if self.semantic_types is not None:
+            self._annotate(df, properties)
+        return properties
+
+    def _annotate(self, df: pd.DataFrame, data_properties: Dict) -> None:
+        with self.tracer.span("summarizer.semantic_types", columns=len(data_properties)) as span:
+            inferred = self.semantic_types.annotate(df, data_properties)
+            span.set_attribute(
+                "confident_columns",
+                sum(1 for _, confidence in inferred.values() if confidence >= self.semantic_types.threshold),
             )
 
-        def convert_np_dtype(value, dtype: str):
-            if "float" in str(dtype):
-                return float(value)
-            elif "int" in str(dtype):
-                return int(value)
-            return value
-
-        for column in df.columns:
-            dtype = df[column].dtype
-            properties = {"dtype": str(dtype)}
-
-            if dtype in [int, float, complex]:
-                properties.update(
-                    {
-                        "dtype": "number",
-                        "mean": round(float(df[column].mean()), 4),
-                        "std": round(float(df[column].std()), 4),
-                        "min": convert_np_dtype(df[column].min(), dtype),
-                        "max": convert_np_dtype(df[column].max(), dtype),
-                    }
-                )
-            elif dtype == bool:
-                properties["dtype"] = "boolean"
-            elif dtype == object:
-                try:
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore")
-                        pd.to_datetime(df[column], errors="raise")
-                        properties["dtype"] = "date"
-                except ValueError:
-                    unique_ratio = df[column].nunique() / len(df[column])
-                    properties["dtype"] = "category" if unique_ratio < 0.5 else "string"
-            elif pd.api.types.is_categorical_dtype(df[column]):
-                properties["dtype"] = "category"
-            elif pd.api.types.is_datetime64_any_dtype(df[column]):
-                properties["dtype"] = "date"
-
-            properties["samples"] = add_samples(column)
-
-            if properties["dtype"] == "date":
-                add_date_properties(column)
-                properties["samples"] = [sample.isoformat() for sample in properties["samples"]]
-
-            properties["num_unique_values"] = df[column].nunique()
-            properties_dict[column] = properties
-
-        return properties_dict
-
-    def _enrich(self, data_properties: List[Dict]) -> Dict:
-        logger.info("Enriching data properties using LLM")
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": json.dumps(data_properties)},
-        ]
-        response = self.oai_client.chat.completions.create(
-            model=self.oai_model,
-            messages=messages,
-            response_format={"type": "json_object"},
+    def _semantic_options(self) -> Optional[Dict]:
+        return self.semantic_types.options() if self.semantic_types is not None else None
+
+    def _get_column_properties(self, df: pd.DataFrame, n_samples: int = 3, approximate: bool = False) -> List[Dict]:
+        if self.summary_cache is None:
+            return self._profile(df, n_samples, approximate)
+
+        keys, properties = {}, {}
+        for column, series in df.items():
+            fingerprint = column_fingerprint(series)
+            if fingerprint is None:
+                continue
+            keys[column] = SummaryCache.make_key(
+                kind="profile",
+                fingerprint=fingerprint,
+                n_samples=n_samples,
+                approximate=approximate,
+                semantic_types=self._semantic_options(),
+            )
+            cached = self.summary_cache.get_json(keys[column])
+            if cached is not None:
+                properties[column] = cached
+        stale = [column for column in df.columns if column not in properties]
+        logger.info(f"Profiling {len(stale)} of {df.shape[1]} columns, the rest are cached")
+        if stale:
+            profiled = self._profile(df.loc[:, stale], n_samples, approximate)
+            for column, column_properties in profiled.items():
+                properties[column] = column_properties
+                if column in keys:
+                    self.summary_cache.set_json(keys[column], column_properties)
+        return {column: properties[column] for column in df.columns}
+
+    def _get_file_key(
+        self, filepath: str, n_samples: int, approximate: bool, streaming: bool, read_options: Dict
+    ) -> str:
+        return SummaryCache.make_key(
+            kind="file",
+            **file_fingerprint(filepath),
+            n_samples=n_samples,
+            approximate=approximate,
+            streaming=streaming,
+            read_options=read_options,
+            semantic_types=self._semantic_options(),
         )
-        enriched_descriptions = json.loads(response.choices[0].message.content)
-        dataset_description, property_descriptions = (
-            enriched_descriptions["description"],
-            enriched_descriptions["fields"]
+
+    def _get_data_properties(
+        self,
+        data: Union[pd.DataFrame, StreamingProfile, str],
+        n_samples: int = 3,
+        approximate: bool = False,
+        streaming: bool = False,
+        n_jobs: int = 1,
+        read_options: Optional[Dict] = None,
+    ) -> Dict:
+        read_options = read_options or {}
+        file_key = None
+        if isinstance(data, str) and self.summary_cache is not None:
+            # an unchanged file is not read again
+            file_key = self._get_file_key(data, n_samples, approximate, streaming, read_options)
+            data_properties = self.summary_cache.get_json(file_key)
+            if data_properties is not None:
+                return data_properties
+            if not streaming:
+                # a fixed seed samples the same rows again, so unchanged columns keep their fingerprints
+                read_options = {"seed": SUMMARY_CACHE_SEED, **read_options}
+
+        if isinstance(data, str) and streaming:
+            data = profile_file(data, n_jobs=n_jobs, **read_options)
+        elif isinstance(data, str):
+            data = read_dataframe(data, **read_options)
+
+        if isinstance(data, StreamingProfile):
+            with self.tracer.span("summarizer.profile", rows=data.n_rows, streaming=True) as span:
+                data_properties = data.finalize(n_samples)
+                span.set_attribute("columns", len(data_properties))
+            if self.semantic_types is not None:
+                # a streamed file is typed on its reservoir sample
+                self._annotate(data.sample(), data_properties)
+        elif isinstance(data, pd.DataFrame):
+            with self.tracer.span(
+                "summarizer.profile", rows=len(data), columns=data.shape[1], approximate=approximate
+            ):
+                data_properties = self._get_column_properties(data, n_samples, approximate)
+        else:
+            raise ValueError("Data must be a pandas DataFrame or a path to a data file")
+        if file_key is not None:
+            self.summary_cache.set_json(file_key, data_properties)
+        return data_properties
+
+    def _get_enrich_messages(self, data_properties: Dict, fields: Optional[List[str]] = None) -> List[Dict]:
+        if fields is None:
+            return [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(data_properties)},
+            ]
+        return [
+            {"role": "system", "content": DESCRIBE_PROMPT},
+            {"role": "user", "content": json.dumps({"fields": data_properties, "fields_to_describe": fields})},
+        ]
+
+    def _cached_enrichment(self, data_properties: Dict) -> Tuple[Dict, Optional[str], Dict, List[str]]:
+        """
+        Look up the cached dataset description and per-column enrichments. Returns the cache keys,
+        the description, the cached enrichments and the columns that need the LLM; every column
+        does when the description is missing.
+        """
+        keys = {
+            "description": SummaryCache.make_key(
+                kind="description", model=self.oai_model, columns=sorted(data_properties)
+            ),
+            **{
+                column: SummaryCache.make_key(
+                    kind="enrichment", model=self.oai_model, column=column, properties=properties
+                )
+                for column, properties in data_properties.items()
+            },
+        }
+        description = self.summary_cache.get_json(keys["description"])
+        enrichments = {}
+        if description is not None:
+            for column in data_properties:
+                cached = self.summary_cache.get_json(keys[column])
+                if cached is not None:
+                    enrichments[column] = cached
+        stale = [column for column in data_properties if column not in enrichments]
+        return keys, description, enrichments, stale
+
+    def _plan_enrichment(self, data_properties: Dict) -> Tuple[Tuple, Optional[List[Dict]]]:
+        """
+        Decide what the LLM is asked: the dataset description unless it is cached, and the fields
+        that are neither cached nor typed locally. Returns the state _finish_enrichment needs and
+        the messages of the request, or None when nothing is left to ask.
+        """
+        if self.summary_cache is None:
+            keys, description, enrichments, stale = None, None, {}, list(data_properties)
+        else:
+            keys, description, enrichments, stale = self._cached_enrichment(data_properties)
+        fields = stale
+        if self.semantic_types is not None:
+            fields = [column for column in stale if "semantic_type" not in data_properties[column]]
+        if description is not None and not fields:
+            return (keys, description, enrichments, fields), None
+        # the description needs every field as context, but the type and samples of a field typed
+        # locally are enough; without a description to write only the fields asked about are sent
+        context = {
+            column: properties if column in fields else {key: properties.get(key) for key in CONTEXT_PROPERTIES}
+            for column, properties in data_properties.items()
+            if description is None or column in fields
+        }
+        messages = self._get_enrich_messages(context, fields if self.semantic_types is not None else None)
+        logger.info(
+            f"Enriching {len(fields)} of {len(data_properties)} columns using LLM"
+            + (", and describing the dataset" if description is None else "")
         )
-        enriched_properties = {
-            key: {**data_properties.get(key, {}), **property_descriptions.get(key, {})}
-            for key in set(data_properties) | set(property_descriptions)
+        return (keys, description, enrichments, fields), messages
+
+    def _parse_enrichment(self, content: str, state: Tuple) -> Dict:
+        enriched_descriptions = json.loads(content)
+        if state[1] is None and "description" not in enriched_descriptions:
+            raise ValueError("Expected 'description' key in the response")
+        return enriched_descriptions
+
+    def _finish_enrichment(self, data_properties: Dict, state: Tuple, content: Optional[str]) -> Dict:
+        keys, description, enrichments, fields = state
+        if content is not None:
+            enriched_descriptions = self._parse_enrichment(content, state)
+            if description is None:
+                description = enriched_descriptions["description"]
+                if self.summary_cache is not None:
+                    self.summary_cache.set_json(keys["description"], description)
+            for column, enrichment in (enriched_descriptions.get("fields") or {}).items():
+                if column in fields and column not in enrichments:
+                    enrichments[column] = enrichment
+                    if self.summary_cache is not None:
+                        self.summary_cache.set_json(keys[column], enrichment)
+        return {
+            "description": description,
+            "fields": {
+                column: {**properties, **enrichments.get(column, {})}
+                for column, properties in data_properties.items()
+            },
         }
-        return {"description": dataset_description, "fields": enriched_properties}
-
-    def summarize(self, data: Union[pd.DataFrame, str], n_samples: int = 3, enrich: bool = False) -> Dict:
-        if isinstance(data, str) and data.endswith(".csv"):
-            data = read_dataframe(data)
-        if not isinstance(data, pd.DataFrame):
-            raise ValueError("Data must be a pandas DataFrame or a path to a CSV file")
-        data_properties = self._get_column_properties(data, n_samples)
+
+    def _enrich_span(self, data_properties: Dict, state: Tuple):
+        fields = state[3]
+        local = [column for column, properties in data_properties.items() if "semantic_type" in properties]
+        return self.tracer.span(
+            "summarizer.enrich",
+            columns=len(fields),
+            cached_columns=len(set(data_properties) - set(fields) - set(local)),
+            local_columns=len(local),
+        )
+
+    def _enrich(self, data_properties: Dict) -> Dict:
+        state, messages = self._plan_enrichment(data_properties)
+        content = None
+        if messages is not None:
+            with self._enrich_span(data_properties, state):
+                content = create_completion(
+                    self.oai_client,
+                    self.cache,
+                    tracer=self.tracer,
+                    model=self.oai_model,
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    validate=lambda content: self._parse_enrichment(content, state),
+                )
+        return self._finish_enrichment(data_properties, state, content)
+
+    async def _aenrich(self, data_properties: Dict) -> Dict:
+        state, messages = self._plan_enrichment(data_properties)
+        content = None
+        if messages is not None:
+            with self._enrich_span(data_properties, state):
+                content = await acreate_completion(
+                    self.oai_async_client,
+                    self.cache,
+                    tracer=self.tracer,
+                    model=self.oai_model,
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    validate=lambda content: self._parse_enrichment(content, state),
+                )
+        return self._finish_enrichment(data_properties, state, content)
+
+    def summarize(
+        self,
+        data: Union[pd.DataFrame, StreamingProfile, str],
+        n_samples: int = 3,
+        enrich: bool = False,
+        approximate: bool = False,
+        streaming: bool = False,
+        n_jobs: int = 1,
+        read_options: Optional[Dict] = None,
+    ) -> Dict:
+        data_properties = self._get_data_properties(data, n_samples, approximate, streaming, n_jobs, read_options)
         return self._enrich(data_properties) if enrich else {"fields": data_properties}
+
+    async def asummarize(
+        self,
+        data: Union[pd.DataFrame, StreamingProfile, str],
+        n_samples: int = 3,
+        enrich: bool = False,
+        approximate: bool = False,
+        streaming: bool = False,
+        n_jobs: int = 1,
+        read_options: Optional[Dict] = None,
+    ) -> Dict:
+        # profiling is CPU-bound, keep it off the event loop
+        data_properties = await asyncio.to_thread(
+            self._get_data_properties, data, n_samples, approximate, streaming, n_jobs, read_options
+        )
+        return await self._aenrich(data_properties) if enrich else {"fields": data_properties}
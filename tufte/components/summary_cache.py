@@ -0,0 +1,61 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .llm_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, LLMCache
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryCache(LLMCache):
+    """
+    Persistent cache of dataset summaries, stored like LLMCache in SQLite with LRU and TTL eviction.
+
+    Summarizer keeps three kinds of entries: the properties of a file keyed by its path, size and
+    modification time; the profile of each column keyed by a fingerprint of its contents; and the
+    LLM enrichment of each column keyed by its profile. A re-run therefore profiles and enriches
+    only the columns whose contents changed.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: Optional[float] = None,
+    ) -> None:
+        super().__init__(path or os.path.join(DEFAULT_CACHE_DIR, "summary_cache.sqlite"), max_bytes, ttl)
+
+    def get_json(self, key: str) -> Optional[Any]:
+        content = self.get(key)
+        return json.loads(content) if content is not None else None
+
+    def set_json(self, key: str, value: Any) -> None:
+        self.set(key, json.dumps(value, default=str))
+
+
+def column_fingerprint(series: pd.Series) -> Optional[str]:
+    """
+    Hash a column's name, dtype and values (not its index). Returns None for columns whose values
+    pandas cannot hash, e.g. lists or dicts; those are always profiled.
+    """
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biufcmM":
+        # fixed-width values are hashed as raw bytes, which is much faster than hashing them element-wise
+        payload = np.ascontiguousarray(series.to_numpy()).tobytes()
+    else:
+        try:
+            payload = pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes()
+        except TypeError:
+            return None
+    digest = hashlib.blake2b(payload, digest_size=16)
+    digest.update(f"{series.name}|{series.dtype}|{len(series)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def file_fingerprint(filepath: str) -> Dict:
+    stat = os.stat(filepath)
+    return {"path": os.path.abspath(filepath), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
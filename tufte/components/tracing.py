@@ -0,0 +1,182 @@
+import contextlib
+import contextvars
+import logging
+import os
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# the innermost open span of the running thread or task; asyncio tasks and asyncio.to_thread
+# copy it, so spans opened there nest under the span that started them
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("tufte_span", default=None)
+
+
+class Span:
+    """
+    One timed stage of the pipeline. `duration` is wall time in seconds; `attributes` carry token
+    usage, payload sizes and, when the tracer tracks memory, the peak bytes allocated while it ran.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict] = None) -> None:
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = dict(attributes or {})
+        self.children: List["Span"] = []
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+        self.duration: Optional[float] = None
+        self._start = time.perf_counter()
+        self._memory_start = 0
+        self._memory_peak = 0
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        return self.parent.span_id if self.parent is not None else None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def child(self, name: str) -> Optional["Span"]:
+        """
+        Return the first direct child span called `name`.
+        """
+        return next((span for span in self.children if span.name == name), None)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time_ns": self.start_time_ns,
+            "end_time_ns": self.end_time_ns,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, duration={self.duration}, attributes={self.attributes})"
+
+
+class Tracer:
+    """
+    Records a span for every pipeline stage and hands each finished span to the exporters.
+
+    An exporter is any callable taking a Span, e.g. `spans.append` or an OpenTelemetryExporter.
+    Exporter failures are logged and never interrupt the pipeline. With `track_memory`, tracemalloc
+    is started and each span records `memory.peak_bytes`; this slows allocation-heavy stages and
+    the peaks of spans running concurrently in several threads overlap.
+    """
+
+    def __init__(
+        self,
+        exporters: Optional[Sequence[Callable[[Span], None]]] = None,
+        track_memory: bool = False,
+    ) -> None:
+        self.exporters = list(exporters or [])
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def add_exporter(self, exporter: Callable[[Span], None]) -> None:
+        self.exporters.append(exporter)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        if parent is not None:
+            parent.children.append(span)
+        if self.track_memory:
+            self._start_memory(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exception_error:
+            span.status = "error"
+            span.error = f"{type(exception_error).__name__}: {exception_error}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - span._start
+            span.end_time_ns = span.start_time_ns + int(span.duration * 1e9)
+            if self.track_memory:
+                self._end_memory(span)
+            self._export(span)
+
+    def _start_memory(self, span: Span) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        # the parent's peak so far is lost once the peak is reset, so hand it over first
+        if span.parent is not None:
+            span.parent._memory_peak = max(span.parent._memory_peak, peak)
+        tracemalloc.reset_peak()
+        span._memory_start = span._memory_peak = current
+
+    def _end_memory(self, span: Span) -> None:
+        span._memory_peak = max(span._memory_peak, tracemalloc.get_traced_memory()[1])
+        span.attributes["memory.peak_bytes"] = span._memory_peak - span._memory_start
+        if span.parent is not None:
+            span.parent._memory_peak = max(span.parent._memory_peak, span._memory_peak)
+
+    def _export(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter(span)
+            except Exception as exception_error:
+                logger.warning(f"Span exporter {exporter!r} failed: {exception_error}")
+
+
+class OpenTelemetryExporter:
+    """
+    Forwards finished traces to OpenTelemetry, keeping their nesting, timestamps and attributes.
+
+    Spans are replayed once their root span ends, so parents are created before their children.
+    Requires opentelemetry-api and a configured tracer provider (e.g. from opentelemetry-sdk).
+    """
+
+    def __init__(self, tracer_provider=None, instrumentation_name: str = "tufte") -> None:
+        try:
+            from opentelemetry import trace
+        except ImportError as exception_error:
+            raise ImportError(
+                "OpenTelemetryExporter requires opentelemetry-api. Install it with `pip install tufte[otel]`."
+            ) from exception_error
+        self._trace = trace
+        self._tracer = trace.get_tracer(instrumentation_name, tracer_provider=tracer_provider)
+
+    def __call__(self, span: Span) -> None:
+        if span.parent is None:
+            self._replay(span, None)
+
+    def _replay(self, span: Span, context) -> None:
+        otel_span = self._tracer.start_span(
+            span.name,
+            context=context,
+            start_time=span.start_time_ns,
+            attributes={key: _otel_value(value) for key, value in span.attributes.items() if value is not None},
+        )
+        if span.status == "error":
+            from opentelemetry.trace import Status, StatusCode
+
+            otel_span.set_status(Status(StatusCode.ERROR, span.error))
+        child_context = self._trace.set_span_in_context(otel_span)
+        for child in span.children:
+            self._replay(child, child_context)
+        otel_span.end(end_time=span.end_time_ns)
+
+
+def _otel_value(value: Any):
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
@@ -1,23 +1,207 @@
 import logging
+import operator
+import os
 import pandas as pd
 import re
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Union
+
+from .sampling import DEFAULT_SAMPLE_SIZE, Sampler, UniformSampler, get_sampler
 
 logger = logging.getLogger(__name__)
 
+MAX_ROWS = DEFAULT_SAMPLE_SIZE
+DEFAULT_CHUNK_SIZE = 100000
+COMPRESSION_EXTENSIONS = ('gz', 'bz2', 'zip', 'xz', 'zst')
+TEXT_FILE_TYPES = ('csv', 'tsv', 'jsonl', 'ndjson')
+ARROW_FILE_TYPES = ('parquet', 'feather', 'arrow', 'ipc')
+DATA_FILE_TYPES = TEXT_FILE_TYPES + ARROW_FILE_TYPES + ('json', 'xls', 'xlsx')
+
+FILTER_OPERATORS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda series, value: series.isin(value),
+    'not in': lambda series, value: ~series.isin(value),
+}
+
+
+def get_file_extension(filepath: str) -> str:
+    """
+    Return the file type of a path, looking through a trailing compression suffix (data.csv.gz -> csv).
+    """
+    parts = filepath.lower().split('.')
+    if len(parts) > 2 and parts[-1] in COMPRESSION_EXTENSIONS:
+        return parts[-2]
+    return parts[-1]
+
+
+def clean_column_names(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [re.sub(r'[^0-9a-zA-Z_]', '_', str(col_name)) for col_name in df.columns]
+    return df
+
+
+def filter_dataframe(df: pd.DataFrame, filters: Optional[List] = None) -> pd.DataFrame:
+    """
+    Keep the rows matching `filters`, given in the pyarrow/parquet disjunctive normal form:
+    a list of (column, op, value) tuples that must all hold, or a list of such lists of which any may hold.
+    """
+    if not filters:
+        return df
+    groups = filters if isinstance(filters[0], list) else [filters]
+    mask = np.zeros(len(df), dtype=bool)
+    for group in groups:
+        group_mask = np.ones(len(df), dtype=bool)
+        for column, op, value in group:
+            group_mask &= np.asarray(FILTER_OPERATORS[op](df[column], value), dtype=bool)
+        mask |= group_mask
+    return df[mask]
+
+
+def open_arrow_dataset(filepath: str):
+    """
+    Open a Parquet or Feather/Arrow IPC file as a memory-mapped pyarrow dataset.
+    Column projection and filters passed to its scans are pushed down to the file,
+    so Parquet row groups whose statistics rule out the filter are never read.
+    """
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    file_format = 'parquet' if get_file_extension(filepath) == 'parquet' else 'ipc'
+    return ds.dataset(
+        os.path.abspath(filepath), format=file_format, filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+
+def filters_to_expression(filters: Optional[List] = None):
+    if not filters:
+        return None
+    import pyarrow.parquet as pq
+
+    return pq.filters_to_expression(filters)
 
-def read_dataframe(filepath: str, encoding: str = 'utf-8') -> pd.DataFrame:
+
+def arrow_to_pandas(table, dtype_backend: Optional[str] = None) -> pd.DataFrame:
+    if dtype_backend == 'pyarrow':
+        # keep columns in Arrow memory instead of materializing numpy/object arrays
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    df = table.to_pandas()
+    if dtype_backend == 'numpy_nullable':
+        df = df.convert_dtypes()
+    return df
+
+
+def iter_dataframe_chunks(
+    filepath: str,
+    chunksize: int = DEFAULT_CHUNK_SIZE,
+    encoding: str = 'utf-8',
+    columns: Optional[List[str]] = None,
+    filters: Optional[List] = None,
+    dtype_backend: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV, TSV, JSON-lines (optionally compressed), Parquet or Feather/Arrow IPC file in chunks
+    of at most `chunksize` rows. Row labels keep counting across chunks, so they identify a row within
+    the whole file. `columns` and `filters` use the column names as stored in the file.
+    """
+    file_extension = get_file_extension(filepath)
+
+    if file_extension in ARROW_FILE_TYPES:
+        dataset = open_arrow_dataset(filepath)
+        offset = 0
+        batches = dataset.to_batches(
+            columns=columns, filter=filters_to_expression(filters), batch_size=chunksize
+        )
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            chunk = arrow_to_pandas(batch, dtype_backend)
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield clean_column_names(chunk)
+        return
+
+    read_kwargs = {'dtype_backend': dtype_backend} if dtype_backend else {}
+    chunk_readers = {
+        'csv': lambda: pd.read_csv(
+            filepath, encoding=encoding, chunksize=chunksize, usecols=columns, **read_kwargs
+        ),
+        'tsv': lambda: pd.read_csv(
+            filepath, sep='\t', encoding=encoding, chunksize=chunksize, usecols=columns, **read_kwargs
+        ),
+        'jsonl': lambda: pd.read_json(
+            filepath, lines=True, encoding=encoding, chunksize=chunksize, **read_kwargs
+        ),
+        'ndjson': lambda: pd.read_json(
+            filepath, lines=True, encoding=encoding, chunksize=chunksize, **read_kwargs
+        ),
+    }
+
+    if file_extension not in chunk_readers:
+        raise ValueError(f'Unsupported file type for chunked reading: {file_extension}')
+
+    try:
+        with chunk_readers[file_extension]() as reader:
+            for chunk in reader:
+                if columns is not None and file_extension in ('jsonl', 'ndjson'):
+                    chunk = chunk[columns]
+                yield clean_column_names(filter_dataframe(chunk, filters))
+    except Exception as e:
+        logger.error(f"Failed to read file: {filepath}. Error: {e}")
+        raise
+
+
+def read_dataframe(
+    filepath: str,
+    encoding: str = 'utf-8',
+    seed=None,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List] = None,
+    dtype_backend: Optional[str] = None,
+    sampling: Union[None, int, str, Dict, Sampler] = None,
+) -> pd.DataFrame:
     """
     Read a dataframe from a given filepath.
-    Sample 100,000 rows if it exceeds that limit.
+    Sample 100,000 rows if it exceeds that limit; `sampling` picks the strategy and size
+    (see sampling.get_sampler), uniform by default.
+    CSV, TSV and JSON-lines files are sampled while they are read in chunks,
+    so at most one chunk plus the sample is held in memory. Parquet and Feather/Arrow IPC
+    files are memory-mapped; a uniform sample converts only the sampled rows to pandas,
+    other strategies scan the file in batches.
+    `columns` projects and `filters` (pyarrow DNF) selects rows before sampling;
+    dtype_backend='pyarrow' keeps columns Arrow-backed.
     """
-    file_extension = filepath.split('.')[-1]
+    sampler = get_sampler(sampling, MAX_ROWS, seed)
+    file_extension = get_file_extension(filepath)
+
+    if file_extension in ARROW_FILE_TYPES:
+        try:
+            dataset = open_arrow_dataset(filepath)
+            expression = filters_to_expression(filters)
+            n_rows = dataset.count_rows(filter=expression)
+            if n_rows <= sampler.size:
+                table = dataset.to_table(columns=columns, filter=expression)
+            elif isinstance(sampler, UniformSampler):
+                logger.info(f"Dataframe has more than {sampler.size:,} rows. We will sample {sampler.size:,} rows.")
+                table = dataset.take(sampler.positions(n_rows), columns=columns, filter=expression)
+            else:
+                return _sample_chunks(filepath, sampler, encoding, columns, filters, dtype_backend)
+        except Exception as e:
+            logger.error(f"Failed to read file: {filepath}. Error: {e}")
+            raise
+        return clean_column_names(arrow_to_pandas(table, dtype_backend))
+
+    if file_extension in TEXT_FILE_TYPES:
+        return _sample_chunks(filepath, sampler, encoding, columns, filters, dtype_backend)
 
     read_funcs = {
-        'json': lambda: pd.read_json(filepath, orient='records'),
-        'csv': lambda: pd.read_csv(filepath),
-        'xls': lambda: pd.read_excel(filepath),
-        'xlsx': lambda: pd.read_excel(filepath),
-        'tsv': lambda: pd.read_csv(filepath, sep='\t'),
+        'json': lambda: pd.read_json(filepath, orient='records', encoding=encoding),
+        'xls': lambda: pd.read_excel(filepath, usecols=columns),
+        'xlsx': lambda: pd.read_excel(filepath, usecols=columns),
     }
 
     if file_extension not in read_funcs:
@@ -29,11 +213,33 @@ def read_dataframe(filepath: str, encoding: str = 'utf-8') -> pd.DataFrame:
         logger.error(f"Failed to read file: {filepath}. Error: {e}")
         raise
 
-    df.columns = [re.sub(r'[^0-9a-zA-Z_]', '_', col_name) for col_name in df.columns]
+    if columns is not None and file_extension == 'json':
+        df = df[columns]
+    df = clean_column_names(filter_dataframe(df, filters))
 
-    if len(df) > 100000:
-        logger.info(
-            "Dataframe has more than 100,000 rows. We will sample 100,000 rows.")
-        df = df.sample(1e5)
+    if len(df) > sampler.size:
+        logger.info(f"Dataframe has more than {sampler.size:,} rows. We will sample them with {sampler!r}.")
+        df = sampler.sample(df)
 
     return df
+
+
+def _sample_chunks(
+    filepath: str,
+    sampler: Sampler,
+    encoding: str,
+    columns: Optional[List[str]],
+    filters: Optional[List],
+    dtype_backend: Optional[str],
+) -> pd.DataFrame:
+    reservoir = sampler.reservoir()
+    n_rows = 0
+    chunks = iter_dataframe_chunks(
+        filepath, encoding=encoding, columns=columns, filters=filters, dtype_backend=dtype_backend
+    )
+    for chunk in chunks:
+        n_rows += len(chunk)
+        reservoir.update(chunk)
+    if n_rows > sampler.size:
+        logger.info(f"Dataframe has more than {sampler.size:,} rows. We sampled them with {sampler!r}.")
+    return reservoir.to_frame()
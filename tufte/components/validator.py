@@ -0,0 +1,359 @@
+import ast
+import difflib
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+# top-level packages generated code may import; anything else is rejected before it runs
+DEFAULT_ALLOWED_IMPORTS = frozenset(
+    {
+        "altair", "geopandas", "matplotlib", "matplotlib_venn", "mpl_toolkits", "numpy", "pandas",
+        "plotly", "plotnine", "scipy", "seaborn", "statsmodels", "wordcloud",
+        "calendar", "collections", "datetime", "functools", "itertools", "math", "re", "statistics",
+        "string", "textwrap", "typing", "warnings",
+    }
+)
+DISALLOWED_CALLS = frozenset({"__import__", "breakpoint", "compile", "eval", "exec", "input", "open"})
+DISPLAY_METHODS = frozenset({"show", "display", "serve"})
+# keyword arguments that name a column in pandas, seaborn, plotly and plotnine calls
+FIELD_KEYWORDS = frozenset(
+    {
+        "x", "y", "z", "hue", "by", "row", "col", "column", "columns", "facet_col", "facet_row", "values",
+        "index", "names", "x_var", "y_var", "lat", "lon", "field",
+    }
+)
+# in encode(), aes() and plotly express calls these name columns too, elsewhere they are styling
+ENCODING_KEYWORDS = frozenset(
+    {"color", "fill", "size", "shape", "text", "theta", "label", "detail", "opacity", "tooltip", "group", "symbol"}
+)
+ENCODING_CALLS = frozenset({"encode", "aes"})
+# methods that keep the columns of the frame they are called on
+ROW_METHODS = frozenset(
+    {
+        "copy", "dropna", "fillna", "sort_values", "sort_index", "query", "head", "tail", "sample", "astype",
+        "assign", "drop_duplicates", "nlargest", "nsmallest", "infer_objects",
+    }
+)
+# columns pandas methods add under default names
+DEFAULT_COLUMNS = {
+    "melt": ("variable", "value"),
+    "reset_index": ("index", "level_0"),
+    "value_counts": ("count", "proportion"),
+}
+DATA_LOADERS = frozenset({"pd", "pandas", "gpd", "geopandas"})
+ALTAIR_CHANNELS = frozenset(
+    {
+        "X", "Y", "X2", "Y2", "Color", "Fill", "Stroke", "Size", "Shape", "Opacity", "Text", "Tooltip",
+        "Theta", "Radius", "Row", "Column", "Facet", "Detail", "Order", "Latitude", "Longitude", "Href",
+    }
+)
+ALTAIR_SHORTHAND = re.compile(r"^(?:\w+\()?([^():]*?)\)?(?::[QONTG])?$")
+
+
+class Diagnostic:
+    """
+    One problem found in a snippet. `severity` is "error" for problems that stop the snippet from
+    executing and "warning" for likely problems the snippet is still executed with.
+    """
+
+    def __init__(self, code: str, message: str, severity: str = "error", line: Optional[int] = None) -> None:
+        self.code = code
+        self.message = message
+        self.severity = severity
+        self.line = line
+
+    def to_dict(self) -> Dict:
+        return {"code": self.code, "message": self.message, "severity": self.severity, "line": self.line}
+
+    def __repr__(self) -> str:
+        location = f" (line {self.line})" if self.line is not None else ""
+        return f"{self.severity} {self.code}{location}: {self.message}"
+
+
+class CodeValidationError(Exception):
+    def __init__(self, diagnostics: List[Diagnostic]) -> None:
+        self.diagnostics = diagnostics
+        errors = [diagnostic for diagnostic in diagnostics if diagnostic.severity == "error"]
+        super().__init__("Generated code failed validation: " + "; ".join(repr(error) for error in errors))
+
+
+class CodeValidator:
+    """
+    Checks a generated snippet without running it: that it parses, imports only `allowed_imports`,
+    keeps the Scaffold contract (a plot(data) function that returns the chart, followed by a single
+    `chart = plot(data)` line and no show() calls), does not load data or call eval/exec/open, and
+    reads only fields of the dataset or fields it creates itself.
+
+    Reading a missing field straight from `data` (data['x']) is an error, since it always raises a
+    KeyError, unless the snippet rebinds `data` to a reshaped frame; a missing field passed by name
+    to a plotting call (x='x', alt.X('x:Q')) is only a warning, because the snippet may have created
+    it by aggregating, melting or renaming.
+    """
+
+    def __init__(self, allowed_imports: Iterable[str] = DEFAULT_ALLOWED_IMPORTS, check_fields: bool = True) -> None:
+        self.allowed_imports = frozenset(allowed_imports)
+        self.check_fields = check_fields
+
+    def validate(self, code: str, fields: Optional[Iterable[str]] = None) -> List[Diagnostic]:
+        """
+        Return the diagnostics of `code`. Field checks run only when `fields` is given, e.g. the
+        keys of a summary's "fields" or the columns of the data.
+        """
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as exception_error:
+            return [Diagnostic("syntax-error", str(exception_error.msg), line=exception_error.lineno)]
+        diagnostics = self._check_imports(tree) + self._check_calls(tree) + self._check_scaffold(tree)
+        if fields is not None and self.check_fields:
+            diagnostics += self._check_fields(tree, set(map(str, fields)))
+        return sorted(diagnostics, key=lambda diagnostic: (diagnostic.line or 0, diagnostic.code))
+
+    def check(self, code: str, fields: Optional[Iterable[str]] = None) -> List[Diagnostic]:
+        """
+        Validate `code` and raise CodeValidationError if any diagnostic is an error; returns the warnings.
+        """
+        diagnostics = self.validate(code, fields)
+        if any(diagnostic.severity == "error" for diagnostic in diagnostics):
+            raise CodeValidationError(diagnostics)
+        return diagnostics
+
+    def _check_imports(self, tree: ast.AST) -> List[Diagnostic]:
+        diagnostics = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                modules = [node.module or ""] if not node.level else ["." * node.level + (node.module or "")]
+            else:
+                continue
+            for module in modules:
+                if module.split(".")[0] not in self.allowed_imports:
+                    diagnostics.append(
+                        Diagnostic("disallowed-import", f"import of {module!r} is not allowed", line=node.lineno)
+                    )
+        return diagnostics
+
+    def _check_calls(self, tree: ast.AST) -> List[Diagnostic]:
+        diagnostics = []
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call):
+                continue
+            function = node.func
+            if isinstance(function, ast.Name) and function.id in DISALLOWED_CALLS:
+                diagnostics.append(
+                    Diagnostic("disallowed-call", f"{function.id}() is not allowed", line=node.lineno)
+                )
+            elif isinstance(function, ast.Attribute) and function.attr in DISPLAY_METHODS and not node.args:
+                diagnostics.append(
+                    Diagnostic(
+                        "show-call",
+                        f".{function.attr}() displays the chart instead of returning it; remove it",
+                        line=node.lineno,
+                    )
+                )
+            elif (
+                isinstance(function, ast.Attribute)
+                and function.attr.startswith("read_")
+                and _root_name(function) in DATA_LOADERS
+            ):
+                diagnostics.append(
+                    Diagnostic(
+                        "loads-data",
+                        f"{function.attr}() loads data; the dataset is already available as `data`",
+                        line=node.lineno,
+                    )
+                )
+        return diagnostics
+
+    def _check_scaffold(self, tree: ast.Module) -> List[Diagnostic]:
+        diagnostics = []
+        plot = next(
+            (node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "plot"), None
+        )
+        if plot is None:
+            diagnostics.append(Diagnostic("missing-plot", "the template's plot(data) function is missing"))
+        elif not any(isinstance(node, ast.Return) and node.value is not None for node in ast.walk(plot)):
+            diagnostics.append(
+                Diagnostic("missing-return", "plot(data) must return the chart", line=plot.lineno)
+            )
+
+        assignments = [
+            (position, node)
+            for position, node in enumerate(tree.body)
+            if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign))
+            and any(isinstance(target, ast.Name) and target.id == "chart" for target in _targets(node))
+        ]
+        if not assignments:
+            diagnostics.append(
+                Diagnostic("missing-chart-assignment", "the snippet must end with `chart = plot(data)`")
+            )
+            return diagnostics
+        for _, node in assignments[:-1]:
+            diagnostics.append(
+                Diagnostic(
+                    "extra-chart-assignment",
+                    "`chart` is assigned more than once at module level; keep only `chart = plot(data)`",
+                    line=node.lineno,
+                )
+            )
+        position, node = assignments[-1]
+        value = getattr(node, "value", None)
+        if not (
+            isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == "plot"
+        ):
+            diagnostics.append(
+                Diagnostic(
+                    "invalid-chart-assignment",
+                    "`chart` must be assigned the result of plot(data)",
+                    severity="warning",
+                    line=node.lineno,
+                )
+            )
+        for extra in tree.body[position + 1:]:
+            diagnostics.append(
+                Diagnostic(
+                    "code-after-chart",
+                    "the template allows no code after `chart = plot(data)`",
+                    severity="warning",
+                    line=extra.lineno,
+                )
+            )
+        return diagnostics
+
+    def _check_fields(self, tree: ast.AST, fields: Set[str]) -> List[Diagnostic]:
+        created = _created_fields(tree)
+        known = fields | created
+        diagnostics, reported = [], set()
+
+        def report(field: str, node: ast.AST, severity: str) -> None:
+            if not field or field in known or (field, severity) in reported:
+                return
+            reported.add((field, severity))
+            matches = difflib.get_close_matches(field, sorted(fields), n=1)
+            hint = f"; did you mean {matches[0]!r}?" if matches else ""
+            diagnostics.append(
+                Diagnostic(
+                    "unknown-field",
+                    f"field {field!r} is not in the dataset{hint}",
+                    severity=severity,
+                    line=getattr(node, "lineno", None),
+                )
+            )
+
+        data_severity = "warning" if _data_reshaped(tree) else "error"
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load) and _is_data(node.value):
+                for field in _string_constants(_subscript_slice(node)):
+                    report(field, node, data_severity)
+            elif isinstance(node, ast.Call):
+                keywords = FIELD_KEYWORDS
+                if _is_encoding_call(node.func):
+                    keywords = FIELD_KEYWORDS | ENCODING_KEYWORDS
+                for keyword in node.keywords:
+                    if keyword.arg in keywords:
+                        for field in _string_constants(keyword.value):
+                            report(_altair_field(field), keyword.value, "warning")
+                if _is_altair_channel(node.func) and node.args:
+                    for field in _string_constants(node.args[0]):
+                        report(_altair_field(field), node, "warning")
+        return diagnostics
+
+
+def _targets(node: ast.AST) -> List[ast.AST]:
+    if isinstance(node, ast.Assign):
+        return node.targets
+    return [node.target]
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Call, ast.Subscript)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_data(node: ast.AST) -> bool:
+    return isinstance(node, ast.Name) and node.id == "data"
+
+
+def _is_encoding_call(function: ast.AST) -> bool:
+    if isinstance(function, ast.Attribute):
+        return function.attr in ENCODING_CALLS or _root_name(function) == "px"
+    return isinstance(function, ast.Name) and function.id in ENCODING_CALLS
+
+
+def _data_reshaped(tree: ast.AST) -> bool:
+    """
+    Whether `data` is rebound to anything but a row selection of itself, e.g. an aggregate whose
+    columns differ from the dataset's.
+    """
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            continue
+        if not any(isinstance(target, ast.Name) and target.id == "data" for target in _targets(node)):
+            continue
+        value = node.value
+        while isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute) and value.func.attr in ROW_METHODS:
+            value = value.func.value
+        if not (_is_data(value) or (isinstance(value, ast.Subscript) and _is_data(value.value))):
+            return True
+    return False
+
+
+def _subscript_slice(node: ast.Subscript) -> ast.AST:
+    # python 3.8 wraps the slice in ast.Index
+    return node.slice.value if isinstance(node.slice, getattr(ast, "Index", ())) else node.slice
+
+
+def _string_constants(node: ast.AST) -> List[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [field for element in node.elts for field in _string_constants(element)]
+    return []
+
+
+def _is_altair_channel(function: ast.AST) -> bool:
+    return isinstance(function, ast.Attribute) and function.attr in ALTAIR_CHANNELS and _root_name(function) == "alt"
+
+
+def _altair_field(shorthand: str) -> str:
+    """
+    Return the field of an altair shorthand such as 'mean(price):Q', or "" for count(); plain names
+    pass through.
+    """
+    match = ALTAIR_SHORTHAND.match(shorthand)
+    return match.group(1) if match else shorthand
+
+
+def _created_fields(tree: ast.AST) -> Set[str]:
+    """
+    Collect the names of columns a snippet may create: subscript and .columns assignments,
+    assign/agg/named aggregation keywords, rename mappings, name/var_name/value_name arguments, the
+    default columns of melt, reset_index and value_counts, and any string used as a dictionary key
+    or value.
+    """
+    created = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+            for target in _targets(node):
+                if isinstance(target, ast.Subscript):
+                    created.update(_string_constants(_subscript_slice(target)))
+                elif isinstance(target, ast.Attribute) and target.attr == "columns" and node.value is not None:
+                    created.update(_string_constants(node.value))
+        elif isinstance(node, ast.Call):
+            function = node.func.attr if isinstance(node.func, ast.Attribute) else None
+            for keyword in node.keywords:
+                if function in ("assign", "agg", "aggregate") and keyword.arg:
+                    created.add(keyword.arg)
+                if keyword.arg in ("name", "var_name", "value_name", "as_", "columns", "names", "title"):
+                    created.update(_string_constants(keyword.value))
+            if function is not None and function.startswith("transform_"):
+                # altair transforms name their outputs with keywords or as_ strings
+                created.update(keyword.arg for keyword in node.keywords if keyword.arg)
+                for argument in node.args:
+                    created.update(_string_constants(argument))
+            created.update(DEFAULT_COLUMNS.get(function, ()))
+        elif isinstance(node, ast.Dict):
+            for element in [*node.keys, *node.values]:
+                if element is not None:
+                    created.update(_string_constants(element))
+    return created
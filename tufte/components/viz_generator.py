@@ -1,9 +1,13 @@
-import json
+import ast
+import asyncio
 import re
-from openai import OpenAI
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Tuple
 
+from .llm_cache import LLMCache, acreate_completion, astream_completion, create_completion, stream_completion
+from .openai_clients import LazyOpenAIClients
+from .prompt_context import PromptContext, PromptContextBuilder
 from .scaffold import Scaffold
+from .tracing import Tracer
 
 GENERAL_INSTRUCTIONS_PROMPT = """
 You are an expert data analyst and programmer. Your task is to generate python code for a visualization based on a dataset summary and a goal.
@@ -23,21 +27,96 @@ Ensure that the x-axis labels are legible (e.g., rotate when needed).
 Do not write code to load the data. The data is already loaded and available in the variable data.
 """.strip()
 
+BATCH_INSTRUCTIONS_PROMPT = """
+You are given {n_goals} numbered goals. Write one complete, independent program per goal, each following the template.
+Answer every goal in its own block that starts with <goal id="N"> and ends with </goal>, where N is the number of the goal.
+Each block contains the plan and the program for that goal only, enclosed in backticks (```python).
+""".strip()
+
+# a block runs from its opening tag to the next opening tag, so a missing </goal> loses nothing
+GOAL_BLOCK_PATTERN = re.compile(r'<goal id="?(\d+)"?>(.*?)(?=<goal id="?\d+"?>|\Z)', re.DOTALL)
+GOAL_TAG_PATTERN = re.compile(r'<goal id="?(\d+)"?>|</goal>')
+
+
+class CodeBlockParser:
+    """
+    Finds the ```python blocks of a completion while it streams in and returns each block once it
+    closes. In a batched response a block belongs to the goal whose <goal id="N"> block it is in;
+    as in VizGenerator._parse_batch, blocks outside a goal, of a repeated goal or that do not parse
+    are dropped.
+    """
+
+    def __init__(self, n_goals: int = 1, batched: bool = False) -> None:
+        self.n_goals = n_goals
+        self.batched = batched
+        self.text = ""
+        self._position = 0
+        self._goal: Optional[int] = None if batched else 0
+        self._seen = set()
+
+    def feed(self, text: str) -> List[Tuple[int, str]]:
+        """
+        Add the next piece of the response and return the (goal index, code) of the blocks it closed.
+        """
+        self.text += text
+        blocks = []
+        while True:
+            start = self.text.find("```python", self._position)
+            end = self.text.find("```", start + len("```python")) if start != -1 else -1
+            if end == -1:
+                return blocks
+            if self.batched:
+                self._update_goal(self.text[self._position:start])
+            code = self.text[start + len("```python"):end]
+            self._position = end + len("```")
+            if self._goal is None:
+                continue
+            if self.batched:
+                try:
+                    ast.parse(code)
+                except SyntaxError:
+                    continue
+            blocks.append((self._goal, code))
 
-class VizGenerator(object):
-    def __init__(self, model: str = "gpt-4o-mini") -> None:
+    def _update_goal(self, text: str) -> None:
+        for match in GOAL_TAG_PATTERN.finditer(text):
+            index = int(match.group(1)) - 1 if match.group(1) else None
+            if index is None or not 0 <= index < self.n_goals or index in self._seen:
+                self._goal = None
+            else:
+                self._goal = index
+                self._seen.add(index)
+
+
+class VizGenerator(LazyOpenAIClients):
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini",
+        cache: Optional[LLMCache] = None,
+        tracer: Optional[Tracer] = None,
+        prompt_context: Optional[PromptContextBuilder] = None,
+    ) -> None:
         self.oai_model = model
-        self.oai_client = OpenAI()
+        self.cache = cache
+        self.tracer = tracer or Tracer()
         self.scaffold = Scaffold()
+        # keeps the fields relevant to the goal within a token budget, see PromptContextBuilder
+        self.prompt_context = prompt_context or PromptContextBuilder()
 
     def _extract_code(self, text: str):
         pattern = r'```python(.*?)```'
         code = re.findall(pattern, text, re.DOTALL)
         return code
 
-    def generate_code(self, summary: Dict, goal: Dict, library: str = "altair"):
+    def _build_context(self, summary: Dict, goals: List[Dict]) -> PromptContext:
+        goal_text = "\n".join(
+            str(goal.get(key, "")) for goal in goals for key in ("question", "visualization", "statistic", "reasoning")
+        )
+        return self.prompt_context.build(summary, goal_text)
+
+    def _get_messages(self, context: PromptContext, goal: Dict, library: str) -> List[Dict]:
         code_template, additional_instructions = self.scaffold.get_template(library)
-        messages = [
+        return [
             {
                 "role": "system", 
                 "content": f"""
@@ -49,14 +128,249 @@ class VizGenerator(object):
             },
             {
                 "role": "system",
-                "content": f"Dataset summary is : {json.dumps(summary)}"
+                "content": f"Dataset summary is : {context.text}"
             },
         ]
 
-        completions = self.oai_client.chat.completions.create(
-            model=self.oai_model,
-            messages=messages,
-            temperature=0,
+    def _get_batch_messages(self, context: PromptContext, goals: List[Dict], library: str) -> List[Dict]:
+        code_template, additional_instructions = self.scaffold.get_template(library)
+        goal_lines = "\n".join(
+            f"{index}. plot(data) method should generate {goal['visualization']} using {library} that addresses this goal: {goal['question']}."
+            for index, goal in enumerate(goals, start=1)
         )
-        response = completions.choices[0].message.content
-        return self._extract_code(response)
+        return [
+            {
+                "role": "system",
+                "content": f"""
+                {GENERAL_INSTRUCTIONS_PROMPT}
+                {BATCH_INSTRUCTIONS_PROMPT.format(n_goals=len(goals))}
+                {additional_instructions}
+                Code template: {code_template}
+                Goals:
+                {goal_lines}
+                """
+            },
+            {
+                "role": "system",
+                "content": f"Dataset summary is : {context.text}"
+            },
+        ]
+
+    def _parse_batch(self, text: str, n_goals: int) -> List[Optional[List[str]]]:
+        """
+        Split a batched response into the code of each goal. Goals whose block is missing,
+        repeated, holds no code or holds code that does not parse are None.
+        """
+        codes: List[Optional[List[str]]] = [None] * n_goals
+        for match in GOAL_BLOCK_PATTERN.finditer(text):
+            index = int(match.group(1)) - 1
+            if not 0 <= index < n_goals or codes[index] is not None:
+                continue
+            code = self._extract_code(match.group(2).split("</goal>")[0])
+            try:
+                for snippet in code:
+                    ast.parse(snippet)
+            except SyntaxError:
+                continue
+            if code:
+                codes[index] = code
+        return codes
+
+    def _batches(self, goals: List[Dict], batch_size: Optional[int]) -> List[List[Dict]]:
+        batch_size = batch_size or len(goals) or 1
+        return [goals[start:start + batch_size] for start in range(0, len(goals), batch_size)]
+
+    def generate_code(self, summary: Dict, goal: Dict, library: str = "altair"):
+        with self.tracer.span("viz_generator.generate_code", library=library) as span:
+            context = self._build_context(summary, [goal])
+            span.set_attributes(**context.attributes())
+            response = create_completion(
+                self.oai_client,
+                self.cache,
+                tracer=self.tracer,
+                model=self.oai_model,
+                messages=self._get_messages(context, goal, library),
+                temperature=0,
+            )
+            code = self._extract_code(response)
+            span.set_attribute("snippets", len(code))
+            return code
+
+    async def agenerate_code(self, summary: Dict, goal: Dict, library: str = "altair"):
+        with self.tracer.span("viz_generator.generate_code", library=library) as span:
+            context = self._build_context(summary, [goal])
+            span.set_attributes(**context.attributes())
+            response = await acreate_completion(
+                self.oai_async_client,
+                self.cache,
+                tracer=self.tracer,
+                model=self.oai_model,
+                messages=self._get_messages(context, goal, library),
+                temperature=0,
+            )
+            code = self._extract_code(response)
+            span.set_attribute("snippets", len(code))
+            return code
+
+    def generate_code_batch(
+        self, summary: Dict, goals: List[Dict], library: str = "altair", batch_size: Optional[int] = None
+    ) -> List[List[str]]:
+        """
+        Generate code for several goals with one request per `batch_size` goals (all goals by default),
+        so the instructions and the dataset summary are sent once per batch instead of once per goal.
+        Returns the code snippets of each goal in order; goals the batched response does not answer
+        with valid code are retried with their own request.
+        """
+        with self.tracer.span("viz_generator.generate_code_batch", library=library, goals=len(goals)) as span:
+            codes, saved_tokens = [], 0
+            for batch in self._batches(goals, batch_size):
+                if len(batch) == 1:
+                    codes.append(self.generate_code(summary, batch[0], library))
+                    continue
+                context = self._build_context(summary, batch)
+                saved_tokens += context.saved_tokens
+                response = create_completion(
+                    self.oai_client,
+                    self.cache,
+                    tracer=self.tracer,
+                    model=self.oai_model,
+                    messages=self._get_batch_messages(context, batch, library),
+                    temperature=0,
+                )
+                codes.extend(self._parse_batch(response, len(batch)))
+            missing = [index for index, code in enumerate(codes) if code is None]
+            for index in missing:
+                codes[index] = self.generate_code(summary, goals[index], library)
+            # single-goal and fallback requests report their savings on their own spans
+            span.set_attributes(**{"fallbacks": len(missing), "prompt.saved_tokens": saved_tokens})
+            return codes
+
+    async def agenerate_code_batch(
+        self, summary: Dict, goals: List[Dict], library: str = "altair", batch_size: Optional[int] = None
+    ) -> List[List[str]]:
+        with self.tracer.span("viz_generator.generate_code_batch", library=library, goals=len(goals)) as span:
+
+            contexts = []
+
+            async def generate_batch(batch):
+                if len(batch) == 1:
+                    return [await self.agenerate_code(summary, batch[0], library)]
+                context = self._build_context(summary, batch)
+                contexts.append(context)
+                response = await acreate_completion(
+                    self.oai_async_client,
+                    self.cache,
+                    tracer=self.tracer,
+                    model=self.oai_model,
+                    messages=self._get_batch_messages(context, batch, library),
+                    temperature=0,
+                )
+                return self._parse_batch(response, len(batch))
+
+            batches = await asyncio.gather(*(generate_batch(batch) for batch in self._batches(goals, batch_size)))
+            codes = [code for batch in batches for code in batch]
+            missing = [index for index, code in enumerate(codes) if code is None]
+            fallbacks = await asyncio.gather(
+                *(self.agenerate_code(summary, goals[index], library) for index in missing)
+            )
+            for index, code in zip(missing, fallbacks):
+                codes[index] = code
+            saved_tokens = sum(context.saved_tokens for context in contexts)
+            span.set_attributes(**{"fallbacks": len(missing), "prompt.saved_tokens": saved_tokens})
+            return codes
+
+    def _stream_request(self, summary: Dict, batch: List[Dict], library: str) -> Tuple[CodeBlockParser, PromptContext, Dict]:
+        context = self._build_context(summary, batch)
+        if len(batch) == 1:
+            messages = self._get_messages(context, batch[0], library)
+        else:
+            messages = self._get_batch_messages(context, batch, library)
+        request = {"model": self.oai_model, "messages": messages, "temperature": 0}
+        return CodeBlockParser(len(batch), batched=len(batch) > 1), context, request
+
+    def generate_code_stream(
+        self,
+        summary: Dict,
+        goals: List[Dict],
+        on_code: Callable[[int, str], None],
+        library: str = "altair",
+        batch_size: Optional[int] = None,
+    ) -> List[List[str]]:
+        """
+        Stream the code for `goals`, one request per `batch_size` goals (all goals by default), and call
+        on_code(goal index, code) as soon as each ```python block of a response closes, so callers can
+        execute it while the rest is still being generated. Goals a batched response leaves without
+        code are retried with their own request. Returns the code snippets of each goal in order.
+        """
+        with self.tracer.span("viz_generator.generate_code_stream", library=library, goals=len(goals)) as span:
+            codes: List[List[str]] = [[] for _ in goals]
+            batched, saved_tokens, offset = [], 0, 0
+
+            def emit(index: int, code: str) -> None:
+                codes[index].append(code)
+                on_code(index, code)
+
+            for batch in self._batches(goals, batch_size):
+                parser, context, request = self._stream_request(summary, batch, library)
+                saved_tokens += context.saved_tokens
+                if parser.batched:
+                    batched.extend(range(offset, offset + len(batch)))
+
+                def on_text(text: str, parser=parser, offset=offset) -> None:
+                    for index, code in parser.feed(text):
+                        emit(offset + index, code)
+
+                stream_completion(self.oai_client, on_text, self.cache, tracer=self.tracer, **request)
+                offset += len(batch)
+            # a single-goal request would only repeat itself, so only batched goals are retried
+            missing = [index for index in batched if not codes[index]]
+            for index in missing:
+                for code in self.generate_code(summary, goals[index], library):
+                    emit(index, code)
+            span.set_attributes(**{"fallbacks": len(missing), "prompt.saved_tokens": saved_tokens})
+            return codes
+
+    async def agenerate_code_stream(
+        self,
+        summary: Dict,
+        goals: List[Dict],
+        on_code: Callable[[int, str], None],
+        library: str = "altair",
+        batch_size: Optional[int] = None,
+    ) -> List[List[str]]:
+        with self.tracer.span("viz_generator.generate_code_stream", library=library, goals=len(goals)) as span:
+            codes: List[List[str]] = [[] for _ in goals]
+
+            def emit(index: int, code: str) -> None:
+                codes[index].append(code)
+                on_code(index, code)
+
+            async def stream_batch(batch, offset):
+                parser, context, request = self._stream_request(summary, batch, library)
+
+                def on_text(text: str) -> None:
+                    for index, code in parser.feed(text):
+                        emit(offset + index, code)
+
+                await astream_completion(self.oai_async_client, on_text, self.cache, tracer=self.tracer, **request)
+                return parser, context
+
+            batches = self._batches(goals, batch_size)
+            offsets = [sum(len(batch) for batch in batches[:position]) for position in range(len(batches))]
+            streams = await asyncio.gather(*(stream_batch(batch, offset) for batch, offset in zip(batches, offsets)))
+            batched = [
+                offset + index
+                for (parser, _), offset in zip(streams, offsets)
+                if parser.batched
+                for index in range(parser.n_goals)
+            ]
+            missing = [index for index in batched if not codes[index]]
+
+            async def fallback(index):
+                for code in await self.agenerate_code(summary, goals[index], library):
+                    emit(index, code)
+
+            await asyncio.gather(*(fallback(index) for index in missing))
+            saved_tokens = sum(context.saved_tokens for _, context in streams)
+            span.set_attributes(**{"fallbacks": len(missing), "prompt.saved_tokens": saved_tokens})
+            return codes
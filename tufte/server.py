@@ -0,0 +1,370 @@
+"""
+Serve tufte over HTTP: an ASGI application with summarize, goals and visualize endpoints.
+
+Datasets are uploaded once to POST /datasets, parsed, and kept in an in-memory DatasetRegistry;
+later requests refer to them by dataset_id, so concurrent users never share or overwrite each
+other's data. Identical requests in flight at the same time are computed once. Concurrent requests
+overlap their LLM calls; their snippets execute one at a time in the server process unless it runs
+with --workers, which executes them in an ExecutionPool.
+
+    tufte-server --port 8000              (requires uvicorn: pip install tufte[serve])
+    uvicorn --factory tufte.server:create_app
+
+Endpoints, all JSON:
+    POST   /datasets           raw file bytes (?format=csv&name=sales.csv), or {"path": ...} for a file in a --data-dir
+    GET    /datasets           registered datasets
+    DELETE /datasets/{id}
+    POST   /summarize          {"dataset_id", "n_samples"?, "enrich"?}
+    POST   /goals              {"dataset_id" or "summary", "n_goals"?}
+    POST   /visualize          {"dataset_id", "goal" or "goals", "library"?, "summary"?, "altair_data"?}
+    GET    /stats, GET /health
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs
+
+from .components.data_model import Chart
+from .components.execution_pool import ExecutionPool
+from .components.llm_cache import LLMCache
+from .components.orchestrator import Orchestrator
+from .components.registry import DEFAULT_REGISTRY_BYTES, Dataset, DatasetNotFound, DatasetRegistry, RequestCoalescer
+from .components.summary_cache import file_fingerprint
+from .components.utils import DATA_FILE_TYPES, get_file_extension, read_dataframe
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BODY_BYTES = 512 * 1024**2
+CONTENT_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "text/tab-separated-values": "tsv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "application/vnd.apache.arrow.file": "arrow",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class TufteServer:
+    """
+    ASGI application serving one Orchestrator to many clients.
+
+    The orchestrator's components are called with each request's dataset instead of its single
+    loaded frame. Summaries are kept with their dataset in the registry. Summaries, goals and
+    charts requested again while an identical request is still running share its result via a
+    RequestCoalescer. Pass an `orchestrator`, or the options to build one.
+
+    Clients may register files on the server's disk by path only below one of `allowed_roots`;
+    without any, only uploads are accepted.
+    """
+
+    def __init__(
+        self,
+        orchestrator: Optional[Orchestrator] = None,
+        registry: Optional[DatasetRegistry] = None,
+        max_bytes: int = DEFAULT_REGISTRY_BYTES,
+        max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+        allowed_roots: Sequence[str] = (),
+        **orchestrator_options,
+    ) -> None:
+        self.orchestrator = orchestrator or Orchestrator(**orchestrator_options)
+        self.registry = registry or DatasetRegistry(max_bytes)
+        self.max_body_bytes = max_body_bytes
+        self.allowed_roots = [os.path.realpath(root) for root in allowed_roots]
+        self.coalescer = RequestCoalescer()
+        self.routes: Dict[Tuple[str, str], Callable] = {
+            ("GET", "/health"): self._health,
+            ("GET", "/stats"): self._stats,
+            ("GET", "/datasets"): self._list_datasets,
+            ("POST", "/datasets"): self._add_dataset,
+            ("POST", "/summarize"): self._summarize,
+            ("POST", "/goals"): self._goals,
+            ("POST", "/visualize"): self._visualize,
+        }
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        try:
+            status, payload = await self._handle(scope, receive)
+        except HTTPError as exception_error:
+            status, payload = exception_error.status, {"error": exception_error.message}
+        except DatasetNotFound as exception_error:
+            status, payload = 404, {"error": f"Unknown dataset {exception_error.args[0]}"}
+        except (ValueError, TypeError) as exception_error:
+            status, payload = 400, {"error": str(exception_error)}
+        except Exception as exception_error:
+            logger.exception(f"{scope['method']} {scope['path']} failed")
+            status, payload = 500, {"error": f"{type(exception_error).__name__}: {exception_error}"}
+        body = json.dumps(payload, default=str).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _handle(self, scope: Dict, receive: Callable) -> Tuple[int, Dict]:
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        query = {key: values[-1] for key, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        body = await self._read_body(receive)
+        if method == "DELETE" and path.startswith("/datasets/"):
+            return self._remove_dataset(path[len("/datasets/"):])
+        handler = self.routes.get((method, path))
+        if handler is None:
+            raise HTTPError(404, f"No route for {method} {path}")
+        with self.orchestrator.tracer.span(f"server.{path.strip('/')}", method=method):
+            return await handler(query=query, headers=headers, body=body)
+
+    async def _read_body(self, receive: Callable) -> bytes:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(400, "Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise HTTPError(413, f"Request body exceeds {self.max_body_bytes} bytes")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    def _json(self, body: bytes) -> Dict:
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError as exception_error:
+            raise HTTPError(400, f"Invalid JSON: {exception_error}")
+        if not isinstance(request, dict):
+            raise HTTPError(400, "Expected a JSON object")
+        return request
+
+    def _request_key(self, endpoint: str, **request) -> str:
+        return f"{endpoint}:{LLMCache.make_key(**request)}"
+
+    async def _health(self, **_) -> Tuple[int, Dict]:
+        return 200, {"status": "ok"}
+
+    async def _stats(self, **_) -> Tuple[int, Dict]:
+        stats = {"registry": self.registry.stats(), "coalescer": self.coalescer.stats()}
+        if self.orchestrator.cache is not None:
+            stats["llm_cache"] = self.orchestrator.cache.stats()
+        return 200, stats
+
+    async def _list_datasets(self, **_) -> Tuple[int, Dict]:
+        return 200, {"datasets": self.registry.datasets()}
+
+    def _remove_dataset(self, dataset_id: str) -> Tuple[int, Dict]:
+        if not self.registry.remove(dataset_id):
+            raise DatasetNotFound(dataset_id)
+        return 200, {"dataset_id": dataset_id, "removed": True}
+
+    async def _add_dataset(self, query: Dict, headers: Dict, body: bytes) -> Tuple[int, Dict]:
+        """
+        Register an uploaded file, or a file below one of the allowed roots on the server's disk with
+        {"path": ..., "read_options": ...}.
+        A dataset is identified by its content (an upload) or by its path, size and modification time
+        (a local file), so registering it again returns the parsed dataset without parsing it again.
+        """
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+        if content_type == "application/json" and "format" not in query:
+            request = self._json(body)
+            if "path" not in request:
+                raise HTTPError(400, "Expected the file as the request body, or a JSON object with a path")
+            path, read_options = self._allowed_path(request["path"]), request.get("read_options") or {}
+            if not os.path.isfile(path):
+                raise HTTPError(404, f"No such file: {path}")
+            dataset_id = LLMCache.make_key(file=file_fingerprint(path), read_options=read_options)[:32]
+            name = request.get("name") or os.path.basename(path)
+            load = lambda: read_dataframe(path, **read_options)  # noqa: E731
+        else:
+            name = query.get("name", "")
+            file_format = query.get("format") or CONTENT_TYPE_FORMATS.get(content_type)
+            if file_format is None and "." in name:
+                file_format = get_file_extension(name)
+            if file_format not in DATA_FILE_TYPES:
+                raise HTTPError(415, f"Unsupported or missing format {file_format}. Choose from {', '.join(DATA_FILE_TYPES)}.")
+            if not body:
+                raise HTTPError(400, "Empty upload")
+            dataset_id = hashlib.blake2b(body + file_format.encode(), digest_size=16).hexdigest()
+            name = name or f"{dataset_id}.{file_format}"
+            load = lambda: _read_upload(body, file_format)  # noqa: E731
+
+        if dataset_id in self.registry:
+            return 200, self.registry.get(dataset_id).info()
+
+        async def parse() -> Dataset:
+            data = await asyncio.to_thread(load)
+            report = None
+            if self.orchestrator.dtype_optimizer is not None:
+                # registered datasets take less of the registry's memory
+                data, report = await asyncio.to_thread(self.orchestrator.dtype_optimizer.optimize, data)
+            dataset = self.registry.add(dataset_id, data, name)
+            dataset.dtype_report = report
+            return dataset
+
+        dataset = await self.coalescer.run(f"dataset:{dataset_id}", parse)
+        return 201, dataset.info()
+
+    def _allowed_path(self, path: str) -> str:
+        if not self.allowed_roots:
+            raise HTTPError(403, "Registering files by path is disabled; start the server with --data-dir")
+        # symlinks and .. are resolved before the check
+        resolved = os.path.realpath(path)
+        if not any(os.path.commonpath([root, resolved]) == root for root in self.allowed_roots):
+            raise HTTPError(403, f"{path} is outside the data directories")
+        return resolved
+
+    async def _summary(self, dataset: Dataset, n_samples: int, enrich: bool) -> Dict:
+        key = self._request_key("summarize", dataset=dataset.id, n_samples=n_samples, enrich=enrich)
+        if key in dataset.summaries:
+            return dataset.summaries[key]
+
+        async def summarize() -> Dict:
+            summary = await self.orchestrator.summarizer.asummarize(
+                data=dataset.data, n_samples=n_samples, enrich=enrich
+            )
+            dataset.summaries[key] = summary
+            return summary
+
+        return await self.coalescer.run(key, summarize)
+
+    async def _request_summary(self, request: Dict) -> Dict:
+        if request.get("summary") is not None:
+            return request["summary"]
+        if "dataset_id" not in request:
+            raise HTTPError(400, "Expected a dataset_id or a summary")
+        dataset = self.registry.get(request["dataset_id"])
+        return await self._summary(dataset, int(request.get("n_samples", 3)), bool(request.get("enrich", False)))
+
+    async def _summarize(self, body: bytes, **_) -> Tuple[int, Dict]:
+        request = self._json(body)
+        if "dataset_id" not in request:
+            raise HTTPError(400, "Expected a dataset_id")
+        return 200, {"summary": await self._request_summary(request)}
+
+    async def _goals(self, body: bytes, **_) -> Tuple[int, Dict]:
+        request = self._json(body)
+        summary = await self._request_summary(request)
+        n_goals = int(request.get("n_goals", 5))
+        goals = await self.coalescer.run(
+            self._request_key("goals", summary=summary, n_goals=n_goals),
+            lambda: self.orchestrator.aexplore_goals(summary, n_goals=n_goals),
+        )
+        return 200, {"goals": goals}
+
+    async def _visualize(self, body: bytes, **_) -> Tuple[int, Dict]:
+        request = self._json(body)
+        if "dataset_id" not in request:
+            raise HTTPError(400, "Expected a dataset_id")
+        dataset = self.registry.get(request["dataset_id"])
+        summary = await self._request_summary(request)
+        goals = request.get("goals") or ([request["goal"]] if request.get("goal") else [])
+        if not goals:
+            raise HTTPError(400, "Expected a goal or goals")
+        library = request.get("library", "altair")
+        altair_data = request.get("altair_data")
+        debug = bool(request.get("debug", True))
+
+        async def visualize(goal) -> List[Dict]:
+            key = self._request_key(
+                "visualize", dataset=dataset.id, summary=summary, goal=goal, library=library,
+                altair_data=altair_data, debug=debug,
+            )
+            charts = await self.coalescer.run(
+                key,
+                lambda: self.orchestrator.avisualize(
+                    summary, goal, library=library, debug=debug, altair_data=altair_data, data=dataset.data
+                ),
+            )
+            return [_chart_json(chart) for chart in charts]
+
+        results = await asyncio.gather(*(visualize(goal) for goal in goals))
+        return 200, {"charts": [chart for charts in results for chart in charts]}
+
+
+def _read_upload(content: bytes, file_format: str):
+    # read_dataframe samples and cleans files by path, so the upload goes through a temporary file
+    with tempfile.NamedTemporaryFile(suffix=f".{file_format}", delete=False) as f:
+        f.write(content)
+    try:
+        return read_dataframe(f.name)
+    finally:
+        os.unlink(f.name)
+
+
+def _chart_json(chart: Chart) -> Dict:
+    from pydantic import TypeAdapter
+
+    # image bytes become base64, following Chart's JSON configuration
+    return TypeAdapter(Chart).dump_python(chart, mode="json")
+
+
+def create_app(**options) -> TufteServer:
+    """
+    Build the ASGI application; `options` are passed to TufteServer and from there to Orchestrator.
+    """
+    return TufteServer(**options)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="tufte-server", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default=None, help="LLM model (default: the orchestrator's)")
+    parser.add_argument("--cache", default=None, help="LLM cache file")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_REGISTRY_BYTES, help="memory for parsed datasets")
+    parser.add_argument("--optimize-dtypes", action="store_true", help="store datasets with compact dtypes")
+    parser.add_argument(
+        "--data-dir", action="append", default=[], help="directory clients may register files from by path (repeatable)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=0, help="worker processes executing charts in parallel (default: in process)"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError("Serving over HTTP requires uvicorn: pip install tufte[serve]")
+    options = {"max_bytes": args.max_bytes, "optimize_dtypes": args.optimize_dtypes, "allowed_roots": args.data_dir}
+    if args.model:
+        options["model"] = args.model
+    if args.cache:
+        options["cache"] = LLMCache(args.cache)
+    if args.workers:
+        options["execution_pool"] = ExecutionPool(n_workers=args.workers)
+    try:
+        uvicorn.run(create_app(**options), host=args.host, port=args.port)
+    finally:
+        if args.workers:
+            options["execution_pool"].close()
+
+
+if __name__ == "__main__":
+    main()